@@ -3,11 +3,12 @@ from os import path, getenv
 from packaging.version import Version
 from docutils import nodes
 
+from sphinx.util import logging
 from sphinx.util.osutil import SEP
 from sphinx.transforms import SphinxTransform
 
 from .theme import (navigation_tree, get_pygments_theme,
-                    write_pygments_css, wrap_elements)
+                    write_pygments_css, wrap_elements, is_shared_navigation)
 from .theme import setup as theme_setup, names as theme_names
 from .directive import setup as directive_setup
 from .role import setup as role_setup
@@ -17,20 +18,12 @@ from .monkeypatch import monkeypatch_figure_numbers
 
 __version__ = "0.3.54"
 
+logger = logging.getLogger(__name__)
 
-def get_navigation_tree(app, context, pagename):
-    # The navigation tree, generated from the sphinx-provided ToC tree.
-    if "toctree" in context:
-        toctree = context["toctree"]
-        toctree_html = toctree(
-            collapse=False,
-            titles_only=True,
-            maxdepth=-1,
-            includehidden=True,
-        )
-    else:
-        toctree_html = ""
 
+def get_navigation_tree(app, context, pagename):
+    # The navigation tree, generated from the sphinx-provided ToC tree,
+    # once per build, see navigation_tree.
     from packaging.version import Version
     from sphinx import __version__ as __sphinx_version__
 
@@ -40,13 +33,15 @@ def get_navigation_tree(app, context, pagename):
         url = quote(pagename)
         context['content_root'] = (f'..{SEP}' * url.count(SEP)) or f'.{SEP}'
 
-    return navigation_tree(app, toctree_html,
-                           context['content_root'], pagename)
+    return navigation_tree(app, "toctree" in context,
+                           context['content_root'], pagename,
+                           is_shared_navigation(context))
 
 
 def html_page_context(app, pagename, templatename, context, doctree):
     ret = get_navigation_tree(app, context, pagename)
     (context["toc_tree"],
+     context["toc_tree_src"],
      context["repotoc_tree"],
      context["repotoc_current_name"],
      context["repotoc_current"]) = ret
@@ -75,6 +70,16 @@ def config_inited(app, config):
     config.media_print = True if getenv("ADOC_MEDIA_PRINT") is not None else False
 
 def builder_inited(app):
+    if app.builder.name == 'singlehtml' and app.parallel > 1:
+        # The unique_ids of a doc depend on the docs read before it, and
+        # are recorded by the tocs at read time, so can't be fixed after
+        # a parallel read. Reading serially, in order, keeps them the same
+        # from build to build.
+        app.parallel = 1
+        logger.info("adi_doctools: "
+                    "Parallel reading disabled for singlehtml, "
+                    "to keep the unique ids stable")
+
     if app.builder.format == 'html':
         # Add include regardless of theme.
         if getenv("ADOC_DEVPOOL") is not None:
@@ -123,14 +128,22 @@ class unique_ids(SphinxTransform):
     Suffix IDs/anchors to make them unique, e.g.
     {overview, features, ..., overview} ->
     {overview, features, ..., overview-1}
+    The ids are claimed per doc at env.unique_ids, the doc ids and the owner
+    doc of each id, so a re-read doc releases its own ids first and gets
+    the same ones again.
     """
     default_priority = 500
-    used_ids = set()
 
     def apply(self, **kwargs: Any) -> None:
         if self.app.builder.name != "singlehtml":
             return
 
+        if not hasattr(self.env, 'unique_ids'):
+            self.env.unique_ids = {'doc': {}, 'owner': {}}
+        owner = self.env.unique_ids['owner']
+        docname = self.env.docname
+        claimed = self.env.unique_ids['doc'][docname] = []
+
         def make_unique_id(node, id_):
             """
             A node contains multiple ids, the first is the title
@@ -148,19 +161,53 @@ class unique_ids(SphinxTransform):
             """
             counter = 1
             id__ = id_
-            while id__ in self.used_ids:
+            while id__ in owner:
                 id__ = f"{id_}-{counter}"
                 counter += 1
-            self.used_ids.add(id__)
+            owner[id__] = docname
+            claimed.append(id__)
             node['ids'][0] = id__
 
-        # findall (Docutils >= 0.18.1) returns an iterator,
-        # and deprecates traverse (returns a list).
-        # Sphinx 7.1.2 requires Docutils >= 0.18.1
-        for node in self.document.findall():
-            if (not isinstance(node, nodes.Text) and
-                'ids' in node and node['ids']):
+        # Not only the ids of document.ids, directives like the hdl ones
+        # set ids without registering them, so every element is walked,
+        # in document order, skipping the text nodes.
+        stack = [self.document]
+        while stack:
+            node = stack.pop()
+            if node['ids']:
                 make_unique_id(node, node['ids'][0])
+            stack.extend(reversed([n for n in node.children
+                                   if isinstance(n, nodes.Element)]))
+
+
+def merge_unique_ids(app, env, docnames, other):
+    """
+    Merge the ids claimed by the docs of a parallel reader, if read in
+    parallel nonetheless, e.g. by another builder_inited handler.
+    An id claimed by docs of different readers is owned by the first doc
+    by name, so at least the owners are deterministic.
+    """
+    if not hasattr(other, 'unique_ids'):
+        return
+    if not hasattr(env, 'unique_ids'):
+        env.unique_ids = {'doc': {}, 'owner': {}}
+    owner = env.unique_ids['owner']
+    for d in sorted(docnames):
+        if d not in other.unique_ids['doc']:
+            continue
+        env.unique_ids['doc'][d] = other.unique_ids['doc'][d]
+        for id_ in env.unique_ids['doc'][d]:
+            if id_ not in owner or d < owner[id_]:
+                owner[id_] = d
+
+
+def purge_unique_ids(app, env, docname):
+    if not hasattr(env, 'unique_ids'):
+        return
+    owner = env.unique_ids['owner']
+    for id_ in env.unique_ids['doc'].pop(docname, []):
+        if owner.get(id_) == docname:
+            del owner[id_]
 
 
 def setup(app):
@@ -178,6 +225,8 @@ def setup(app):
     app.connect("builder-inited", builder_inited)
     app.connect("html-page-context", html_page_context)
     app.connect("build-finished", build_finished)
+    app.connect("env-merge-info", merge_unique_ids)
+    app.connect("env-purge-doc", purge_unique_ids)
 
     app.add_config_value('numfig_per_doc', False, 'env', [str])
 
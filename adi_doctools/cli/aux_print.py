@@ -2,6 +2,9 @@ from packaging.version import Version
 
 from sphinx.__init__ import __version__ as sphinx_version
 from os.path import basename
+from os import replace
+from copy import deepcopy
+from hashlib import sha1
 from lxml import html, etree
 from click import echo
 import importlib.util
@@ -128,3 +131,164 @@ def sanitize_singlehtml(file) -> str:
     return html.tostring(root, encoding="utf-8", method="html")
 
 
+def element_path(elem) -> list:
+    """
+    Child indexes from the root to the element.
+    """
+    path_ = []
+    while (parent := elem.getparent()) is not None:
+        path_.append(parent.index(elem))
+        elem = parent
+    return path_[::-1]
+
+
+def element_at(root, path_):
+    for i in path_:
+        root = root[i]
+    return root
+
+
+def slice_tree(root, start, end):
+    """
+    Copy of the tree with only the content from start, inclusive, to end,
+    exclusive, in document order, plus their ancestors and the head.
+    None means the start or the end of the document.
+    The ancestors of start lose their ids, already at a previous slice.
+    """
+    root_ = deepcopy(root)
+    if end is not None:
+        elem = element_at(root_, element_path(end))
+        parent = elem.getparent()
+        for e in list(elem.itersiblings()):
+            parent.remove(e)
+        parent.remove(elem)
+        while (elem := parent) is not None and \
+              (parent := elem.getparent()) is not None:
+            for e in list(elem.itersiblings()):
+                parent.remove(e)
+            elem.tail = None
+    if start is not None:
+        elem = element_at(root_, element_path(start))
+        while (parent := elem.getparent()) is not None:
+            for e in list(elem.itersiblings(preceding=True)):
+                if e.tag != 'head':
+                    parent.remove(e)
+            parent.text = None
+            parent.attrib.pop('id', None)
+            elem = parent
+    return root_
+
+
+def split_volumes(html_: bytes) -> list:
+    """
+    Split the sanitized singlehtml at the volumes, the first part contains
+    the cover, table of contents and any content before the first volume.
+    """
+    root = html.fromstring(html_)
+    volumes = root.xpath("//div[@class='volume']")
+    cuts = [None] + volumes + [None]
+    return [slice_tree(root, cuts[i], cuts[i+1])
+            for i in range(len(cuts) - 1)]
+
+
+class incremental_pdf:
+    """
+    Render the PDF per volume, reusing the rendered pages of the volumes
+    whose content and first page number are unchanged, then merge the
+    pages into the PDF.
+    The table of contents targets pages of other volumes, so the first part
+    is rendered last, with the page numbers filled in.
+    """
+    def __init__(self):
+        from weasyprint.text.fonts import FontConfiguration
+
+        # Shared, the reused pages refer to its fonts
+        self.font_config = FontConfiguration()
+        self.entry = {}
+        self.prev = {}
+        self.front_pages = None
+        self.rendered = 0
+
+    def render(self, root, base_url, stylesheets, css_key, start):
+        from weasyprint import HTML, CSS
+
+        html_ = html.tostring(root, encoding="utf-8", method="html")
+        key = (sha1(html_).hexdigest(), css_key, start)
+        if key in self.prev:
+            self.entry[key] = self.prev[key]
+        if key in self.entry:
+            return self.entry[key]
+
+        stylesheets = list(stylesheets)
+        if start > 1:
+            # Touching the page counter drops the implicit increment
+            stylesheets.append(CSS(
+                string=f"@page :first {{ counter-reset: page {start} }}",
+                font_config=self.font_config))
+        doc = HTML(string=html_, base_url=base_url).render(
+            stylesheets=stylesheets, font_config=self.font_config)
+        self.entry[key] = doc
+        self.rendered += 1
+        return doc
+
+    @staticmethod
+    def number_toc(root, anchors):
+        """
+        Fill the page numbers of the links to other volumes, the ones
+        at the first part are still resolved by target-counter.
+        """
+        for a in root.xpath("//div[@class='tocwrapper']//ul//li//a"):
+            href = a.get('href', '')
+            if href.startswith('#') and href[1:] in anchors:
+                a.set('data-page', str(anchors[href[1:]]))
+        return root
+
+    def write(self, html_, base_url, css_files, output):
+        from weasyprint import CSS
+
+        h = sha1()
+        for f in css_files:
+            with open(f, 'rb') as f_:
+                h.update(f_.read())
+        css_key = h.hexdigest()
+        stylesheets = [CSS(f, font_config=self.font_config)
+                       for f in css_files]
+        stylesheets.append(CSS(
+            string=".tocwrapper ul li a[data-page]::after "
+                   "{ content: attr(data-page) }",
+            font_config=self.font_config))
+
+        # Entries not used by this run are dropped
+        self.prev = self.entry
+        self.entry = {}
+        self.rendered = 0
+
+        front, *parts = split_volumes(html_)
+        if self.front_pages is None:
+            self.front_pages = len(self.render(front, base_url, stylesheets,
+                                               css_key, 1).pages)
+        # The volumes are placed after the pages of the first part,
+        # if its number of pages changes, place them again
+        for _ in range(3):
+            start = self.front_pages + 1
+            docs = []
+            anchors = {}
+            for part in parts:
+                doc = self.render(part, base_url, stylesheets, css_key, start)
+                for i, page in enumerate(doc.pages):
+                    for a in page.anchors:
+                        anchors.setdefault(a, start + i)
+                start += len(doc.pages)
+                docs.append(doc)
+            front_doc = self.render(self.number_toc(front, anchors), base_url,
+                                    stylesheets, css_key, 1)
+            if len(front_doc.pages) == self.front_pages:
+                break
+            self.front_pages = len(front_doc.pages)
+        self.prev = {}
+        echo(f"rendered {self.rendered} parts, {len(parts) + 1} in total")
+
+        pages = [p for d in [front_doc] + docs for p in d.pages]
+        tmp = f"{output}.tmp"
+        front_doc.copy(pages).write_pdf(tmp)
+        replace(tmp, output)
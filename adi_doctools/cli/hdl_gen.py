@@ -1,17 +1,22 @@
-from typing import Dict, Tuple
+from typing import Dict, Tuple, List, Callable, Optional, Any
 
 import click
 import subprocess
 import re
-from os import path, walk, pardir, chdir, getcwd
-from glob import glob
+from os import path, walk, pardir, chdir, getcwd, cpu_count, scandir
+from fnmatch import fnmatch
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from sphinx.util import logging
 
 from ..typing.hdl import vendors, Library, Carrier, Project
-from ..parser.hdl import parse_hdl_regmap
+from ..parser.hdl import load_hdl_regmap, regmap_cache_key
+from ..parser.hdl import library_version
 from ..parser.hdl import resolve_hdl_regmap
 from ..parser.hdl import expand_hdl_regmap
 from ..parser.hdl import parse_hdl_vendor
 from ..parser.hdl import parse_hdl_library
+from ..parser.hdl import index_hdl_library
 from ..parser.hdl import resolve_hdl_library
 from ..parser.hdl import parse_hdl_project
 from ..parser.hdl import resolve_hdl_project
@@ -19,6 +24,20 @@ from ..parser.hdl import parse_hdl_interfaces
 from ..writer.hdl import write_hdl_regmap
 from ..writer.hdl import write_hdl_library_makefile
 from ..writer.hdl import write_hdl_project_makefile
+from ..parser.cache import cache_dir, cache_prune, capture_warnings
+from ..parser.cache import get_hash, input_state
+
+logger = logging.getLogger(__name__)
+
+# Entry files per top folder and vendor
+sources = {
+    'library': {'xilinx': '*_ip.tcl', 'intel': '*_hw.tcl'},
+    'projects': {'xilinx': 'system_bd.tcl', 'intel': 'system_qsys.tcl'}
+}
+# Folders written by the vendor tools, besides the hidden ones like .Xil
+build_dirs = ('db', 'incremental_db', 'qdb', 'tmp-clearbox')
+build_exts = ('.cache', '.gen', '.hw', '.ip_user_files', '.runs', '.sim',
+              '.srcs')
 
 
 @click.command()
@@ -49,7 +68,15 @@ from ..writer.hdl import write_hdl_project_makefile
     default=False,
     help="Disable file generation, useful to run only the parsing."
 )
-def hdl_gen(input_, no_regmap, no_makefile, no_write):
+@click.option(
+    '--jobs',
+    '-j',
+    is_flag=False,
+    type=click.IntRange(min=0),
+    default=1,
+    help="Number of processes to parse the files, 0 to use all CPUs."
+)
+def hdl_gen(input_, no_regmap, no_makefile, no_write, jobs):
     """
     Generate HDL auxiliary files.
 
@@ -77,11 +104,20 @@ def hdl_gen(input_, no_regmap, no_makefile, no_write):
     if not (has_tb := path.isdir('testbenches')):
         click.echo("'testbenches' not found, tb files will be skipped.")
 
+    jobs = cpu_count() if jobs == 0 else jobs
+    pool = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+
     if not no_makefile:
-        project, library = makefile_pre()
+        # Results of the unchanged libraries and projects from the last run
+        state = input_state(path.join(cache_dir, 'hdl-gen'), library_version)
+        project, library = makefile_pre(pool, state)
+        state.dump()
 
     if not no_regmap:
-        regmap = regmap_pre()
+        regmap = regmap_pre(pool)
+
+    if pool is not None:
+        pool.shutdown()
 
     if not no_makefile and not no_write:
         makefile_post(library, project)
@@ -92,7 +128,154 @@ def hdl_gen(input_, no_regmap, no_makefile, no_write):
     chdir(call_dir)
 
 
-def makefile_pre() -> Tuple[Dict[str, Project], Dict[str, Library]]:
+def parse_task(func: Callable, args: Tuple) -> Tuple[Any, List[str]]:
+    """
+    Run a parser at a pool worker, collecting the warnings instead of
+    printing them, to be reported by the parent in a stable order.
+    """
+    logger_ = logging.getLogger('adi_doctools')
+    propagate = logger_.logger.propagate
+    logger_.logger.propagate = False
+    try:
+        with capture_warnings(logger_) as msg:
+            obj = func(*args)
+    finally:
+        logger_.logger.propagate = propagate
+    return (obj, msg)
+
+
+def parse_pool(
+    pool: Optional[ProcessPoolExecutor],
+    func: Callable,
+    args: List[Tuple],
+    state: Optional[input_state] = None,
+    inputs: Optional[Callable] = None
+) -> List[Any]:
+    """
+    Call func for each tuple of args, fanned out to the pool if any.
+    Results are returned in the order of args, and the warnings of each
+    call are reported in that same order.
+    With a state, the calls with unchanged input files are skipped,
+    inputs returns the files of a call from its args and result.
+    """
+    keys = [None if state is None else state.key(func, a) for a in args]
+    ret = [None if state is None else state.get(k) for k in keys]
+    todo = [i for i, r in enumerate(ret) if r is None]
+
+    args_ = [args[i] for i in todo]
+    if pool is None:
+        ret_ = map(parse_task, repeat(func), args_)
+    else:
+        ret_ = pool.map(parse_task, repeat(func), args_)
+    for i, r in zip(todo, ret_):
+        ret[i] = r
+        if state is not None:
+            state.set(keys[i], *r, inputs(args[i], r[0]))
+
+    obj = []
+    for obj_, msg in ret:
+        for m in msg:
+            logger.warning(m)
+        obj.append(obj_)
+    return obj
+
+
+def interfaces_inputs(args: Tuple, obj: Any) -> List[str]:
+    return [args[0]]
+
+
+def library_inputs(args: Tuple, obj: Any) -> List[str]:
+    """
+    The ip script, plus the top module and package template it reads,
+    which are listed as dependencies.
+    """
+    file = args[0]
+    lib_ = obj[0]
+    files = [file]
+    if lib_:
+        dir_ = path.dirname(file)
+        files.extend(path.join(dir_, d) for d in lib_['dependencies']
+                     if not d.startswith('$'))
+    return files
+
+
+def project_inputs(args: Tuple, obj: Any) -> List[str]:
+    """
+    The block design and project scripts, plus the sourced scripts,
+    which are listed as dependencies.
+    """
+    file = args[0]
+    prj_ = obj[0]
+    dir_ = path.dirname(file)
+    files = [file, path.join(dir_, 'system_project.tcl')]
+    if prj_:
+        files.extend(path.normpath(path.join(dir_, d))
+                     for d in prj_['m_deps'])
+    return files
+
+
+def is_build_dir(name: str) -> bool:
+    return (name.startswith('.') or name in build_dirs or
+            name.endswith(build_exts))
+
+
+def list_files(dirs: List[str]) -> List[str]:
+    """
+    List the files at dirs from the git index, plus the untracked files
+    not ignored.
+    If git fails, walk dirs instead.
+    Either way, the vendor build outputs are skipped.
+    """
+    p_ = subprocess.run(["git", "ls-files", "-z", "--cached", "--others",
+                         "--exclude-standard", "--", *dirs],
+                        capture_output=True)
+    if p_.returncode == 0:
+        files = p_.stdout.decode("utf-8").split('\0')
+        files = [path.normpath(f) for f in files if f]
+        return [f for f in files
+                if not any(is_build_dir(d) for d in f.split(path.sep)[:-1])]
+
+    files = []
+    stack = [d for d in dirs if path.isdir(d)]
+    while stack:
+        with scandir(stack.pop()) as it:
+            for e in it:
+                if not e.is_dir():
+                    files.append(e.path)
+                elif not is_build_dir(e.name):
+                    stack.append(e.path)
+    return files
+
+
+def match_sources(files: List[str]) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Match the files against all the entry file patterns in a single pass.
+    Sorted, so the merge order and warnings are stable.
+    """
+    match = {}
+    for d in sources:
+        match[d] = {v: [] for v in sources[d]}
+
+    for f in files:
+        d = f.split(path.sep, 1)[0]
+        if d not in sources:
+            continue
+        basename = path.basename(f)
+        for v in sources[d]:
+            # Deleted from the work tree, but still at the git index
+            if fnmatch(basename, sources[d][v]) and path.isfile(f):
+                match[d][v].append(f)
+
+    for d in match:
+        for v in match[d]:
+            match[d][v].sort()
+    return match
+
+
+def makefile_pre(
+    pool: Optional[ProcessPoolExecutor] = None,
+    state: Optional[input_state] = None
+) -> Tuple[Dict[str, Project], Dict[str, Library]]:
     # Generate HDL carrier dictionary
     carrier = Carrier()
     for v in vendors:
@@ -104,28 +287,26 @@ def makefile_pre() -> Tuple[Dict[str, Project], Dict[str, Library]]:
     # TODO do something with the parsed carriers,
     # like get/validate library and project dicts
 
+    sources_ = match_sources(list_files(list(sources)))
+
     # Generate HDL Library dictionary
-    types = ['*_ip.tcl', '*_hw.tcl']
-    files = {}
+    files = sources_['library']
     library = {}
     project = {}
     interfaces_ip_files = []
-    for v in vendors:
-        files[v] = []
-    for typ, v in zip(types, vendors):
-        glob_ = path.join('library', '**', typ)
-        files[v].extend(glob(glob_, recursive=True))
 
     for v in files:
-        for f in files[v]:
-            if 'interfaces_ip.tcl' in f:
-                files[v].remove(f)
-                interfaces_ip_files.append(f)
+        interfaces_ip_files.extend(f for f in files[v]
+                                   if 'interfaces_ip.tcl' in f)
+        files[v] = [f for f in files[v] if 'interfaces_ip.tcl' not in f]
 
     # Generate the HDL interfaces dictionary
     interfaces_ip = {}
-    for f in interfaces_ip_files:
-        interfaces_ip[path.dirname(f)] = parse_hdl_interfaces(f)
+    obj = parse_pool(pool, parse_hdl_interfaces,
+                     [(f,) for f in interfaces_ip_files],
+                     state, interfaces_inputs)
+    for f, intf in zip(interfaces_ip_files, obj):
+        interfaces_ip[path.dirname(f)] = intf
 
     intf_key_file = {}
     for f in interfaces_ip:
@@ -134,39 +315,35 @@ def makefile_pre() -> Tuple[Dict[str, Project], Dict[str, Library]]:
 
     # Generate the HDL library dictionary
     # A folder may contain variants of the lib per vendor
-    for typ, v in zip(types, files):
-        for f in files[v]:
-            lib_, path_, ip_name = parse_hdl_library(f)
-            if lib_:
-                if path_ not in library:
-                    library[path_] = Library(
-                        name=ip_name,
-                        vendor={},
-                        generic={}
-                    )
-                library[path_]['vendor'][v] = lib_
-
+    files_ = [(v, f) for v in files for f in files[v]]
+    obj = parse_pool(pool, parse_hdl_library, [(f,) for _, f in files_],
+                     state, library_inputs)
+    for (v, f), (lib_, path_, ip_name) in zip(files_, obj):
+        if lib_:
+            if path_ not in library:
+                library[path_] = Library(
+                    name=ip_name,
+                    vendor={},
+                    generic={}
+                )
+            library[path_]['vendor'][v] = lib_
+
+    index = index_hdl_library(library)
     for key in library:
-        resolve_hdl_library(library, key, intf_key_file)
+        resolve_hdl_library(library, key, intf_key_file, index)
 
     # Generate HDL Project dictionary
     # A folder contains only one project/vendor
-    types = ['system_bd.tcl', 'system_qsys.tcl']
-    files = {}
-    for v in vendors:
-        files[v] = []
-    for typ, v in zip(types, vendors):
-        glob_ = path.join('projects', '**', typ)
-        files[v].extend(glob(glob_, recursive=True))
-
-    for typ, v in zip(types, files):
-        for f in files[v]:
-            prj_, path_ = parse_hdl_project(f)
-            if prj_:
-                prj_['vendor'] = v
-                project[path_] = prj_
+    files = sources_['projects']
+    files_ = [(v, f) for v in files for f in files[v]]
+    obj = parse_pool(pool, parse_hdl_project, [(f,) for _, f in files_],
+                     state, project_inputs)
+    for (v, f), (prj_, path_) in zip(files_, obj):
+        if prj_:
+            prj_['vendor'] = v
+            project[path_] = prj_
     for key in project:
-        resolve_hdl_project(project[key], library)
+        resolve_hdl_project(project[key], library, index)
 
     return project, library
 
@@ -182,14 +359,26 @@ def makefile_post(
         write_hdl_project_makefile(project, key)
 
 
-def regmap_pre() -> Dict:
+def regmap_task(ctime: float, file: str, cachedir: str) -> Tuple[str, Dict]:
+    """
+    load_hdl_regmap, with the cache key of the file, so the cache is pruned
+    without hashing the files again.
+    """
+    hash_ = get_hash(file)
+    return (regmap_cache_key(hash_),
+            load_hdl_regmap(ctime, file, cachedir, hash_))
+
+
+def regmap_pre(pool: Optional[ProcessPoolExecutor] = None) -> Dict:
     """
     Generate HDL Register Map dictionary
     """
     rm = {}
     regdir = path.join('docs', 'regmap')
+    cachedir = path.join(cache_dir, 'regmap')
+    args = []
     for (dirpath, dirnames, filenames) in walk(regdir):
-        for file in filenames:
+        for file in sorted(filenames):
             file_ = path.join(dirpath, file)
             m = re.search("adi_regmap_(\\w+)\\.txt", file)
             if not bool(m):
@@ -197,7 +386,12 @@ def regmap_pre() -> Dict:
 
             reg_name = m.group(1)
             ctime = path.getctime(file_)
-            rm[reg_name] = parse_hdl_regmap(ctime, file_)
+            args.append((reg_name, (ctime, file_, cachedir)))
+
+    obj = parse_pool(pool, regmap_task, [a for _, a in args])
+    for (reg_name, _), (_, regmap) in zip(args, obj):
+        rm[reg_name] = regmap
+    cache_prune(cachedir, [key for key, _ in obj])
     resolve_hdl_regmap(rm)
     expand_hdl_regmap(rm)
     return rm
@@ -8,6 +8,10 @@ import importlib
 
 from sphinx.application import Sphinx
 
+from .watch import watcher
+from .server import notifier, handler, file_cache, snapshot
+from .worker import worker
+
 log = {
     'no_mk': "File Makefile not found, is {} a docs folder?",
     'inv_mk': "Failed parse Makefile, is {} a docs folder?",
@@ -27,8 +31,8 @@ log = {
 
 # Hall of shame of poorly managed artifacts
 unmanaged = []
-# Avoid
-first_run = True
+# Doc sources watched
+doc_types = ('.rst', '.svg', '.txt', '.png', '.jpg', '.jpeg', '.py')
 
 @click.command()
 @click.option(
@@ -78,18 +82,14 @@ def serve(directory, port, dev, selenium, once, builder):
     """
     Watch the docs and source code to rebuild it on edit.
     Two html live update strategies are available:
-    Pooling: The webpage pools timestamp changes on the .dev-pool file.
+    Pooling: The webpage is notified of the builds by the server.
     Selenium: Page reloads through Firefox's API.
     """
 
-    import glob
     import re
-    import sched
-    import time
     import threading
     import signal
     import http.server
-    import socketserver
     import subprocess
     import sys
 
@@ -117,8 +117,6 @@ def serve(directory, port, dev, selenium, once, builder):
         if not importlib.util.find_spec("weasyprint"):
             click.echo(log['no_weasyprint'])
             return
-        from weasyprint import HTML, CSS
-        from weasyprint.text.fonts import FontConfiguration
         builder = 'singlehtml'
 
     source_files = {'app.umd.js', 'app.umd.js.map', 'style.min.css',
@@ -129,6 +127,7 @@ def serve(directory, port, dev, selenium, once, builder):
         if builder == 'html':
             click.echo("Shutting down server")
             with lock:
+                reload.close()
                 http.shutdown()
                 http.server_close()
             http_thread._stop()
@@ -240,37 +239,64 @@ def serve(directory, port, dev, selenium, once, builder):
 
     if builder == 'singlehtml':
         singlehtml_file = path.join(builddir, 'index.html')
-        font_config = FontConfiguration()
-        from .aux_print import sanitize_singlehtml
+        from .aux_print import sanitize_singlehtml, incremental_pdf
+        # Keeps the rendered volumes from build to build
+        pdf = incremental_pdf()
 
     def update_pdf():
         html_ = sanitize_singlehtml(singlehtml_file)
 
-        click.echo("preparing pdf styles...")
-
-        font_config = FontConfiguration()
         src_dir = path.abspath(path.join(path.dirname(__file__), pardir, pardir))
         cosmic = path.join('adi_doctools', 'theme', 'cosmic')
-        css = CSS(path.join(src_dir, cosmic, 'static', 'style.min.css'),
-                  font_config=font_config)
-        css_extra = CSS(path.join(src_dir, cosmic, 'style', 'weasyprint.css'),
-                        font_config=font_config)
+        css_files = [path.join(src_dir, cosmic, 'static', 'style.min.css'),
+                     path.join(src_dir, cosmic, 'style', 'weasyprint.css')]
 
         click.echo("rendering pdf content...")
-        html = HTML(string=html_, base_url=path.dirname(singlehtml_file))
-
-        document = html.render(stylesheets=[css, css_extra])
-
-        click.echo("writing pdf...")
-        document.write_pdf(path.join(builddir, '..', 'output.pdf'))
+        pdf.write(html_, path.dirname(singlehtml_file), css_files,
+                  path.join(builddir, '..', 'output.pdf'))
 
     if not with_selenium and builder == 'html':
         environ["ADOC_DEVPOOL"] = ""
 
     app = Sphinx(directory, directory,  builddir, doctreedir, builder)
 
-    watch_file_src = {}
-    watch_file_rst = {}
+    skip_dir = path.abspath(path.join(directory, builddir_))
+
+    def skip_file(file):
+        return (path.basename(file).startswith('.') or file == skip_dir or
+                any(u in file for u in unmanaged))
+
+    # Before the first build, so edits meanwhile trigger a rebuild
+    watch = None
+    if not once:
+        watch = watcher([sourcedir], lambda f: f.endswith(doc_types),
+                        skip_file)
+
+    def track_hdl_inputs():
+        # The HDL directives inputs, like the component.xml, are outside
+        # the source dir
+        if watch is not None and hasattr(app.env, 'hdl_inputs'):
+            watch.track(app.env.hdl_inputs)
+
+    # Pages written by the last build, for the live reload
+    written = set()
+    # and the output files written since the last snapshot, the ones of a
+    # failed build included, considered up to date by the next one
+    written_files = set()
+
+    def note_page(app, pagename, templatename, context, doctree):
+        written.add(app.builder.get_target_uri(pagename))
+        written_files.add(path.relpath(app.builder.get_outfilename(pagename),
+                                       app.outdir))
+
+    app.connect('html-page-context', note_page)
+
+    def build():
+        written.clear()
+        app.build()
+        track_hdl_inputs()
+
+    watch_file_src = set()
     if dev:
         source_files.add('icons.svg')
         w_files = []
@@ -290,10 +316,10 @@ def serve(directory, port, dev, selenium, once, builder):
                 return
 
         # Build doc the first time
-        app.build()
-        for f, s in zip(w_files, source_files):
-            watch_file_src[f] = path.getctime(f)
+        build()
+        watch_file_src.update(w_files)
         if not once:
+            watch.track(w_files)
             # Run rollup in watch mode
             cmd = f"{rollup_bin} -c {rollup_conf} --watch"
             rollup_p = subprocess.Popen(cmd, shell=True, cwd=par_dir,
@@ -302,24 +328,35 @@ def serve(directory, port, dev, selenium, once, builder):
             update_pdf()
     else:
         # Build doc the first time
-        app.build()
+        build()
         if builder == "singlehtml":
             update_pdf()
 
     if once:
         return
 
-    class Handler(http.server.SimpleHTTPRequestHandler):
-        def __init__(self, *args, **kwargs):
-            global builddir
-            super().__init__(*args, directory=builddir, **kwargs)
+    reload = notifier()
+    cache = file_cache()
+    # Served from snapshots of the output, swapped after each good build
+    output = snapshot(builddir, path.join(directory, builddir_, '.serve'))
 
-        def log_message(self, format, *args):
-            return
+    def publish():
+        # Make through a subprocess writes no page events
+        output.publish(None if dev else written_files)
+        written_files.clear()
+
+    if builder == "html":
+        publish()
+
+    class Handler(handler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=output.current,
+                             notifier=reload, cache=cache, **kwargs)
 
     if builder == "html":
         try:
-            http = socketserver.TCPServer(("", port), Handler)
+            # Threaded, the live reload streams hold their connections
+            http = http.server.ThreadingHTTPServer(("", port), Handler)
             lock = threading.Lock()
             http_thread = threading.Thread(target=http.serve_forever)
             http_thread.daemon = True
@@ -331,85 +368,21 @@ def serve(directory, port, dev, selenium, once, builder):
             return
     signal.signal(signal.SIGINT, signal_handler)
 
-    dev_pool = path.join(builddir, '.dev-pool')
-
-    def update_dev_pool():
-        dev_f = open(dev_pool, 'w')
-        dev_f.write(str(time.time()))
-        dev_f.close()
-
     if with_selenium:
         from selenium import webdriver
 
-        # Remove pooling method flag
-        if path.isfile(dev_pool):
-            remove(dev_pool)
-
         driver = webdriver.Firefox()
 
         driver.get(f"http://0.0.0.0:{port}")
-    elif builder == "html":
-        update_dev_pool()
-
-    def get_doc_sources():
-        types = ['*.rst', '*.svg', '*.txt', '*.png', '*.jpg', '*.jpeg', '*.py']
-        files = []
-        ctime = []
-        for typ in types:
-            glob_ = path.join(sourcedir, typ)
-            _files = glob.glob(glob_)
-            __files = [path.abspath(f) for f in _files]
-            files.extend(__files)
-            for f in __files:
-                ctime.append(path.getctime(f))
-        dirs = [d for d in listdir(sourcedir)
-                if path.isdir(path.join(sourcedir, d))]
-        if builddir_ in dirs:
-            dirs.remove(builddir_)
-        for d in dirs:
-            for typ in types:
-                glob_ = path.join(sourcedir, d, '**', typ)
-                _files = glob.glob(glob_, recursive=True)
-                __files = [path.abspath(f) for f in _files]
-                for f in __files:
-                    if not path.isfile(f):
-                        continue
-                    ctime_ = path.getctime(f)
-                    ctime.append(ctime_)
-                    files.append(f)
-        return (files, ctime)
-
-
-    def check_files(scheduler):
-        global first_run
-        update_sphinx = False
-        update_page = False
-        for file, ctime in zip(*get_doc_sources()):
-            if file not in watch_file_rst or ctime > watch_file_rst[file]:
-                update_sphinx = True
-                watch_file_rst[file] = ctime
-                for u in unmanaged:
-                    if u in file:
-                        watch_file_rst[file] = sys.float_info.max
-                        update_sphinx = False
-                        break
-        for file in watch_file_src:
-            if not path.isfile(file):
-                continue
-            ctime = path.getctime(file)
-            if ctime > watch_file_src[file]:
-                update_page = True
-                watch_file_src[file] = ctime
+
+    def check_files(changed):
+        update_page = bool(changed & watch_file_src)
+        update_sphinx = bool(changed - watch_file_src)
 
         if not path.isdir(builddir):
             # User did make clean
             update_sphinx = True
 
-        if first_run is True:
-            first_run = False
-            update_page = False
-            update_sphinx = False
-
         if update_sphinx:
             if dev:
                 # Uses subprocess because creating a new Sphinx class:
@@ -420,13 +393,20 @@ def serve(directory, port, dev, selenium, once, builder):
                 # Maybe importlib.reload() + monkey patch could be an alternative,
                 # but not triggering full env reload would be tricky, so this is good
                 # enough.
-                subprocess.call(f"make {builder}", shell=True, cwd=directory)
+                if subprocess.call(f"make {builder}", shell=True,
+                                   cwd=directory) != 0:
+                    # Keep serving the last good output
+                    click.echo("Build failed, waiting for changes.")
+                    return True
             else:
-                app.build()
+                build()
         if update_page:
             for f, s in zip(w_files, source_files):
                 copy(f, path.join(builddir, '_static', s))
         if update_sphinx or update_page:
+            if builder == "html":
+                publish()
+            cache.clear()
             if with_selenium:
                 try:
                     driver.execute_script("location.reload();")
@@ -435,20 +415,28 @@ def serve(directory, port, dev, selenium, once, builder):
                     if dev:
                         killpg(getpgid(rollup_p.pid), signal.SIGTERM)
                     with lock:
+                        reload.close()
                         http.shutdown()
                         http.server_close()
                     http_thread._stop()
-                    return
+                    return False
             elif builder == "html":
-                update_dev_pool()
+                # Make through a subprocess writes no page events
+                reload.notify(None if dev or update_page else written)
             elif builder == 'singlehtml':
                 update_pdf()
-
-        scheduler.enter(1, 1, check_files, (scheduler,))
-
-    scheduler = sched.scheduler(time.time, time.sleep)
-    scheduler.enter(1, 1, check_files, (scheduler,))
-    scheduler.run()
+        return True
+
+    # Built at a thread, the changes seen meanwhile are coalesced into a
+    # single follow-up build
+    builds = worker(check_files)
+    # A build still reading is abandoned if more sources changed
+    builds.connect(app)
+
+    while not builds.closed:
+        changed = watch.wait(1)
+        if changed or (not path.isdir(builddir) and builds.idle()):
+            builds.request(changed, stale=bool(changed - watch_file_src))
 
 @click.command()
 @click.option(
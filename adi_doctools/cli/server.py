@@ -0,0 +1,354 @@
+from typing import Optional, Iterable, Tuple, List, Dict
+
+import io
+import json
+import uuid
+import threading
+import http.server
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from os import path, stat, walk, makedirs, link, listdir
+from shutil import copy2, rmtree
+from stat import S_ISREG
+from urllib.parse import urlsplit
+
+# Path of the live reload Server-Sent Events stream
+events_path = '/.dev-events'
+# Precompressed variants, by preference
+encodings = (('br', '.br'), ('gzip', '.gz'))
+
+
+class notifier:
+    """
+    Broadcast the end of each build to the live reload clients.
+    """
+    def __init__(self):
+        self.cond = threading.Condition()
+        # Tells apart the serve instances
+        self.id = uuid.uuid4().hex[:8]
+        self.build = 0
+        self.pages = None
+        self.closed = False
+
+    def notify(self, pages: Optional[Iterable[str]] = None) -> None:
+        """
+        Signal a new build, with the output pages written, or None if
+        every page should reload.
+        """
+        with self.cond:
+            self.build += 1
+            self.pages = None if pages is None else sorted(pages)
+            self.cond.notify_all()
+
+    def wait(
+        self,
+        build: int,
+        timeout: float
+    ) -> Tuple[int, Optional[List[str]]]:
+        """
+        Wait for a build after build, return it and its pages.
+        The pages are None if more than one build happened meanwhile.
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: self.build != build or self.closed,
+                               timeout)
+            if self.build == build + 1:
+                return (self.build, self.pages)
+            return (self.build, None)
+
+    def close(self) -> None:
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+class snapshot:
+    """
+    Published copies of the build output, so the server never sees the
+    pages being written.
+    Sphinx writes its output files in place, so the snapshots can't share
+    them; instead, each snapshot hard links the unchanged files from the
+    previous one, which is never written to, and copies the others.
+    The last two snapshots are kept, for the requests still on the
+    previous one.
+    The first snapshot copies the whole output and each one recreates its
+    folders, so on large builds, like the aggregated docs, prefer to pass
+    the pages written to publish, to link the others without a stat.
+    """
+    def __init__(self, outdir: str, dir_: str):
+        self.outdir = outdir
+        self.dir_ = dir_
+        self.current = None
+        self.n = 0
+        # Stat of the output files when copied, relative path to mtime, size
+        self.manifest = {}
+        # Pages written by the builds, relative path
+        self.pages = set()
+        if path.isdir(dir_):
+            rmtree(dir_)
+
+    def publish(self, pages: Optional[Iterable[str]] = None) -> str:
+        """
+        Snapshot the output and return the new snapshot folder.
+        pages are the output files written since the last snapshot,
+        relative to the output folder; the pages not in it are linked as
+        is. If None, every file is checked.
+        """
+        new = path.join(self.dir_, str(self.n))
+        self.n += 1
+        manifest = {}
+        if pages is not None:
+            pages = {path.normpath(p) for p in pages}
+        for dirpath, _, filenames in walk(self.outdir):
+            rel_dir = path.relpath(dirpath, self.outdir)
+            makedirs(path.join(new, rel_dir), exist_ok=True)
+            for file in filenames:
+                rel = path.normpath(path.join(rel_dir, file))
+                src = path.join(self.outdir, rel)
+                dest = path.join(new, rel)
+                if pages is not None and rel in self.pages and \
+                   rel not in pages and rel in self.manifest:
+                    try:
+                        link(path.join(self.current, rel), dest)
+                        manifest[rel] = self.manifest[rel]
+                        continue
+                    except OSError:
+                        pass
+                try:
+                    st = stat(src)
+                except OSError:
+                    continue
+                manifest[rel] = (st.st_mtime_ns, st.st_size)
+                if self.current is not None and \
+                   self.manifest.get(rel) == manifest[rel]:
+                    try:
+                        link(path.join(self.current, rel), dest)
+                        continue
+                    except OSError:
+                        pass
+                copy2(src, dest)
+        self.manifest = manifest
+        if pages is not None:
+            self.pages |= pages
+        self.pages &= manifest.keys()
+
+        prev = self.current
+        self.current = new
+        for d in listdir(self.dir_):
+            d = path.join(self.dir_, d)
+            if d not in (prev, new):
+                rmtree(d, ignore_errors=True)
+        return new
+
+
+class file_cache:
+    """
+    LRU of the served files, with their precompressed variants.
+    Entries are trusted until cleared, which is done after each build.
+    Files larger than max_item are only stat'ed, and read at each request.
+    """
+    def __init__(self, max_size: int = 64 << 20, max_item: int = 4 << 20):
+        self.lock = threading.Lock()
+        self.entry = OrderedDict()
+        self.max_size = max_size
+        self.max_item = max_item
+        self.size = 0
+        self.gen = 0
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entry.clear()
+            self.size = 0
+            self.gen += 1
+
+    def load(self, file: str) -> Dict[str, Tuple]:
+        """
+        Return the (etag, mtime, size, body) per encoding of a file.
+        """
+        variants = {}
+        for enc, ext in (('', ''),) + encodings:
+            try:
+                st = stat(file + ext)
+            except OSError:
+                continue
+            if not S_ISREG(st.st_mode):
+                continue
+            body = None
+            if st.st_size <= self.max_item:
+                try:
+                    with open(file + ext, 'rb') as f:
+                        body = f.read()
+                except OSError:
+                    continue
+            etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}{enc}"'
+            size = st.st_size if body is None else len(body)
+            variants[enc] = (etag, st.st_mtime, size, body)
+        return variants
+
+    def get(self, file: str) -> Optional[Dict[str, Tuple]]:
+        with self.lock:
+            if file in self.entry:
+                self.entry.move_to_end(file)
+                return self.entry[file]
+            gen = self.gen
+
+        variants = self.load(file)
+        if '' not in variants:
+            return None
+
+        size = sum(len(v[3]) for v in variants.values() if v[3] is not None)
+        with self.lock:
+            # Not if cleared meanwhile, it may be from the previous build
+            if gen == self.gen and file not in self.entry:
+                self.entry[file] = variants
+                self.size += size
+                while self.size > self.max_size and len(self.entry) > 1:
+                    _, v_ = self.entry.popitem(last=False)
+                    self.size -= sum(len(v[3]) for v in v_.values()
+                                     if v[3] is not None)
+        return variants
+
+
+class handler(http.server.SimpleHTTPRequestHandler):
+    """
+    Serve the build output, plus the live reload stream.
+    Files are served from the cache, with validators to answer the
+    conditional requests, and precompressed variants if present.
+    """
+    # Keep-alive, pages request dozens of assets
+    protocol_version = 'HTTP/1.1'
+    # Seconds between the comments keeping the events stream alive
+    keep_alive = 15
+
+    def __init__(
+        self,
+        *args,
+        notifier: notifier,
+        cache: Optional[file_cache] = None,
+        **kwargs
+    ):
+        self.notifier = notifier
+        self.cache = cache
+        super().__init__(*args, **kwargs)
+
+    def log_message(self, format, *args):
+        return
+
+    def do_GET(self):
+        # Also with a query, e.g. a cache buster
+        if urlsplit(self.path).path == events_path:
+            self.send_events()
+        else:
+            super().do_GET()
+
+    def encoding(self, variants: Dict[str, Tuple]) -> str:
+        accept = self.headers.get('Accept-Encoding', '')
+        accept = {a.split(';')[0].strip() for a in accept.split(',')}
+        for enc, _ in encodings:
+            if enc in variants and enc in accept:
+                return enc
+        return ''
+
+    def not_modified(self, etag: str, mtime: float) -> bool:
+        inm = self.headers.get('If-None-Match')
+        if inm is not None:
+            return inm.strip() == '*' or etag in (
+                t.strip() for t in inm.split(','))
+        ims = self.headers.get('If-Modified-Since')
+        if ims is None:
+            return False
+        try:
+            ims = parsedate_to_datetime(ims)
+        except (TypeError, ValueError):
+            return False
+        return ims.tzinfo is not None and int(mtime) <= ims.timestamp()
+
+    def send_head(self):
+        if self.cache is None:
+            return super().send_head()
+
+        file = self.translate_path(self.path)
+        if path.isdir(file):
+            # Redirects and listings
+            if not urlsplit(self.path).path.endswith('/'):
+                return super().send_head()
+            file = path.join(file, 'index.html')
+        variants = self.cache.get(file)
+        if variants is None:
+            return super().send_head()
+
+        enc = self.encoding(variants)
+        etag, mtime, size, body = variants[enc]
+        if self.not_modified(etag, mtime):
+            self.send_response(304)
+            self.send_validators(variants, etag, mtime)
+            self.end_headers()
+            return None
+
+        if body is None:
+            try:
+                f = open(file + dict(encodings).get(enc, ''), 'rb')
+            except OSError:
+                self.send_error(404, "File not found")
+                return None
+        else:
+            f = io.BytesIO(body)
+        self.send_response(200)
+        self.send_header('Content-Type', self.guess_type(file))
+        self.send_header('Content-Length', str(size))
+        if enc:
+            self.send_header('Content-Encoding', enc)
+        self.send_validators(variants, etag, mtime)
+        self.end_headers()
+        return f
+
+    def send_validators(
+        self,
+        variants: Dict[str, Tuple],
+        etag: str,
+        mtime: float
+    ) -> None:
+        if len(variants) > 1:
+            self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', self.date_time_string(mtime))
+        # Revalidate, the output changes at each build
+        self.send_header('Cache-Control', 'no-cache')
+
+    def send_event(self, event: str, data: str) -> None:
+        self.wfile.write(f"event: {event}\ndata: {data}\n\n".encode())
+        self.wfile.flush()
+
+    def send_events(self) -> None:
+        """
+        Keep the connection open, sending an event per build.
+        The events carry the current build, so a client that reconnects,
+        e.g. to a restarted serve, can tell it missed one.
+        """
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        # Delimited by the connection close
+        self.close_connection = True
+
+        n = self.notifier
+        build = n.build
+        try:
+            self.send_event('hello', f"{n.id}.{build}")
+            while not n.closed:
+                build_, pages = n.wait(build, self.keep_alive)
+                if n.closed:
+                    break
+                if build_ == build:
+                    # Keep alive, also detects the closed connections
+                    self.wfile.write(b": \n\n")
+                    self.wfile.flush()
+                    continue
+                build = build_
+                self.send_event('reload', json.dumps({
+                    'build': f"{n.id}.{build}",
+                    'pages': pages
+                }))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
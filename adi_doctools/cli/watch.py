@@ -0,0 +1,290 @@
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+import ctypes
+import ctypes.util
+import select
+import struct
+import sys
+import time
+import threading
+from os import path, scandir, read, close, O_NONBLOCK, O_CLOEXEC
+
+from ..parser.cache import file_state
+
+# inotify(7) event masks
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+# Content changes only, attribute (ctime) changes are not of interest
+in_mask = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+           IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+in_event = struct.Struct('iIII')
+
+
+class inotify:
+    """
+    Minimal inotify binding, watching directories non-recursively.
+    Raises OSError if unavailable, e.g. not Linux or out of watches.
+    """
+    def __init__(self):
+        if not sys.platform.startswith('linux'):
+            raise OSError("inotify is only available on Linux")
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.add_watch_ = libc.inotify_add_watch
+        self.add_watch_.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                    ctypes.c_uint32]
+        self.fd = libc.inotify_init1(O_NONBLOCK | O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.wd = {}
+
+    def add_watch(self, dir_: str) -> None:
+        wd = self.add_watch_(self.fd, dir_.encode(), in_mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch {dir_}")
+        self.wd[wd] = dir_
+
+    def read(self, timeout: Optional[float]) -> Optional[list]:
+        """
+        Return the (mask, file) of the pending events, waiting up to timeout
+        for the first, or None on queue overflow.
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            buf = read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+
+        events = []
+        i = 0
+        while i < len(buf):
+            wd, mask, _, len_ = in_event.unpack_from(buf, i)
+            i += in_event.size
+            name = buf[i:i+len_].rstrip(b'\0').decode(errors='surrogateescape')
+            i += len_
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if wd not in self.wd:
+                continue
+            if mask & IN_IGNORED:
+                del self.wd[wd]
+                continue
+            dir_ = self.wd[wd]
+            events.append((mask, path.join(dir_, name) if name else dir_))
+        return events
+
+    def close(self) -> None:
+        close(self.fd)
+
+
+class watcher:
+    """
+    Watch the files matched under the dirs, plus individual files, and
+    report the ones whose content changed.
+    Backed by inotify, with a polling fallback where it is unavailable.
+    Bursts of events, like a git checkout or an editor save, are debounced
+    into a single report, and files are compared by content hash, so a
+    touch or ctime only change is not reported.
+    """
+    def __init__(
+        self,
+        dirs: Iterable[str],
+        match: Callable[[str], bool],
+        skip: Callable[[str], bool],
+        debounce: float = 0.2,
+        max_debounce: float = 2,
+        interval: float = 1
+    ):
+        self.dirs = [path.abspath(d) for d in dirs]
+        self.match = match
+        self.skip = skip
+        self.debounce = debounce
+        self.max_debounce = max_debounce
+        self.interval = interval
+        self.files = set()
+        self.state: Dict[str, Optional[Tuple]] = {}
+        self.lock = threading.Lock()
+        self.tracked = []
+
+        try:
+            self.inotify = inotify()
+        except OSError:
+            self.inotify = None
+        self.scan()
+
+    def walk(self, dir_: str) -> Iterable[str]:
+        """
+        Yield the matched files under dir_, adding watches to the folders
+        if backed by inotify.
+        """
+        stack = [dir_]
+        while stack:
+            dir_ = stack.pop()
+            if self.inotify is not None:
+                try:
+                    self.inotify.add_watch(dir_)
+                except OSError:
+                    # Likely max_user_watches, poll instead
+                    self.inotify.close()
+                    self.inotify = None
+            try:
+                it = scandir(dir_)
+            except OSError:
+                continue
+            with it:
+                for e in it:
+                    if self.skip(e.path):
+                        continue
+                    if e.is_dir(follow_symlinks=False):
+                        stack.append(e.path)
+                    elif self.match(e.path):
+                        yield e.path
+
+    def scan(self) -> Set[str]:
+        """
+        List all files again, return the ones whose content changed.
+        """
+        found = set(self.files)
+        for d in self.dirs:
+            found.update(self.walk(d))
+        if self.inotify is not None:
+            for f in self.files:
+                self.watch_parent(f)
+        return self.check(found | set(self.state))
+
+    def watch_parent(self, file: str) -> None:
+        dir_ = path.dirname(file)
+        if dir_ in self.inotify.wd.values():
+            return
+        try:
+            self.inotify.add_watch(dir_)
+        except OSError:
+            pass
+
+    def track(self, files: Iterable[str]) -> None:
+        """
+        Also watch individual files, e.g. outside the dirs.
+        Can be called from other threads, the files are added by the next
+        wait, with their content at that time as the reference.
+        """
+        files = [path.abspath(f) for f in files]
+        with self.lock:
+            self.tracked.extend(files)
+
+    def add_tracked(self) -> None:
+        with self.lock:
+            files = self.tracked
+            self.tracked = []
+        for f in files:
+            if f in self.files:
+                continue
+            self.files.add(f)
+            if f not in self.state:
+                self.state[f] = file_state(f)
+            if self.inotify is not None:
+                self.watch_parent(f)
+
+    def check(self, files: Iterable[str]) -> Set[str]:
+        """
+        Compare the files to their last known state, by stat and then by
+        content hash.
+        """
+        changed = set()
+        for f in files:
+            prev = self.state.get(f)
+            state = file_state(f, prev)
+            if state is None:
+                self.state.pop(f, None)
+                if prev is not None:
+                    changed.add(f)
+                continue
+            self.state[f] = state
+            if prev is None or prev[1] != state[1]:
+                changed.add(f)
+        return changed
+
+    def candidate(self, mask: int, file: str) -> Set[str]:
+        """
+        The files an event may have changed.
+        """
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                if not self.skip(file):
+                    return set(self.walk(file))
+            elif mask & (IN_MOVED_FROM | IN_DELETE):
+                return {f for f in self.state
+                        if f.startswith(file + path.sep)}
+        elif mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            pass
+        elif file in self.files or (
+                not self.skip(file) and self.match(file) and
+                any(file.startswith(d + path.sep) for d in self.dirs)):
+            return {file}
+        return set()
+
+    def events(self, timeout: Optional[float]) -> Optional[Set[str]]:
+        """
+        Wait for a batch of events, return the candidate files, or None
+        if everything has to be scanned again.
+        The batch ends once no candidate came for the debounce time, or
+        max_debounce after the first, other events in the watched folders,
+        like the logs of a tool, are not taken into account.
+        """
+        now = time.monotonic()
+        end = None if timeout is None else now + timeout
+        files = set()
+        while True:
+            left = None if end is None else max(0, end - time.monotonic())
+            events = self.inotify.read(left)
+            if events is None:
+                return None
+            for mask, file in events:
+                files_ = self.candidate(mask, file)
+                if self.inotify is None:
+                    return None
+                if not files_:
+                    continue
+                now = time.monotonic()
+                if not files:
+                    last = now + self.max_debounce
+                files.update(files_)
+                # Wait for the burst to settle
+                end = min(now + self.debounce, last)
+            if files and time.monotonic() >= end:
+                return files
+            if not events and not files:
+                return files
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        """
+        Block until files changed, or the timeout, return the changed
+        files, possibly empty.
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self.add_tracked()
+            left = None if end is None else max(0, end - time.monotonic())
+            if self.inotify is not None:
+                files = self.events(left)
+                changed = self.scan() if files is None else self.check(files)
+            else:
+                time.sleep(self.interval if left is None
+                           else min(self.interval, left))
+                changed = self.scan()
+            if changed or (end is not None and time.monotonic() >= end):
+                return changed
+
+    def close(self) -> None:
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
@@ -0,0 +1,149 @@
+from typing import Callable, Set
+
+import threading
+import traceback
+from os import path, link, replace, remove, getpid
+
+import click
+from sphinx.application import ENV_PICKLE_FILENAME
+from sphinx.errors import SphinxError
+
+
+class build_cancelled(SphinxError):
+    """
+    Raised from a Sphinx event to abandon a stale build.
+    A SphinxError, so Sphinx doesn't wrap it into an ExtensionError.
+    """
+    category = 'Build cancelled'
+
+
+class worker:
+    """
+    Run the builds at a thread, so the watcher and server stay responsive.
+    The changes requested during a build are coalesced into a single
+    follow-up build.
+    The build function gets the changed files, and returns False to stop
+    the worker.
+    """
+    def __init__(self, build: Callable[[Set[str]], bool]):
+        self.build = build
+        self.cond = threading.Condition()
+        self.pending = set()
+        self.requested = False
+        self.busy = False
+        self.stale = False
+        self.closed = False
+        # Docs to read by the build, and to read again after a cancel
+        self.reading = set()
+        self.retry = set()
+        # The parallel reads run at forked processes, that don't see stale
+        self.pid = getpid()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def request(self, changed: Set[str], stale: bool = True) -> None:
+        """
+        Schedule a build, and if stale, flag the running one, if any, as so.
+        """
+        with self.cond:
+            self.pending |= changed
+            self.requested = True
+            self.stale |= self.busy and stale
+            self.cond.notify_all()
+
+    def idle(self) -> bool:
+        with self.cond:
+            return not self.busy and not self.requested
+
+    def connect(self, app) -> None:
+        """
+        Abandon the builds of app still reading when stale.
+        Serial reads are abandoned at the next doc, parallel ones once all
+        docs are read, since the read processes don't see the flag.
+        Builds are not cancelled while writing, the pages left unwritten
+        would not be considered outdated by the next build.
+        """
+        app.connect('env-get-outdated', self.outdated)
+        app.connect('env-before-read-docs', self.before_read)
+        app.connect('source-read', self.cancel_stale)
+        app.connect('env-updated', self.cancel_stale)
+        app.connect('build-finished', self.finished)
+
+    @staticmethod
+    def env_backup(app):
+        file = path.join(app.doctreedir, ENV_PICKLE_FILENAME)
+        return (file, f"{file}.cancel")
+
+    def outdated(self, app, env, added, changed, removed):
+        """
+        The docs of a cancelled build, some may be outdated only by
+        other env-get-outdated handlers, that no longer report them, and
+        the ones already read would not be written otherwise.
+        """
+        docnames = (self.retry - removed) & env.found_docs
+        self.retry = set()
+        return list(docnames)
+
+    def before_read(self, app, env, docnames):
+        self.reading = set(docnames)
+        # Sphinx removes the environment pickle if the build fails, keep
+        # it, so a cancel doesn't cause a full build on the next serve
+        file, backup = self.env_backup(app)
+        if path.isfile(backup):
+            remove(backup)
+        if path.isfile(file):
+            link(file, backup)
+
+    def cancel_stale(self, *args) -> None:
+        """
+        Sphinx event handler, abandons the build if stale.
+        """
+        if self.stale and getpid() == self.pid:
+            self.retry |= self.reading
+            raise build_cancelled("Sources changed, restarting the build.")
+
+    def finished(self, app, exc):
+        file, backup = self.env_backup(app)
+        if not path.isfile(backup):
+            return
+        if isinstance(exc, build_cancelled):
+            replace(backup, file)
+        else:
+            remove(backup)
+
+    def run(self) -> None:
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.requested or self.closed)
+                if self.closed:
+                    return
+                changed = self.pending
+                self.pending = set()
+                self.requested = False
+                self.stale = False
+                self.busy = True
+
+            ret = True
+            try:
+                ret = self.build(changed)
+            except build_cancelled:
+                click.echo("Sources changed, restarting the build.")
+                # Retry along with the changes that cancelled it
+                with self.cond:
+                    self.pending |= changed
+                    self.requested = True
+            except Exception:
+                # Keep serving the last output, the next edit may fix it
+                click.echo(traceback.format_exc())
+                click.echo("Build failed, waiting for changes.")
+            finally:
+                with self.cond:
+                    self.busy = False
+                    self.cond.notify_all()
+            if ret is False:
+                self.close()
+
+    def close(self) -> None:
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
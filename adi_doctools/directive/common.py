@@ -3,6 +3,7 @@ from typing import List, Optional
 from docutils import nodes
 from docutils.statemachine import ViewList
 from docutils.parsers.rst import Directive, directives
+from sphinx import addnodes
 from sphinx.util import logging
 from sphinx.util.docutils import SphinxDirective
 from sphinx.directives.code import container_wrapper
@@ -36,24 +37,113 @@ def length_or_percentage_or_unitless_list(argument):
     return [directives.length_or_percentage_or_unitless(entry) for entry in entries]
 
 
+# A single line starting with a letter or digit, without inline markup
+plain_text = re.compile("[^\\W_][^*`|\\[\\]\\\\\\n\\r\\t@]*")
+# Yet could be a literal block, role, uri, reference or enumerated list
+plain_text_markup = re.compile("::|:\\S|\\w_(\\W|$)|^(\\w+[.)]|\\(\\w+\\))\\s|\\s$")
+
+
+def is_plain_text(text: str) -> bool:
+    return (plain_text.fullmatch(text) is not None and
+            plain_text_markup.search(text) is None)
+
+
 def parse_rst(state, content, uid: Optional[str] = None):
     """
     Parses rst markup, content can be:
     * String
     * List: ["my", "line", "", "my other line"]
     * Docutils ViewList
+    Plain text lines become a paragraph without parsing, other strings and
+    lists are memoized for the build, across docs, e.g. the descriptions of
+    reserved fields.
     """
+    node = nodes.section()
+    node.document = state.document
+    content = [content] if isinstance(content, str) else content
     if uid is None:
         uid = f"virtual_{str(uuid4())}"
-    content = [content] if isinstance(content, str) else content
+    key = None
+    if isinstance(content, list) and len(content) > 0:
+        if all(is_plain_text(line) for line in content):
+            text = '\n'.join(content)
+            paragraph = nodes.paragraph(text, text)
+            paragraph.source, paragraph.line = uid, 1
+            node += paragraph
+            return node
+
+        key = tuple(content)
+        memo = getattr(state.document.settings.env, 'parse_rst_memo', None)
+        if memo is not None and key in memo:
+            copy = attach(memo[key].deepcopy(), state.document)
+            node += stamp(copy, state.document, uid).children
+            return node
+
     rst = ViewList(source=uid, initlist=content)
-    node = nodes.section()
-    node.document = state.document
     # TODO improve nested parse warnings, e.g. manipulate docname, lineno, add label
     state.nested_parse(rst, 0, node)
+
+    if key is not None and memo is not None and is_reusable(node):
+        # Copied detached, a copy in the document would get the source of
+        # the nodes without one
+        memo[key] = attach(node, None).deepcopy()
+        attach(node, state.document)
     return node
 
 
+def attach(node, document):
+    """
+    Set the document of a node tree, e.g. of a copy from another doc, or
+    None to store it without the document.
+    """
+    for n in node.findall(nodes.Element):
+        n.document = document
+    return node
+
+
+def stamp(node, document, source: str):
+    """
+    Set the doc of the references and the source of the nodes of a copy.
+    """
+    docname = document.settings.env.docname
+    for n in node.findall(nodes.Element):
+        if isinstance(n, addnodes.pending_xref):
+            n['refdoc'] = docname
+        if n.source is not None:
+            n.source = source
+    return node
+
+
+def parse_rst_memo_init(app, env, docnames):
+    env.parse_rst_memo = {}
+
+
+def parse_rst_memo_clear(app, env):
+    # Not pickled with the env
+    if hasattr(env, 'parse_rst_memo'):
+        del env.parse_rst_memo
+
+
+def is_reusable(node) -> bool:
+    """
+    Whether copies of a parsed node tree can be used in place of parsing
+    again, that is, it has no warnings a copy would not reissue, nor
+    pending transforms, ids, names and anonymous references the document
+    registered for the original only.
+    The ids of the collapsible inputs are not registered.
+    """
+    for n in node.findall(nodes.Element):
+        if n is node:
+            continue
+        if isinstance(n, (nodes.system_message, nodes.pending)):
+            return False
+        if n['names'] or n.get('anonymous'):
+            return False
+        if n['ids'] and not isinstance(n, node_input):
+            return False
+    return True
+
+
 class directive_base(Directive):
     has_content = True
     add_index = True
@@ -738,3 +828,6 @@ def common_setup(app):
 
     app.add_config_value('hide_collapsible_content',
                          dft_hide_collapsible_content, 'env')
+
+    app.connect('env-before-read-docs', parse_rst_memo_init)
+    app.connect('env-updated', parse_rst_memo_clear)
@@ -1,21 +1,32 @@
 from docutils import nodes
 from docutils.parsers.rst import directives
+from docutils.utils import new_document
 
 import re
-from os import path, walk
-from os import pardir, makedirs
+import json
+from html import escape
+from os import path, listdir, stat
+from os import pardir, makedirs, remove
 from math import ceil
+from hashlib import sha1
 from lxml import etree
+from sphinx import addnodes
 from sphinx.util import logging
-from sphinx.util.osutil import SEP
+from sphinx.util.osutil import SEP, relative_uri
+from sphinx.transforms.post_transforms import SphinxPostTransform
 
 from .node import node_div
+from ..theme import names as theme_names
 from .common import directive_base
-from .common import parse_rst
+from .common import parse_rst, is_reusable, attach
 from .string import string_hdl
 from ..parser.hdl import parse_hdl_component
-from ..parser.hdl import parse_hdl_regmap, resolve_hdl_regmap
+from ..parser.hdl import load_hdl_regmap, resolve_hdl_regmap
+from ..parser.hdl import regmap_cache_key
+from ..parser.hdl import index_hdl_regmap, dependents_hdl_regmap
+from ..parser.hdl import using_hdl_regmap
 from ..parser.hdl import parse_hdl_build_status
+from ..parser.cache import cache_dir, cache_prune, file_state
 from ..writer.hdl_component import hdl_component
 
 logger = logging.getLogger(__name__)
@@ -176,7 +187,8 @@ class directive_interfaces(directive_base):
 
 class directive_regmap(directive_base):
     option_spec = {'name': directives.unchanged,
-                   'no-type-info': directives.unchanged}
+                   'no-type-info': directives.unchanged,
+                   'client-side': directives.flag}
     required_arguments = 0
     optional_arguments = 0
 
@@ -191,31 +203,21 @@ class directive_regmap(directive_base):
 
         return (dword, byte)
 
-    def tables(self, subnode, obj, key):
-        uid = "hdl-regmap-" + key
-        section = nodes.section(ids=[uid])
-
-        content, _ = self.collapsible(section, f"{obj['title']} register map")
-        tgroup = nodes.tgroup(cols=7)
-        for _ in range(7):
-            colspec = nodes.colspec(colwidth=1)
-            tgroup.append(colspec)
-        table = nodes.table(classes=['regmap'])
-        table += tgroup
-
-        self.table_header(tgroup, ["DWORD", "BYTE", ["Reg Name", 3], "Description"])  # noqa: E501
-        self.table_header(tgroup, [["", 1], "BITS", "Field Name", "Type", "Default Value", "Description"])  # noqa: E501
+    def regmap_rows(self, obj, uid: str):
+        """
+        The cells of each register, [dword, byte, name, description], and of
+        its fields, [bits, name, access, default, description].
+        The descriptions are parsed.
+        """
+        def description(text):
+            if text is None or len(text) == 0:
+                return nodes.paragraph(text='')
+            return parse_rst(self.state, text, uid)
 
         rows = []
         for reg in obj['regmap']:
             dword, byte = self.get_hex_addr(reg['address'], reg['addr_incr'])
-            self.column_entries(rows, [
-                [dword, 'literal', ['bold']],
-                [byte, 'literal', ['bold']],
-                [reg['name'], 'literal', ['bold'], 3],
-                [reg['description'], 'reST', ['description', 'bold']],
-            ], uid=uid)
-
+            fields = []
             for field in reg['fields']:
                 bits = "" if field['bits'] is None else field['bits']
                 default = '' if field['default'] is None else field['default']
@@ -240,19 +242,30 @@ class directive_regmap(directive_base):
                     else:
                         bits = f"{bits[0]}:{bits[1]}"
 
-                self.column_entries(rows, [
-                    ["", 'literal', [''], 1],
-                    [f"[{bits}]", 'literal'],
-                    [field['name'], 'literal'],
-                    [field['rw'], 'literal'],
-                    [default, 'literal', ['default']],
-                    [field['description'], 'reST', ['description']],
-                ], uid=uid)
+                fields.append([f"[{bits}]", field['name'], field['rw'],
+                               default, description(field['description'])])
+            rows.append([dword, byte, reg['name'],
+                         description(reg['description']), fields])
+        return rows
 
-        tbody = nodes.tbody()
-        tbody.extend(rows)
-        tgroup += tbody
-        content += table
+    def tables(self, subnode, obj, key, client_side=False):
+        uid = "hdl-regmap-" + key
+        section = nodes.section(ids=[uid])
+
+        content, _ = self.collapsible(section, f"{obj['title']} register map")
+        rows = self.regmap_rows(obj, uid)
+        if client_side:
+            # Exported or made a table by regmap_client_side
+            node = node_div(classes=['regmap-data'], regmap=key,
+                            rows=[r[0:3] + [[f[0:4] for f in r[4]]]
+                                  for r in rows])
+            for r in rows:
+                node += r[3]
+                for f in r[4]:
+                    node += f[4]
+            content += node
+        else:
+            content += regmap_table(rows)
 
         subnode += section
 
@@ -283,10 +296,47 @@ class directive_regmap(directive_base):
 
         return subnode
 
-    def run(self):
+    def cached_tables(self, subnode, obj, key, client_side):
+        """
+        Copy the tables of a subregmap from a previous build with the same
+        content and options, from any doc, or build and store them.
+        Either way, the tables are stamped with the current doc.
+        """
+        env = self.state.document.settings.env
+        hash_ = sha1(repr(obj).encode('utf-8')).hexdigest()
+        options = ('no-type-info' in self.options,
+                   env.config.hide_collapsible_content, client_side)
+
+        if key in env.regmap_tables:
+            state, section = env.regmap_tables[key]
+            if state == (hash_, options):
+                section = attach(section.deepcopy(), self.state.document)
+                subnode += self.stamp(section)
+                return
+
+        self.tables(subnode, obj, key, client_side)
+        section = self.stamp(subnode.children[-1])
+        if is_reusable(section):
+            # Detached, to not pickle the document along with the env
+            env.regmap_tables[key] = ((hash_, options),
+                                      attach(section.deepcopy(), None))
+
+    def stamp(self, node):
+        """
+        Set the doc of the references, and the source and line of the
+        nodes, to the directive, e.g. for the warnings of unresolved
+        references.
+        """
         env = self.state.document.settings.env
-        owner = env.docname
+        source, line = self.state_machine.get_source_and_line(self.lineno)
+        for n in node.findall(nodes.Element):
+            if isinstance(n, addnodes.pending_xref):
+                n['refdoc'] = env.docname
+            n.source, n.line = source, line
+        return node
 
+    def run(self):
+        env = self.state.document.settings.env
         node = node_div()
 
         if 'name' in self.options:
@@ -297,25 +347,157 @@ class directive_regmap(directive_base):
 
         subnode = nodes.section(ids=["hdl-regmap"])
 
-        # Search all because one file can have more than one regmap.
-        file = None
-        for f in env.regmaps:
-            if lib_name in env.regmaps[f]['subregmap']:
-                file = f
-                break
-
-        if file is None:
+        # One file can have more than one regmap, use the index
+        # of subregmap name to (file, subregmap).
+        if lib_name not in env.regmap_index['subregmap']:
             logger.warning(f"{lib_name} not-found in any regmap, skipped!")
+            # Re-read once a regmap is added
+            note_hdl_dependency(env, path.join(regmap_prefix(env), "regmap"),
+                                track=False)
             return [node]
 
-        if owner not in env.regmaps[f]['owners']:
-            env.regmaps[f]['owners'].append(owner)
-        self.tables(subnode, env.regmaps[f]['subregmap'][lib_name], lib_name)
+        f, obj = env.regmap_index['subregmap'][lib_name]
+        prefix = regmap_prefix(env)
+        for f_ in using_hdl_regmap(env.regmap_index, lib_name):
+            note_hdl_dependency(env, regmap_file(prefix, f_))
+        client_side = ('client-side' in self.options and
+                       not env.config.media_print)
+        if client_side:
+            # For prune_regmap_data
+            env.regmap_client_side.setdefault(env.docname, set())
+            env.regmap_client_side[env.docname].add(lib_name)
+        self.cached_tables(subnode, obj, lib_name, client_side)
 
         node += subnode
         return [node]
 
 
+def regmap_table(rows) -> nodes.table:
+    """
+    The register map table, from the rows of directive_regmap.regmap_rows.
+    """
+    tgroup = nodes.tgroup(cols=7)
+    for _ in range(7):
+        colspec = nodes.colspec(colwidth=1)
+        tgroup.append(colspec)
+    table = nodes.table(classes=['regmap'])
+    table += tgroup
+
+    directive_base.table_header(tgroup, ["DWORD", "BYTE", ["Reg Name", 3], "Description"])  # noqa: E501
+    directive_base.table_header(tgroup, [["", 1], "BITS", "Field Name", "Type", "Default Value", "Description"])  # noqa: E501
+
+    def entry(node, classes=[], morecols=0):
+        attributes = {}
+        if morecols != 0:
+            attributes['morecols'] = morecols
+        entry_ = nodes.entry(classes=classes, **attributes)
+        if isinstance(node, str):
+            if len(node) == 0:
+                node = nodes.paragraph(text='')
+            else:
+                node = nodes.literal(text=node)
+        entry_ += node
+        return entry_
+
+    tbody = nodes.tbody()
+    for dword, byte, name, description, fields in rows:
+        tbody += nodes.row('', entry(dword, ['bold']), entry(byte, ['bold']),
+                           entry(name, ['bold'], 3),
+                           entry(description, ['description', 'bold']))
+        for bits, name, rw, default, description in fields:
+            tbody += nodes.row('', entry('', [''], 1), entry(bits),
+                               entry(name), entry(rw),
+                               entry(default, ['default']),
+                               entry(description, ['description']))
+    tgroup += tbody
+    return table
+
+
+class regmap_client_side(SphinxPostTransform):
+    """
+    Export the hdl-regmap tables with the client-side option to a JSON file
+    at _static/regmap, rendered by the theme on the browser.
+    The descriptions are exported as HTML, after the references are
+    resolved.
+    Regmaps are made tables on third-party themes and other builders.
+    """
+    default_priority = 400
+
+    def run(self, **kwargs) -> None:
+        export = (self.app.builder.format == 'html' and
+                  self.env.config.html_theme in theme_names)
+        self.translator = None
+        for node in list(self.document.findall(node_div)):
+            if 'regmap' not in node:
+                continue
+            rows = self.rows(node)
+            if export:
+                self.export(node, rows)
+            else:
+                node.parent.replace(node, regmap_table(rows))
+
+    @staticmethod
+    def rows(node):
+        """
+        The rows of the node, with the parsed descriptions.
+        """
+        description = iter(list(node.children))
+        rows = []
+        for dword, byte, name, fields in node['rows']:
+            rows.append([dword, byte, name, next(description),
+                         [f + [next(description)] for f in fields]])
+        return rows
+
+    def cell(self, node):
+        """
+        Render a description to HTML, plain text is just escaped.
+        """
+        node = node.children if isinstance(node, nodes.section) else [node]
+        if (len(node) == 1 and isinstance(node[0], nodes.paragraph) and
+                all(isinstance(n, nodes.Text) for n in node[0].children)):
+            return escape(node[0].astext())
+
+        if self.translator is None:
+            # With the settings of the writer, like the builder does
+            document = new_document(self.document['source'],
+                                    self.app.builder.docsettings)
+            self.translator = self.app.builder.create_translator(
+                document, self.app.builder)
+        self.translator.body = []
+        for n in node:
+            n.walkabout(self.translator)
+        return ''.join(self.translator.body)
+
+    def export(self, node, rows):
+        """
+        Register rows are [dword, byte, name, description, fields],
+        field rows are [bits, name, access, default, description].
+        """
+        regmap = []
+        for r in rows:
+            regmap.append(r[0:3] + [self.cell(r[3]),
+                                    [f[0:4] + [self.cell(f[4])]
+                                     for f in r[4]]])
+
+        data = json.dumps({'regmap': regmap}, ensure_ascii=False,
+                          separators=(',', ':'))
+        # Hashed name, so browsers never get a stale copy
+        hash_ = sha1(data.encode('utf-8')).hexdigest()[0:16]
+        uri = f"_static/regmap/{node['regmap']}.{hash_}.json"
+        file = path.join(self.app.builder.outdir, *uri.split('/'))
+        if not path.isfile(file):
+            makedirs(path.dirname(file), exist_ok=True)
+            with open(file, 'w', encoding='utf-8') as f:
+                f.write(data)
+
+        uri = relative_uri(self.app.builder.get_target_uri(self.env.docname),
+                           uri)
+        div = node_div(classes=['regmap-json'], **{'data-src': uri})
+        link = nodes.reference('', "Register map data", refuri=uri)
+        div += nodes.paragraph('', '', link)
+        node.parent.replace(node, div)
+
+
 class directive_parameters(directive_base):
     option_spec = {'path': directives.unchanged}
     required_arguments = 0
@@ -509,99 +691,252 @@ def hdl_component_write_managed(env, tree, lib):
     tree.write(dest_file)
 
 
-def discover_hdl_component(env, lib):
+def note_hdl_dependency(env, file, track=True):
     """
-    Component discovery.
-    On the first run, parses, subsequent runs grabs from the cache.
+    Record a file the current doc depends on, outdated_hdl_artifacts
+    re-reads the doc once the file content changes.
+    The regmap folder is not tracked here, but by manage_hdl_regmaps.
     """
-    cp = env.component
-    if lib in cp:
-        if env.docname not in cp[lib]['owners']:
-            cp[lib]['owners'].append(env.docname)
-        return
+    if track and file not in env.hdl_inputs:
+        env.hdl_inputs[file] = file_state(file)
+    if env.docname not in env.hdl_deps:
+        env.hdl_deps[env.docname] = set()
+    env.hdl_deps[env.docname].add(file)
+
+
+def component_file(lib):
+    return f"..{SEP}{lib}{SEP}component.xml"
+
 
-    f = f"..{SEP}{lib}{SEP}component.xml"
-    if not path.isfile(f):
+def load_hdl_component(env, lib):
+    f = component_file(lib)
+    # Before parsing, so an edit meanwhile is seen by the next build
+    env.hdl_inputs[f] = file_state(f)
+    if env.hdl_inputs[f] is None:
         return
 
     ctime = path.getctime(f)
-    cp[lib] = parse_hdl_component(f, ctime)
-    cp[lib]['owners'].append(env.docname)
-    tree = hdl_component.render(lib, cp[lib])
+    env.component[lib] = parse_hdl_component(f, ctime)
+    tree = hdl_component.render(lib, env.component[lib])
     hdl_component_write_managed(env, tree, lib)
 
 
-def manage_hdl_components(env, docnames, libraries):
-    if not hasattr(env, 'component'):
-        env.component = {}
+def discover_hdl_component(env, lib):
+    """
+    Component discovery.
+    On the first run, parses, subsequent runs grabs from the cache.
+    The components of the docs to read are parsed beforehand by
+    preparse_hdl_components.
+    """
+    if lib not in env.component:
+        load_hdl_component(env, lib)
+    note_hdl_dependency(env, component_file(lib))
+
 
+# Directives using the component, with their options
+component_directive = re.compile(
+    "^\\.\\. (?:hdl-parameters|hdl-interfaces|hdl-component-diagram)::"
+    "[ \\t]*\\n((?:[ \\t]+:\\w+:.*\\n)*)", re.M)
+
+
+def preparse_hdl_components(app, env, docnames):
+    """
+    Parse the components of the docs to read at the main process, so the
+    parallel read workers inherit them instead of each parsing its own.
+    The sources are scanned for the component directives and their path
+    option.
+    """
     cp = env.component
-    for lib in list(cp):
-        f = f"..{SEP}{lib}{SEP}component.xml"
-        if not path.isfile(f):
-            del cp[lib]
+    for docname in docnames:
+        try:
+            with open(env.doc2path(docname), "r", encoding="utf-8") as f:
+                data = f.read()
+        except OSError:
             continue
 
-        ctime = path.getctime(f)
-        if ctime <= cp[lib]['ctime']:
-            continue
+        for m in component_directive.finditer(data):
+            lib = re.search("^[ \\t]+:path:[ \\t]*(\\S+)", m.group(1), re.M)
+            lib = lib.group(1) if lib else docname.replace('/index', '')
+            if lib not in cp:
+                load_hdl_component(env, lib)
 
-        cp[lib] = parse_hdl_component(f, ctime, cp[lib]['owners'])
-        tree = hdl_component.render(lib, cp[lib])
-        hdl_component_write_managed(env, tree, lib)
-        for d in cp[lib]['owners']:
-            if d not in docnames:
-                if d in env.found_docs:
-                    docnames.append(d)
-                else:
-                    cp[lib]['owners'].remove(d)
 
+def regmap_prefix(env):
+    return f"..{SEP}hdl{SEP}docs" if env.config.monolithic else "."
 
-def manage_hdl_regmaps(env, docnames):
-    if not hasattr(env, 'regmaps'):
-        env.regmaps = {}
 
-    prefix = f"..{SEP}hdl{SEP}docs" if env.config.monolithic else "."
+def regmap_file(prefix, lib):
+    return path.join(prefix, "regmap", f"adi_regmap_{lib}.txt")
+
+
+def manage_hdl_regmaps(env, changed):
+    """
+    Load the new and edited regmaps, then re-resolve them and the regmaps
+    importing them with the "USING" method, directly or transitively.
+    The regmap folder is listed again only if its modification time
+    changed, and if the regmaps listed changed, the folder is added to
+    changed.
+    """
+    prefix = regmap_prefix(env)
+    # Shared with hdl-gen, at the HDL repository root
+    cachedir = path.join(prefix, pardir, cache_dir, 'regmap')
+    regdir = path.join(prefix, "regmap")
     rm = env.regmaps
+
+    try:
+        mtime = stat(regdir).st_mtime_ns
+    except OSError:
+        mtime = None
+    if not hasattr(env, 'regmap_dir') or env.regmap_dir[0] != mtime:
+        # Inconsistent naming convention, need to parse all in directory.
+        libs = []
+        if mtime is not None:
+            for file in sorted(listdir(regdir)):
+                m = re.search("adi_regmap_(\\w+)\\.txt", file)
+                if bool(m):
+                    libs.append(m.group(1))
+        if hasattr(env, 'regmap_dir') and env.regmap_dir[1] != libs:
+            changed.add(regdir)
+        env.regmap_dir = (mtime, libs)
+
+    # Subregmap names of the edited files, before and after the edit
+    names = set()
+    changed_ = set()
     for lib in list(rm):
-        f = f"{prefix}{SEP}regmap{SEP}adi_regmap_{lib}.txt"
-        if not path.isfile(f):
+        if lib not in env.regmap_dir[1]:
+            names.update(rm[lib]['subregmap'])
             del rm[lib]
-    # Inconsistent naming convention, need to parse all in directory.
-    for (dirpath, dirnames, filenames) in walk(f"{prefix}/regmap"):
-        for file in filenames:
-            m = re.search("adi_regmap_(\\w+)\\.txt", file)
-            if not bool(m):
+    for lib in env.regmap_dir[1]:
+        file = regmap_file(prefix, lib)
+        if lib in rm:
+            if file not in changed:
                 continue
+            names.update(rm[lib]['subregmap'])
 
-            reg_name = m.group(1)
-            file_ = path.join(prefix, "regmap", file)
-            if path.isfile(file_):
-                ctime = path.getctime(file_)
-            else:
-                continue
+        env.hdl_inputs[file] = file_state(file)
+        if env.hdl_inputs[file] is None:
+            continue
+        rm[lib] = load_hdl_regmap(path.getctime(file), file, cachedir)
+        names.update(rm[lib]['subregmap'])
+        changed_.add(lib)
 
-            if reg_name in rm and rm[reg_name]['ctime'] < ctime:
-                for o in rm[reg_name]['owners']:
-                    if o not in docnames:
-                        if o in env.found_docs:
-                            docnames.append(o)
-                        else:
-                            rm[reg_name]['owners'].remove(o)
-            if reg_name in rm and rm[reg_name]['ctime'] >= ctime:
-                pass
-            else:
-                rm[reg_name] = parse_hdl_regmap(ctime, file_)
-    resolve_hdl_regmap(rm)
+    if len(names) == 0 and hasattr(env, 'regmap_index'):
+        return
+
+    # Resolution patches in place, reload the dependents unresolved,
+    # from the cache.
+    dependents = dependents_hdl_regmap(rm, names) - changed_
+    for lib in dependents:
+        rm[lib] = load_hdl_regmap(rm[lib]['ctime'], regmap_file(prefix, lib),
+                                  cachedir)
+
+    env.regmap_index = index_hdl_regmap(rm)
+    resolve_hdl_regmap(rm, env.regmap_index, changed_ | dependents)
 
+    if changed_:
+        keys = []
+        for lib in env.regmap_dir[1]:
+            state = env.hdl_inputs.get(regmap_file(prefix, lib))
+            if state is not None:
+                keys.append(regmap_cache_key(state[1]))
+        cache_prune(cachedir, keys)
 
-def manage_hdl_artifacts(app, env, docnames):
-    prefix = "hdl" if env.config.monolithic else "."
-    libraries = [[k.replace('/index', ''), [k]]
-                 for k in env.found_docs if k.find(f"{prefix}{SEP}library{SEP}") == 0]
+    for key in list(env.regmap_tables):
+        if key not in env.regmap_index['subregmap']:
+            del env.regmap_tables[key]
+
+
+def outdated_hdl_artifacts(app, env, added, changed, removed):
+    """
+    Get the docs depending on the HDL files edited since the last build,
+    compared by content, and reload these files.
+    Only the files recorded by note_hdl_dependency and the loaded regmaps
+    are checked, plus the regmap folder modification time for new
+    regmaps.
+    """
+    for attr in ['component', 'regmaps', 'regmap_tables', 'hdl_inputs',
+                 'hdl_deps', 'regmap_client_side']:
+        if not hasattr(env, attr):
+            setattr(env, attr, {})
+
+    changed_ = set()
+    for f, state in list(env.hdl_inputs.items()):
+        state_ = file_state(f, state)
+        if (state_ and state_[1]) != (state and state[1]):
+            changed_.add(f)
+        env.hdl_inputs[f] = state_
+
+    for lib in list(env.component):
+        if component_file(lib) in changed_:
+            del env.component[lib]
+
+    manage_hdl_regmaps(env, changed_)
+
+    # The removed docs are purged after this event
+    return [d for d in env.hdl_deps if env.hdl_deps[d] & changed_ and
+            d not in removed and d in env.found_docs]
+
+
+def merge_hdl_artifacts(app, env, docnames, other):
+    """
+    Merge the dependencies recorded, components parsed and regmap tables
+    built by a read worker.
+    """
+    for d in docnames:
+        if d in other.hdl_deps:
+            env.hdl_deps[d] = other.hdl_deps[d]
+        if d in other.regmap_client_side:
+            env.regmap_client_side[d] = other.regmap_client_side[d]
+    for f in other.hdl_inputs:
+        if f not in env.hdl_inputs:
+            env.hdl_inputs[f] = other.hdl_inputs[f]
+    for lib in other.component:
+        if lib not in env.component:
+            env.component[lib] = other.component[lib]
+    env.regmap_tables.update(other.regmap_tables)
+
+
+def purge_hdl_artifacts(app, env, docname):
+    if docname in getattr(env, 'hdl_deps', {}):
+        del env.hdl_deps[docname]
+    if docname in getattr(env, 'regmap_client_side', {}):
+        del env.regmap_client_side[docname]
+
+
+# Data files of the client-side regmaps, and their links in the pages
+regmap_data_re = re.compile("[^/]+\\.[0-9a-f]{16}\\.json")
+regmap_data_link = re.compile('_static/regmap/([^"/]+)"')
+
+
+def prune_regmap_data(app, exc):
+    """
+    Remove the data files of the client-side regmaps no page references,
+    like the ones of a previous content.
+    The pages written in parallel export at the write processes, so the
+    references are read from the pages with client-side regmaps.
+    """
+    if exc is not None or app.builder.format != 'html':
+        return
+    dir_ = path.join(app.builder.outdir, '_static', 'regmap')
+    if not path.isdir(dir_):
+        return
+
+    if app.builder.name == 'singlehtml':
+        docs = [app.config.root_doc]
+    else:
+        docs = getattr(app.env, 'regmap_client_side', {})
+    keep = set()
+    for d in docs:
+        try:
+            with open(app.builder.get_outfilename(d), 'r',
+                      encoding='utf-8') as f:
+                keep.update(regmap_data_link.findall(f.read()))
+        except OSError:
+            continue
 
-    manage_hdl_components(env, docnames, libraries)
-    manage_hdl_regmaps(env, docnames)
+    for f in listdir(dir_):
+        if regmap_data_re.fullmatch(f) and f not in keep:
+            remove(path.join(dir_, f))
 
 
 def hdl_setup(app):
@@ -610,5 +945,10 @@ def hdl_setup(app):
     app.add_directive('hdl-interfaces', directive_interfaces)
     app.add_directive('hdl-regmap', directive_regmap)
     app.add_directive('hdl-build-status', directive_build_status)
+    app.add_post_transform(regmap_client_side)
 
-    app.connect('env-before-read-docs', manage_hdl_artifacts)
+    app.connect('env-get-outdated', outdated_hdl_artifacts)
+    app.connect('env-before-read-docs', preparse_hdl_components)
+    app.connect('env-merge-info', merge_hdl_artifacts)
+    app.connect('env-purge-doc', purge_hdl_artifacts)
+    app.connect('build-finished', prune_regmap_data)
@@ -5,56 +5,50 @@
  * the html regardless of the theme.
  */
 
-/* Global variable to store timestamp and interval handler */
-var poolTimestamp
-var poolInterval
+/* Build served when the page was loaded */
+var devBuild
 /* Keep track of last error to reduce log clutter */
 var lastErrorName
 
 /**
- * Pool changes, return a text on success and true on error.
+ * Output page of the current location, as listed by the build events.
  */
-class PoolChanges {
-  /**
-   * Do a Fetch request, the sent object is implicitly converted to text.
-   * @param {string} url - URL to file.
-  */
-  static async do (url){
-    const response = await fetch(url, {
-      signal: AbortSignal.timeout(250),
-      cache: "no-store"
-    })
-
-    if (!response.ok)
-      return Promise.reject(response)
-    return await response.text()
-  }
+function currentPage () {
+  let page = decodeURI(location.pathname).replace(/^\//, '')
+  if (page === '' || page.endsWith('/'))
+    page += 'index.html'
+  return page
 }
 
 /*
  * Author Mode, reload webpage on changes.
+ * The server pushes an event at the end of each build, with the pages
+ * written, the page reloads only if it is among them.
  * Alternative to selenium.
  */
-PoolChanges.do('/.dev-pool').then(obj => {
-  console.log("File .dev-pool is present, pooling interface enabled.")
-  poolTimestamp = Number(obj)
-  poolInterval = setInterval(() => {
-    PoolChanges.do('/.dev-pool').then(obj => {
-      if (this.poolTimestamp < Number(obj)) {
-        location.reload()
-      }
-    }).catch(e => {
-      if (e.statusText === "File not found") {
-        console.error(`${e.statusText}: File .dev-pool was removed, pooling interface disabled.`)
-        clearInterval(this.poolInterval)
-      } else {
-        if (e.name !== lastErrorName) {
-          console.log(`${e.name}: Failed to fetch .dev-pool, but still trying.`)
-          lastErrorName = e.name
-        }
-      }
-    })
-  }, 500)
-}).catch(e => {
-  console.log("File .dev-pool is absent, pooling interface disabled.")
+const devEvents = new EventSource('/.dev-events')
+devEvents.addEventListener('hello', (e) => {
+  if (devBuild === undefined) {
+    console.log("Connected to .dev-events, live reload enabled.")
+    devBuild = e.data
+  } else if (devBuild !== e.data) {
+    // Reconnected, and missed a build meanwhile
+    location.reload()
+  }
+  lastErrorName = undefined
 })
+devEvents.addEventListener('reload', (e) => {
+  let obj = JSON.parse(e.data)
+  devBuild = obj.build
+  if (obj.pages === null || obj.pages.includes(currentPage()))
+    location.reload()
+})
+devEvents.onerror = (e) => {
+  if (devBuild === undefined) {
+    console.log("Stream .dev-events is absent, live reload disabled.")
+    devEvents.close()
+  } else if (e.type !== lastErrorName) {
+    console.log(`${e.type}: Lost .dev-events, but still trying.`)
+    lastErrorName = e.type
+  }
+}
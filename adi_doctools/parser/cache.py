@@ -0,0 +1,187 @@
+from typing import Optional, Any, Tuple, List, Hashable, Iterable, Callable
+
+import marshal
+from copy import deepcopy
+from hashlib import sha1
+from logging import Handler, WARNING
+from os import path, makedirs, replace, remove, getpid, stat, listdir
+
+# Folder at the repository root that holds the on-disk caches
+cache_dir = '.adoc-cache'
+# Extension of the cache entries
+cache_ext = '.marshal'
+
+
+class capture_warnings(Handler):
+    """
+    Collect the warnings of a logger, so they can be stored along with the
+    cached result and reissued when it is reused.
+    Records still propagate to the regular handlers.
+    """
+    def __init__(self, logger):
+        super().__init__(WARNING)
+        # Unwrap the sphinx.util.logging adapter
+        self.logger_ = getattr(logger, 'logger', logger)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+    def __enter__(self):
+        self.logger_.addHandler(self)
+        return self.messages
+
+    def __exit__(self, *args):
+        self.logger_.removeHandler(self)
+
+
+def get_hash(file: str, salt: str = '') -> str:
+    """
+    Hash the content of a file, the salt is used to version the entries.
+    """
+    h = sha1(salt.encode('utf-8'))
+    with open(file, 'rb') as f:
+        h.update(f.read())
+    return h.hexdigest()
+
+
+def file_state(file: str, prev: Optional[Tuple] = None) -> Optional[Tuple]:
+    """
+    Modification time and size, and content hash of a file, or None if it
+    doesn't exist.
+    The hash of prev is reused while the modification time and size match.
+    """
+    try:
+        st = stat(file)
+    except OSError:
+        return None
+    st = (st.st_mtime_ns, st.st_size)
+    if prev is not None and prev[0] == st:
+        return prev
+    return (st, get_hash(file))
+
+
+def cache_load(dir_: str, key: str) -> Optional[Any]:
+    """
+    Entries are marshalled, plain data only, so loading a tampered entry
+    can't run code, unlike pickle.
+    """
+    file = path.join(dir_, f"{key}{cache_ext}")
+    if not path.isfile(file):
+        return None
+
+    try:
+        with open(file, 'rb') as f:
+            return marshal.load(f)
+    except Exception:
+        # Truncated or from an incompatible Python, just parse again.
+        return None
+
+
+def cache_makedirs(dir_: str) -> None:
+    """
+    Create a cache folder, ignored by git, since it is at the work tree.
+    """
+    makedirs(dir_, exist_ok=True)
+    file = path.join(dir_, '.gitignore')
+    if not path.isfile(file):
+        with open(file, 'w') as f:
+            f.write("*\n")
+
+
+def cache_dump(dir_: str, key: str, obj: Any) -> None:
+    """
+    Write through a temporary file, so concurrent readers never get a
+    partial entry.
+    The cache is best effort, a read-only tree or an object that isn't
+    plain data just skips it.
+    """
+    file = path.join(dir_, f"{key}{cache_ext}")
+    tmp = path.join(dir_, f".{key}.{getpid()}")
+    try:
+        data = marshal.dumps(obj)
+        cache_makedirs(dir_)
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        replace(tmp, file)
+    except (OSError, ValueError):
+        if path.isfile(tmp):
+            remove(tmp)
+
+
+def cache_prune(dir_: str, keys: Iterable[str]) -> None:
+    """
+    Remove the entries of dir_ not in keys, e.g. of files since edited,
+    and the pickled ones of former versions.
+    """
+    keep = {f"{k}{cache_ext}" for k in keys}
+    try:
+        files = listdir(dir_)
+    except OSError:
+        return
+    for f in files:
+        if f not in keep and (f.endswith(cache_ext) or
+                              f.endswith('.pickle')):
+            try:
+                remove(path.join(dir_, f))
+            except OSError:
+                pass
+
+
+class input_state:
+    """
+    Persisted results keyed by the call arguments, valid while the files
+    they were derived from are unchanged.
+    Files are compared by file_state, so a touch does not invalidate the
+    entry.
+    The version is of the results format, bumped to invalidate all entries.
+    Entries not used on a run are dropped on dump.
+    """
+    def __init__(self, dir_: str, version: int):
+        self.dir_ = dir_
+        self.version = version
+        self.used = set()
+
+        obj = cache_load(dir_, 'state')
+        if obj is None or obj['version'] != version:
+            self.entry = {}
+        else:
+            self.entry = obj['entry']
+
+    def key(self, func: Callable, args: Tuple) -> Hashable:
+        """
+        Key of a call, by the qualified name of the function and the version
+        too, so parsers given the same arguments do not share entries.
+        """
+        return (func.__module__, func.__qualname__, self.version, args)
+
+    def get(self, key: Hashable) -> Optional[Tuple[Any, List[str]]]:
+        """
+        Return the result and warnings of a call, if its inputs are unchanged.
+        """
+        self.used.add(key)
+        if key not in self.entry:
+            return None
+
+        obj, msg, inputs = self.entry[key]
+        for i, (file, state) in enumerate(inputs):
+            state_ = file_state(file, state)
+            if (state_ and state_[1]) != (state and state[1]):
+                return None
+            inputs[i] = (file, state_)
+
+        return (deepcopy(obj), msg)
+
+    def set(self, key: Hashable, obj: Any, msg: List[str],
+            files: List[str]) -> None:
+        self.used.add(key)
+        inputs = [(file, file_state(file)) for file in files]
+        self.entry[key] = (deepcopy(obj), msg, inputs)
+
+    def dump(self) -> None:
+        entry = {k: self.entry[k] for k in self.used if k in self.entry}
+        cache_dump(self.dir_, 'state', {
+            'version': self.version,
+            'entry': entry
+        })
+        cache_prune(self.dir_, ['state'])
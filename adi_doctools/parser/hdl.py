@@ -1,19 +1,25 @@
-from typing import TypedDict, Optional, List, Tuple, Dict
+from typing import TypedDict, Optional, List, Tuple, Dict, Set
 
 import re
-import contextlib
 from lxml import etree
 from os import path
 from sphinx.util import logging
 
 from ..typing.hdl import Intf, IntfPort
 from ..typing.hdl import Library, LibraryVendor
-from ..typing.hdl import Project
+from ..typing.hdl import Project, vendors
 from ..directive.string import string_hdl
 from .tcl import tcl
+from .cache import capture_warnings, get_hash, cache_load, cache_dump
 
 logger = logging.getLogger(__name__)
 
+# Bump on any change to the parse_hdl_regmap output, invalidates the cache.
+regmap_version = 1
+# Bump on any change to the parse_hdl_interfaces, parse_hdl_library or
+# parse_hdl_project output, invalidates the hdl-gen state.
+library_version = 1
+
 
 def parse_hdl_regmap(ctime: float, file: str) -> Dict:
     """
@@ -21,6 +27,8 @@ def parse_hdl_regmap(ctime: float, file: str) -> Dict:
     Added methods:
     * USING: import regs and fields from other regmap.
     * WHERE n IS FROM {} to {}: set a repetition pattern for regs and fields.
+    The file is streamed once through a state machine, each TITLE/REG/FIELD
+    block is collected until its end marker and then converted.
     """
     regmap = {
         'subregmap': {},
@@ -40,44 +48,37 @@ def parse_hdl_regmap(ctime: float, file: str) -> Dict:
                 logger.warning(f"Malformed where {desc} in reg address "
                                f"{reg}!")
 
-            return ''
+            return ('', None)
 
         if not m.group(1).isdigit() or not m.group(2).isdigit():
             logger.warning(f"Non-numerals in where {desc} in reg address "
                            f"{reg}!")
-            return ''
+            return ('', None)
 
         return (f"Where n is from {m.group(1)} to {m.group(2)}.",
                 (int(m.group(1)), int(m.group(2))+1))
 
-    if not path.isfile(file):
-        logger.warning(f"{file}: File doesn't exist!")
-        return regmap
-
-    with open(file, "r") as f:
-        data = f.readlines()
-    data = [d.replace("\n", "") for d in data]
-
-    using = []
-    while "TITLE" in data:
-        # Get title
-        tit = data.index("TITLE")
-        if data[tit + 1].startswith('USING'):
-            while data[tit + 1].startswith('USING'):
-                using_ = data[tit + 1][6:].strip()
-                tit += 1
-                if len(using_) == 0:
-                    logger.warning("Malformed using in title entry, skipped!")
-                    continue
-                using.append(using_)
+    def get_bits_params(bits: str, reg_params: List[str]):
+        try:
+            return int(bits)
+        except Exception:
+            bit_str = bits
+            for delimiter in ["+", "-", "*", "/"]:
+                bit_str = " ".join(bit_str.split(delimiter))
+            for str_part in bit_str.split():
+                try:
+                    int(str_part)
+                except Exception:
+                    reg_params.append(str_part)
+            return bits
 
-        title = str(data[tit + 1]).strip()
-        title_tool = str(data[tit + 2])
-        data = data[tit + 2:]
+    def close_title(block: List[str], using: List[str]) -> Optional[Dict]:
+        title = block[0].strip()
+        title_tool = block[1]
 
         if 'ENDTITLE' in [title_tool, title]:
             logger.warning("Malformed title entry, skipped!")
-            continue
+            return None
 
         regmap['subregmap'][title_tool] = {
             'title': title,
@@ -85,295 +86,441 @@ def parse_hdl_regmap(ctime: float, file: str) -> Dict:
             'regmap': [],
             'access_type': []
         }
+        return regmap['subregmap'][title_tool]
 
-        # Get registers
-        access_type = []
-        while "REG" in data:
-            regi = data.index("REG")
-            rfi = data.index("ENDREG")
-            reg_params = []
+    def close_reg(block: List[str]) -> Optional[Dict]:
+        if len(block) == 0:
+            logger.warning("Empty register entry, skipped!")
+            return None
 
-            if not regi:
-                break
+        reg_where = None
+        if block[0].startswith("0x"):
+            reg_import = False
 
-            reg_where = None
-            if data[regi + 1].startswith("0x"):
-                reg_import = False
+            reg_addr = block[0]
 
-                reg_addr = data[regi + 1]
+            i = 1
+            where_desc = ''
+            if len(block) > 1 and block[1].startswith("WHERE n IS"):
+                where_desc, reg_where = get_where(block[1][10:], reg_addr)
+                i = 2
 
-                reg_d = data[regi + 2]
-                where_desc = ''
-                if reg_d.startswith("WHERE n IS"):
-                    where_desc, reg_where = get_where(reg_d[10:], reg_addr)
-                    regi = regi + 1
+            if len(block) <= i:
+                logger.warning(f"Malformed register entry {reg_addr}, "
+                               "missing name!")
+                return None
 
-                reg_name = data[regi + 2].strip()
-                reg_desc = [data[f_].replace("''", "``") for f_ in range(regi + 3, rfi)]
-                if where_desc != "":
-                    reg_desc.append(where_desc)
+            reg_name = block[i].strip()
+            reg_desc = [block[f_].replace("''", "``")
+                        for f_ in range(i + 1, len(block))]
+            if where_desc != "":
+                reg_desc.append(where_desc)
 
-                try:
-                    if '+' in reg_addr:
-                        reg_addr = reg_addr.split('+')
-                        if reg_addr[1].strip() == 'n':
-                            reg_addr_incr = 1
-                        else:
-                            reg_addr_incr = int(reg_addr[1].replace('*n', ''),
-                                                16)
-                        reg_addr = int(reg_addr[0], 16)
-                        if where_desc == '':
-                            logger.warning(f"Ranged addr {reg_addr} without "
-                                           f"where method at {reg_name}!")
+            try:
+                if '+' in reg_addr:
+                    reg_addr = reg_addr.split('+')
+                    if reg_addr[1].strip() == 'n':
+                        reg_addr_incr = 1
                     else:
-                        reg_addr = int(reg_addr, 16)
-                        reg_addr_incr = 0
-                        if where_desc != '':
-                            logger.warning(f"Static addr {reg_addr} "
-                                           f"with where method at {reg_name}!")
-                except Exception:
-                    logger.warning(f"Malformed register address {reg_addr} "
-                                   f"for register {reg_name}.")
-                    reg_addr = 0
+                        reg_addr_incr = int(reg_addr[1].replace('*n', ''),
+                                            16)
+                    reg_addr = int(reg_addr[0], 16)
+                    if where_desc == '':
+                        logger.warning(f"Ranged addr {reg_addr} without "
+                                       f"where method at {reg_name}!")
+                else:
+                    reg_addr = int(reg_addr, 16)
                     reg_addr_incr = 0
-            else:
-                reg_import = True
+                    if where_desc != '':
+                        logger.warning(f"Static addr {reg_addr} "
+                                       f"with where method at {reg_name}!")
+            except Exception:
+                logger.warning(f"Malformed register address {reg_addr} "
+                               f"for register {reg_name}.")
                 reg_addr = 0
                 reg_addr_incr = 0
-                reg_name = data[regi + 1].strip()
-                reg_desc = None
-                reg_params = []
-
-            with contextlib.suppress(ValueError):
-                tet = data.index("TITLE") if "TITLE" in data else -1
-                if tet != -1:
-                    if regi > tet:
-                        # into next regmap
-                        break
-            data = data[rfi + 1:]
-
-            # Get fields
-            fields = []
-            while "FIELD" in data:
-                fi = data.index("FIELD")
-                efi = data.index("ENDFIELD")
-
-                if not fi:
-                    break
-
-                if efi < fi:
-                        logger.warning(f"Got ENDFIELD without FIELD "
-                                       f"for register {reg_name}.")
+        else:
+            reg_import = True
+            reg_addr = 0
+            reg_addr_incr = 0
+            reg_name = block[0].strip()
+            reg_desc = None
+
+        return {
+            'import': reg_import,
+            'where': reg_where,
+            'name': reg_name,
+            'address': reg_addr,
+            'addr_incr': reg_addr_incr,
+            'description': reg_desc,
+            'fields': [],
+            'parameters': []
+        }
 
-                with contextlib.suppress(ValueError):
-                    if "REG" in data:
-                        rege = data.index("REG")
-                    else:
-                        rege = -1
-                    if rege != -1 and fi > rege:
-                        # into next register
-                        break
-                if data[fi + 1].startswith('['):
-                    field_where = None
-                    field_import = False
-                    field_loc = data[fi + 1]
-                    field_loc = field_loc.split()
-                    field_bits = field_loc[0].replace("[", "").replace("]", "")
-                    if field_bits != 'n':
-                        delimiters = ["+", "-", "*", "/"]
-                        if ':' in field_bits:
-                            bits_ = field_bits.split(':')
-                        else:
-                            bits_ = [field_bits, field_bits]
-                        try:
-                            bit0_ = int(bits_[0])
-                        except Exception:
-                            bit0_ = bits_[0]
-                            bit_str = bit0_
-                            for delimiter in delimiters:
-                                bit_str = " ".join(bit_str.split(delimiter))
-                            for str_part in bit_str.split():
-                                try:
-                                    bit_tmp = int(str_part)
-                                except Exception:
-                                    reg_params.append(str_part)
+    def close_field(block: List[str], reg: Dict,
+                    access_type: List[str]) -> None:
+        reg_name = reg['name']
+        reg_params = reg['parameters']
+        fields = reg['fields']
+
+        if len(block) == 0:
+            logger.warning(f"Empty field entry at reg {reg_name}, skipped!")
+            return
+
+        if not block[0].startswith('['):
+            for line in block:
+                if any(c in line for c in ('[', ']')) or len(line) == 1:
+                    logger.warning(f"Suspicious imported field '{line}' "
+                                   f"at imported field group at reg {reg_name}!")
+                fields.append({
+                    "import": True,
+                    "where": None,
+                    "name": line.strip(),
+                    "bits": None,
+                    "default": None,
+                    "default_long": None,
+                    "rw": None,
+                    "description": None,
+                })
+            return
+
+        field_where = None
+        field_import = False
+        field_loc = block[0].split()
+        field_bits = field_loc[0].replace("[", "").replace("]", "")
+        if field_bits != 'n':
+            if ':' in field_bits:
+                bits_ = field_bits.split(':')
+            else:
+                bits_ = [field_bits, field_bits]
+            bit0_ = get_bits_params(bits_[0], reg_params)
+            bit1_ = get_bits_params(bits_[1], reg_params)
+            field_bits = (bit0_, bit1_)
+
+        if len(field_loc) > 1:
+            field_default = ' '.join(field_loc[1:])
+            field_default_long = ' '.join(field_loc[1:])
+            try:
+                fd_ = int(field_default, 16)
+                if type(field_bits) is tuple:
+                    len_f = (field_bits[0] - field_bits[1] + 1)
+                    len_d = len(bin(fd_)[2:])
+                    if len_d > len_f:
+                        logger.warning("Default value "
+                                       f"'{field_default}' "
+                                       f"overflows field width "
+                                       f"{field_loc[0]} at reg "
+                                       f"'{reg_name}'!")
+                field_default = fd_
+                field_default_long = fd_
+
+            except Exception:
+                split_field = field_default.split(" = ", 2)
+                if "''" in field_default:
+                    logger.warning("Default value "
+                                   f"'{field_default}' "
+                                   f"contains ''!")
+                field_default = split_field[0].replace("''", "")
+                field_default_long = field_default
+
+                if "0xX" not in field_default:
+                    try:
+                        default_str = split_field[1]
+                        field_default_long = split_field[1]
+                        field_default = f"{split_field[0]}"
+                    except Exception:
+                        default_str = split_field[0]
+                    default_str = re.sub("`[A-Z0-9_]+", "", default_str)
+                    default_str = re.findall("[A-Z0-9_]+", default_str)
+                    for str_part in default_str:
                         try:
-                            bit1_ = int(bits_[1])
+                            int(str_part)
                         except Exception:
-                            bit1_ = bits_[1]
-                            bit_str = bit1_
-                            for delimiter in delimiters:
-                                bit_str = " ".join(bit_str.split(delimiter))
-                            for str_part in bit_str.split():
-                                try:
-                                    bit_tmp = int(str_part)
-                                except Exception:
-                                    reg_params.append(str_part)
-                        field_bits = (bit0_, bit1_)
-
-                    if len(field_loc) > 1:
-                        field_default = ' '.join(field_loc[1:])
-                        field_default_long = ' '.join(field_loc[1:])
-                        try:
-                            fd_ = int(field_default, 16)
-                            if type(field_bits) is tuple:
-                                len_f = (field_bits[0] - field_bits[1] + 1)
-                                len_d = len(bin(fd_)[2:])
-                                if len_d > len_f:
-                                    logger.warning("Default value "
-                                                   f"'{field_default}' "
-                                                   f"overflows field width "
-                                                   f"{field_loc[0]} at reg "
-                                                   f"'{reg_name}'!")
-                            field_default = fd_
-                            field_default_long = fd_
+                            reg_params.append(re.sub('\\[[0-9:]+\\]', ' ', str_part))
+                            # TODO: Match parse_hdl_library extracted parameters
+        else:
+            field_default = None
+            field_default_long = None
+
+        i = 1
+        where_desc = ''
+        if len(block) > 1 and block[1].startswith("WHERE n IS"):
+            where_desc, field_where = get_where(block[1][10:], reg_name,
+                                                field_bits)
+            i = 2
+            if field_bits != 'n':
+                logger.warning("Where method with field bits "
+                               f"{field_loc[0]} instead of n "
+                               f"at reg '{reg_name}'!")
+        elif field_bits == 'n':
+            logger.warning("No where method for ranged field "
+                           f"n at reg '{reg_name}'!")
+
+        if len(block) <= i + 1:
+            logger.warning(f"Malformed field {field_loc[0]} at reg "
+                           f"'{reg_name}', missing name or access type!")
+            return
+
+        field_name = block[i].strip()
+        field_name = field_name.replace("/", "or")
+        field_rw = block[i + 1]
+
+        if field_rw == 'R':
+            field_rw = 'RO'
+        elif field_rw == 'W':
+            field_rw = 'WO'
+        if '-V' in field_rw:
+            if 'V' not in access_type:
+                access_type.append('V')
+        field_rw_ = field_rw.replace('-V', '')
+        field_rw = field_rw.replace('-V', 'V')
+        if field_rw_ not in access_type:
+            if field_rw_ not in string_hdl.access_type:
+                logger.warning(f"Malformed access type {field_rw} "
+                               f"for reg {field_name}")
+            else:
+                access_type.append(field_rw)
+
+        field_desc = [block[f_].replace("''", "``")
+                      for f_ in range(i + 2, len(block))]
+        if where_desc != '':
+            field_desc.append(where_desc)
+        if field_default_long is not None and field_default_long != field_default:
+            field_desc.append(f"``{field_default} = {field_default_long}``")
+
+        fields.append({
+            "import": field_import,
+            "where": field_where,
+            "name": field_name,
+            "bits": field_bits,
+            "default": field_default,
+            "default_long": field_default_long,
+            "rw": field_rw,
+            "description": field_desc,
+        })
+
+    def close_params(reg: Optional[Dict]) -> None:
+        if reg is not None and len(reg['parameters']):
+            reg['parameters'] = sorted(set(reg['parameters']))
 
-                        except Exception:
-                            split_field = field_default.split(" = ", 2)
-                            if "''" in field_default:
-                                logger.warning("Default value "
-                                               f"'{field_default}' "
-                                               f"contains ''!")
-                            field_default = split_field[0].replace("''", "")
-                            field_default_long = field_default
-
-                            if "0xX" not in field_default:
-                                try:
-                                    default_str = split_field[1]
-                                    field_default_long = split_field[1]
-                                    field_default = f"{split_field[0]}"
-                                except Exception:
-                                    default_str = split_field[0]
-                                default_str = re.sub("`[A-Z0-9_]+", "", default_str)
-                                default_str = re.findall("[A-Z0-9_]+", default_str)
-                                for str_part in default_str:
-                                    try:
-                                        int(str_part)
-                                    except Exception:
-                                        reg_params.append(re.sub('\\[[0-9:]+\\]', ' ', str_part))
-                                        # TODO: Match parse_hdl_library extracted parameters
+    if not path.isfile(file):
+        logger.warning(f"{file}: File doesn't exist!")
+        return regmap
+
+    # state: None (between blocks), 'TITLE', 'REG' or 'FIELD'
+    state = None
+    block = []
+    using = []
+    subregmap = None
+    reg = None
+    with open(file, "r") as f:
+        for line in f:
+            line = line.replace("\n", "")
+
+            if state == 'TITLE':
+                if len(block) == 0 and line.startswith('USING'):
+                    using_ = line[6:].strip()
+                    if len(using_) == 0:
+                        logger.warning("Malformed using in title entry, "
+                                       "skipped!")
                     else:
-                        field_default = None
-                        field_default_long = None
-
-                    fi_d = data[fi + 2]
-                    where_desc = ''
-                    if fi_d.startswith("WHERE n IS"):
-                        where_desc, field_where = get_where(fi_d[10:], reg_name,
-                                                            field_bits)
-                        fi = fi + 1
-                        if field_bits != 'n':
-                            logger.warning("Where method with field bits "
-                                           f"{field_loc[0]} instead of n "
-                                           f"at reg '{reg_name}'!")
-                    elif field_bits == 'n':
-                        logger.warning("No where method for ranged field "
-                                       f"n at reg '{reg_name}'!")
-
-                    field_name = data[fi + 2].strip()
-                    field_name = field_name.replace("/", "or")
-                    field_rw = data[fi + 3]
-
-                    if field_rw == 'R':
-                        field_rw = 'RO'
-                    elif field_rw == 'W':
-                        field_rw = 'WO'
-                    if '-V' in field_rw:
-                        if 'V' not in access_type:
-                            access_type.append('V')
-                    field_rw_ = field_rw.replace('-V', '')
-                    field_rw = field_rw.replace('-V', 'V')
-                    if field_rw_ not in access_type:
-                        if field_rw_ not in string_hdl.access_type:
-                            logger.warning(f"Malformed access type {field_rw} "
-                                           f"for reg {field_name}")
-                        else:
-                            access_type.append(field_rw)
-
-                    field_desc = [data[f_].replace("''", "``") for f_ in range(fi + 4, efi)]
-                    if where_desc != '':
-                        field_desc.append(where_desc)
-                    if field_default_long is not None and field_default_long != field_default:
-                        field_desc.append(f"``{field_default} = {field_default_long}``")
-
-                    fields.append({
-                        "import": field_import,
-                        "where": field_where,
-                        "name": field_name,
-                        "bits": field_bits,
-                        "default": field_default,
-                        "default_long": field_default_long,
-                        "rw": field_rw,
-                        "description": field_desc,
-                    })
-                else:
-                    for i in range(fi + 1, efi):
-                        if any(c in data[i] for c in ('[', ']')) or len(data[i]) == 1:
-                            logger.warning(f"Suspicious imported field '{data[i]}' "
-                                           f"at imported field group at reg {reg_name}!")
-                        fields.append({
-                            "import": True,
-                            "where": None,
-                            "name": data[i].strip(),
-                            "bits": None,
-                            "default": None,
-                            "default_long": None,
-                            "rw": None,
-                            "description": None,
-                        })
-
-                data = data[efi + 1:]
-
-            if len(reg_params):
-                reg_params_set = set(reg_params)
-                reg_params = list(reg_params_set)
-                reg_params.sort()
-            regmap['subregmap'][title_tool]['regmap'].append(
-                {
-                    'import': reg_import,
-                    'where': reg_where,
-                    'name': reg_name,
-                    'address': reg_addr,
-                    'addr_incr': reg_addr_incr,
-                    'description': reg_desc,
-                    'fields': fields,
-                    'parameters': reg_params
-                }
-            )
-        regmap['subregmap'][title_tool]['access_type'] = access_type
+                        using.append(using_)
+                    continue
+                block.append(line)
+                if len(block) == 2:
+                    subregmap = close_title(block, using)
+                    state = None
+                continue
+
+            if state is not None:
+                if line == f"END{state}":
+                    if state == 'REG':
+                        reg = close_reg(block) if subregmap else None
+                        if reg is not None:
+                            subregmap['regmap'].append(reg)
+                    elif reg is not None:
+                        close_field(block, reg, subregmap['access_type'])
+                    state = None
+                    continue
+                if line not in ('TITLE', 'REG', 'FIELD'):
+                    block.append(line)
+                    continue
+                logger.warning(f"Got {line} inside {state} entry without "
+                               f"END{state}, entry skipped!")
+                state = None
+
+            if line == 'TITLE':
+                close_params(reg)
+                reg = None
+                subregmap = None
+                using = []
+                state = 'TITLE'
+                block = []
+            elif line == 'REG':
+                close_params(reg)
+                reg = None
+                state = 'REG'
+                block = []
+            elif line == 'FIELD':
+                state = 'FIELD'
+                block = []
+            elif line == 'ENDFIELD':
+                logger.warning(f"Got ENDFIELD without FIELD "
+                               f"for register {reg['name'] if reg else None}.")
+
+    if state is not None:
+        logger.warning(f"{file}: Missing END{state} at end of file, "
+                       "entry skipped!")
+    close_params(reg)
+
+    return regmap
+
+
+def regmap_cache_key(hash_: str) -> str:
+    """
+    Cache entry of a regmap, from its content hash.
+    """
+    return f"regmap-{regmap_version}-{hash_}"
+
 
+def load_hdl_regmap(ctime: float, file: str,
+                    cache_dir: Optional[str] = None,
+                    hash_: Optional[str] = None) -> Dict:
+    """
+    parse_hdl_regmap through the on-disk cache at cache_dir, keyed by the
+    file content and regmap_version.
+    The parse warnings are stored with the entry and reissued on a hit.
+    hash_ is the content hash of the file, if already known.
+    """
+    if cache_dir is None or not path.isfile(file):
+        return parse_hdl_regmap(ctime, file)
+
+    key = regmap_cache_key(hash_ if hash_ is not None else get_hash(file))
+    obj = cache_load(cache_dir, key)
+    if obj is not None:
+        for m in obj['warnings']:
+            logger.warning(m)
+        regmap = obj['regmap']
+        regmap['ctime'] = ctime
+        return regmap
+
+    with capture_warnings(logger) as msg:
+        regmap = parse_hdl_regmap(ctime, file)
+    cache_dump(cache_dir, key, {'regmap': regmap, 'warnings': msg})
     return regmap
 
 
-def resolve_hdl_regmap(rm: Dict) -> None:
+def index_hdl_regmap(rm: Dict) -> Dict:
+    """
+    Index the subregmaps by name, to the (file key, subregmap) pair, and
+    the registers by (subregmap name, reg name).
+    The first definition wins, in the order of rm.
+    Imported registers are indexed by the name without the regmap prefix,
+    the name they get once resolved.
+    """
+    index = {
+        'subregmap': {},
+        'reg': {}
+    }
+    for i in rm:
+        for k in rm[i]['subregmap']:
+            if k in index['subregmap']:
+                continue
+            index['subregmap'][k] = (i, rm[i]['subregmap'][k])
+            for reg in rm[i]['subregmap'][k]['regmap']:
+                name = reg['name'][reg['name'].find('.')+1:]
+                index['reg'].setdefault((k, name), reg)
+
+    return index
+
+
+def dependents_hdl_regmap(rm: Dict, names: Set[str]) -> Set[str]:
+    """
+    Get the file keys of the regmaps that import, with the "USING" method,
+    any of the subregmap names, directly or through other regmaps.
+    """
+    users = {}
+    for i in rm:
+        for k in rm[i]['subregmap']:
+            for use in rm[i]['subregmap'][k]['using']:
+                if use not in users:
+                    users[use] = set()
+                users[use].add(i)
+
+    keys = set()
+    names = list(names)
+    while len(names):
+        for i in users.get(names.pop(), ()):
+            if i not in keys:
+                keys.add(i)
+                names.extend(rm[i]['subregmap'])
+
+    return keys
+
+
+def using_hdl_regmap(index: Dict, name: str) -> Set[str]:
+    """
+    Get the file keys of a subregmap and of the subregmaps it imports with
+    the "USING" method, directly or through other regmaps.
+    """
+    keys = set()
+    done = set()
+    names = [name]
+    while len(names):
+        name = names.pop()
+        if name in done or name not in index['subregmap']:
+            continue
+        done.add(name)
+        key, obj = index['subregmap'][name]
+        keys.add(key)
+        names.extend(obj['using'])
+
+    return keys
+
+
+def resolve_hdl_regmap(
+    rm: Dict,
+    index: Optional[Dict] = None,
+    keys: Optional[Set[str]] = None
+) -> Dict:
     """
     Resolve imported registers and fields at regmaps with the "USING" method.
     parse_hdl_regmap must be called first.
+    Imports are looked up at the index_hdl_regmap index, which is returned
+    for reuse.
+    Only the regmaps of the file keys are resolved, all if None, and the
+    imported subregmaps among them are resolved first.
     """
+    if index is None:
+        index = index_hdl_regmap(rm)
+    if keys is None:
+        keys = set(rm)
 
     def patch_field(r, p, r_, p_name):
+        fields = {}
+        for p_ in p:
+            fields.setdefault(p_['name'], p_)
         for i, j in enumerate(r):
             if j['import']:
-                for p_ in p:
-                    if j['name'] == p_['name']:
-                        r[i] = p_.copy()
-                        break
+                if j['name'] in fields:
+                    r[i] = fields[j['name']].copy()
                 else:
                     logger.warning(f"Field {j['name']} in reg {p_name} "
                                    f"from import {r_} not found!")
 
     def patch_reg(r, p, r_):
         def patch_reg_(j, p):
-            for p_ in p['regmap']:
-                if j['name'] == p_['name']:
-                    j['import'] = False
-                    j['where'] = p_['where']
-                    j['address'] = p_['address']
-                    j['addr_incr'] = p_['addr_incr']
-                    j['description'] = p_['description']
-                    patch_field(j['fields'], p_['fields'], r_, p_['name'])
-                    return True
-            return False
+            key = (p, j['name'])
+            if key not in index['reg']:
+                return False
+            p_ = index['reg'][key]
+            j['import'] = False
+            j['where'] = p_['where']
+            j['address'] = p_['address']
+            j['addr_incr'] = p_['addr_incr']
+            j['description'] = p_['description']
+            patch_field(j['fields'], p_['fields'], r_, p_['name'])
+            return True
 
         for j in r:
             if j['import']:
@@ -387,39 +534,44 @@ def resolve_hdl_regmap(rm: Dict) -> None:
                     p_ = j['name'][:idx]
                     j['name'] = j['name'][idx+1:]
                     if p_ in p:
-                        patch_reg_(j, p[p_])
+                        patch_reg_(j, p_)
                 else:
                     for p_ in p:
-                        if patch_reg_(j, p[p_]):
+                        if patch_reg_(j, p_):
                             break
             if j['import']:
                 logger.warning(f"Reg {j['name']} in import {r_} not found!")
 
     def resolve(r):
-        using = {}
+        using = []
         for use in r['using']:
-            use_ = None
-            for i in rm:
-                for k in rm[i]['subregmap']:
-                    if use == k:
-                        use_ = rm[i]['subregmap'][k]
-                        break
-                else:
-                    continue
-                break
-            if use_ is None:
+            if use not in index['subregmap']:
                 logger.warning(f"Couldn't find regmap '{use}'!")
-            else:
-                using[k] = use_
+            elif use not in using:
+                using.append(use)
 
         patch_reg(r['regmap'], using, r['using'])
-        r['using'] = []
+
+    done = set()
+
+    def visit(i, k):
+        if (i, k) in done:
+            return
+        done.add((i, k))
+        r = rm[i]['subregmap'][k]
+        for use in r['using']:
+            if use in index['subregmap']:
+                i_ = index['subregmap'][use][0]
+                if i_ in keys:
+                    visit(i_, use)
+        resolve(r)
 
     for i in rm:
-        for k in rm[i]['subregmap']:
-            resolve(rm[i]['subregmap'][k])
+        if i in keys:
+            for k in rm[i]['subregmap']:
+                visit(i, k)
 
-    return
+    return index
 
 
 def expand_hdl_regmap(rm: Dict) -> None:
@@ -811,32 +963,28 @@ def parse_hdl_library(
     tcl_ = tcl(file)
 
     # Check library name against ip_name
-    for line in tcl_:
-        for m in ['adi_ip_create', 'ad_ip_create']:
-            if line.startswith(m):
-                line_ = line.split()
-                if ip_name != line_[1]:
-                    logger.warning(f"{file}: '{m}' IP name '{line_[1]}' does not "
-                                   f"match name '{ip_name}', line {i}")
-            break
+    for cmd in tcl_.commands('adi_ip_create') + tcl_.commands('ad_ip_create'):
+        if len(cmd.args) > 0 and ip_name != cmd.args[0]:
+            logger.warning(f"{file}: '{cmd.name}' IP name '{cmd.args[0]}' does "
+                           f"not match name '{ip_name}', line {cmd.line}")
 
     # Obtain the file dependencies and top module candidate
     deps = set()
-    line = tcl_.line_startswith(["adi_ip_files", "ad_ip_files"])
-    if line is None:
-        line = tcl_.line_startswith("add_files ")
+    cmd = tcl_.first(["adi_ip_files", "ad_ip_files"])
+    if cmd is None:
         top_mod_ = None
+        # The files are the last argument
+        cmd = tcl_.first("add_files")
+        if cmd is not None and len(cmd.args) > 0:
+            deps.update(tcl.list_items(cmd.args[-1]))
     else:
-        top_mod_ = line.split()[1]
+        top_mod_ = cmd.args[0] if len(cmd.args) > 0 else None
+        if len(cmd.args) > 1:
+            deps.update(tcl.list_items(cmd.args[1]))
 
-    if line is not None:
-        deps.update(tcl.get_list_items(line))
-
-    for line in tcl_:
-        if (line.startswith('add_fileset_file')):
-            line_ = line.split()
-            if len(line_) >= 5:
-                deps.add(line_[4])
+    for cmd in tcl_.commands('add_fileset_file'):
+        if len(cmd.args) >= 4:
+            deps.add(cmd.args[3])
 
     if top_mod_ == None:
         logger.warning(f"{file}: Unable to find top module name for library "
@@ -956,15 +1104,41 @@ def parse_hdl_library(
     return (obj, path_, ip_name)
 
 
+def index_hdl_library(libraries: Dict[str, Library]) -> Dict:
+    """
+    Index the libraries per vendor by IP name, the first definition wins,
+    in the order of libraries.
+    The library keys per vendor are kept for the instances not matching
+    an IP name, and instance holds the resolved instances of the projects.
+    """
+    index = {
+        'name': {},
+        'key': {},
+        'instance': {}
+    }
+    for v in vendors:
+        for k in index:
+            index[k][v] = {} if k != 'key' else []
+    for lib in libraries:
+        for v in libraries[lib]['vendor']:
+            index['name'][v].setdefault(libraries[lib]['name'], lib)
+            index['key'][v].append(lib)
+
+    return index
+
+
 def resolve_hdl_library(
     libraries: Dict[str, Library],
     key: str,
     intf_lut: Intf,
+    index: Optional[Dict] = None
 ) -> None:
     """
     Resolve a library by extracting generic dependencies, resolving paths
     and checking interfaces
     """
+    if index is None:
+        index = index_hdl_library(libraries)
     library = libraries[key]
 
     # Filter generic deps, if:
@@ -1005,15 +1179,13 @@ def resolve_hdl_library(
 
     # Find path (relative to hdl/library) of library dependencies
     def resolve_lib_dep(dep):
-        for lib in libraries:
-            if v in libraries[lib]['vendor']:
-                if libraries[lib]['name'] == dep:
-                    return lib
+        if dep in index['name'][v]:
+            return index['name'][v][dep]
         logger.warning(f"Library dependency key '{dep}' not found!")
         return dep
     for v in library['vendor']:
         lib_deps = set()
-        for dep in library['vendor'][v]['library_dependencies']:
+        for dep in sorted(library['vendor'][v]['library_dependencies']):
             lib_deps.add(resolve_lib_dep(dep))
         library['vendor'][v]['library_dependencies'] = tuple(sorted(lib_deps))
 
@@ -1022,7 +1194,7 @@ def resolve_hdl_library(
     for v in library['vendor']:
         deps_intf = set()
         interface_deps = set()
-        for intf in library['vendor'][v]['interfaces']:
+        for intf in sorted(library['vendor'][v]['interfaces']):
             if intf not in intf_lut:
                 logger.warning(f"Interface {intf} does not exist in any "
                                "interfaces_ip.tcl file.")
@@ -1072,26 +1244,23 @@ def parse_hdl_project(
         logger.warning(f"{sys_path}: File doesn't exist!")
         return (None, None)
 
-    tcl_ = tcl(sys_path)
+    tcl_ = tcl.load(sys_path)
     # Check adi_project, project name and carrier from adi_project*
     project_name = None
-    for line in tcl_:
-        if line.startswith("adi_project"):
-            line_ = line.split()
-            project_name = line_[1]
-            idx = project_name.find(carrier)
-            if idx > 0:
-                project_ = line_[1][:idx-1]
-                if project_ != project:
-                    logger.warning(f"{sys_path}: Project '{project_}' in "
-                                   "'adi_project' does not match from path.")
-            elif idx == 0:
-                pass
-            else:
-                logger.warning(f"{sys_path}: Carrier from path '{carrier}' "
-                                "not found in 'adi_project'.")
-
-            break
+    cmd = tcl_.first("adi_project")
+    if cmd is not None and len(cmd.args) > 0:
+        project_name = cmd.args[0]
+        idx = project_name.find(carrier)
+        if idx > 0:
+            project_ = project_name[:idx-1]
+            if project_ != project:
+                logger.warning(f"{sys_path}: Project '{project_}' in "
+                               "'adi_project' does not match from path.")
+        elif idx == 0:
+            pass
+        else:
+            logger.warning(f"{sys_path}: Carrier from path '{carrier}' "
+                            "not found in 'adi_project'.")
 
     if project_name is None:
         logger.warning(f"{sys_path}: 'adi_project' not found.")
@@ -1103,9 +1272,9 @@ def parse_hdl_project(
     m_deps.update(tcl_files_)
     # Get project files
     for t in tcl_files:
-        for l in t:
-            if l.startswith('adi_project_files'):
-                i_ = tcl.get_list_items(l)
+        for cmd in t.commands('adi_project_files'):
+            if len(cmd.args) > 1:
+                i_ = tcl.list_items(cmd.args[1])
                 # Convert to relative to file dir
                 dir_ = path.dirname(file)
                 for f in i_:
@@ -1122,15 +1291,12 @@ def parse_hdl_project(
     # Get libraries
     lib_deps = set()
     for t in tcl_files:
-        for l in t:
-            if l.startswith('ad_ip_instance'):
-                l_ = l.split()
-                if len(l_) > 1:
-                    lib_deps.add(l_[1])
-            elif l.startswith('add_instance'):
-                l_ = l.split()
-                if len(l_) > 2:
-                    lib_deps.add(l_[2])
+        for cmd in t.commands('ad_ip_instance'):
+            if len(cmd.args) > 0:
+                lib_deps.add(cmd.args[0])
+        for cmd in t.commands('add_instance'):
+            if len(cmd.args) > 1:
+                lib_deps.add(cmd.args[1])
 
 
     obj = Project(
@@ -1144,19 +1310,35 @@ def parse_hdl_project(
 def resolve_hdl_project(
     project: Project,
     libraries: Dict[str, Library],
+    index: Optional[Dict] = None
 ) -> None:
+    if index is None:
+        index = index_hdl_library(libraries)
+
     def find_lib(key, vendor):
         """
-        Find path (relative to hdl/library) of library dependencies
+        Find path (relative to hdl/library) of library dependencies, by:
+        * IP name.
+        * Library path containing the instance name, reported if more than
+          one does, then the first is used.
         If not found, consider as third_party and don't include to set
+        Resolved once per instance and vendor, shared by all projects.
         """
-        for lib in libraries:
-            if key in lib and vendor in libraries[lib]['vendor']:
-                return lib
-        return
+        instance = index['instance'][vendor]
+        if key not in instance:
+            if key in index['name'][vendor]:
+                instance[key] = index['name'][vendor][key]
+            else:
+                lib_ = [lib for lib in index['key'][vendor] if key in lib]
+                if len(lib_) > 1:
+                    libs = "', '".join(lib_)
+                    logger.warning(f"Instance '{key}' matches the {vendor} "
+                                   f"libraries '{libs}', using '{lib_[0]}'.")
+                instance[key] = lib_[0] if len(lib_) > 0 else None
+        return instance[key]
 
     lib_deps = set()
-    for lib in project['lib_deps']:
+    for lib in sorted(project['lib_deps']):
         if lib_ := find_lib(lib, project['vendor']):
             lib_deps.add(lib_)
     lib_deps = list(lib_deps)
@@ -1,91 +1,287 @@
-from typing import List, Set, Optional, Union, Tuple
+from typing import List, Set, Optional, Union, Tuple, NamedTuple
 
 import re
-from os import path, chdir, getcwd
+from os import path, chdir, getcwd, stat
 
 from sphinx.util import logging
 
+from .cache import get_hash
+
 logger = logging.getLogger(__name__)
 
+
+class command(NamedTuple):
+    """
+    A Tcl command, the arguments are unbraced and unquoted, command
+    substitutions are kept as is, e.g. '[list a b]'.
+    Commands in the body of another, like 'if' or 'foreach', have it as
+    parent, and body is the index of the argument they are in.
+    """
+    name: str
+    args: Tuple[str, ...]
+    text: str
+    line: int
+    parent: Optional['command'] = None
+    body: Optional[int] = None
+
+
+def _match(data: str, i: int, open_: str, close_: str) -> int:
+    """
+    Index of the close_ matching the open_ at i, or the length of data if
+    unbalanced.
+    """
+    depth = 0
+    j = i
+    n = len(data)
+    while j < n:
+        c = data[j]
+        if c == '\\':
+            j += 2
+            continue
+        if c == open_:
+            depth += 1
+        elif c == close_:
+            depth -= 1
+            if depth == 0:
+                return j
+        elif c == '{' and open_ == '[':
+            j = _match(data, j, '{', '}')
+        j += 1
+    return n
+
+
+def _word(data: str, i: int) -> Tuple[str, int, bool]:
+    """
+    Read the word at i, returns its text, the index after it and whether
+    it is braced.
+    """
+    n = len(data)
+    if data[i] == '{':
+        j = _match(data, i, '{', '}')
+        return (data[i+1:j], j+1, True)
+
+    if data[i] == '"':
+        j = i + 1
+        while j < n and data[j] != '"':
+            if data[j] == '\\':
+                j += 2
+            elif data[j] == '[':
+                j = _match(data, j, '[', ']') + 1
+            else:
+                j += 1
+        return (data[i+1:j], j+1, False)
+
+    j = i
+    while j < n and data[j] not in ' \t\r\n;':
+        if data.startswith('\\\n', j):
+            break
+        if data[j] == '\\':
+            j += 2
+        elif data[j] == '[':
+            j = _match(data, j, '[', ']') + 1
+        else:
+            j += 1
+    return (data[i:j], min(j, n), False)
+
+
+def _bodies(cmd: command) -> List[int]:
+    """
+    Index of the arguments that are scripts.
+    """
+    args = cmd.args
+    if cmd.name == 'if':
+        idx = []
+        k = 1
+        while k < len(args):
+            if args[k] == 'then':
+                k += 1
+            idx.append(k)
+            k += 1
+            if k < len(args) and args[k] == 'elseif':
+                k += 2
+            elif k < len(args) and args[k] == 'else':
+                k += 1
+            else:
+                break
+        return idx
+    if cmd.name in ['foreach', 'for', 'while', 'proc']:
+        return [len(args) - 1]
+    if cmd.name == 'namespace' and len(args) > 0 and args[0] == 'eval':
+        return [len(args) - 1]
+    if cmd.name == 'catch':
+        return [0]
+    return []
+
+
+def tokenize(
+    data: str,
+    line: int = 1,
+    parent: Optional[command] = None,
+    body: Optional[int] = None
+) -> List[command]:
+    """
+    Split a script into commands, in source order, including the ones in
+    the bodies of control commands.
+    Handles braces, brackets, quoting, comments and escaped line breaks.
+    """
+    cmds = []
+    i = 0
+    n = len(data)
+    while i < n:
+        c = data[i]
+        if c == '\n':
+            line += 1
+            i += 1
+            continue
+        if c in ' \t\r;':
+            i += 1
+            continue
+        if data.startswith('\\\n', i):
+            line += 1
+            i += 2
+            continue
+        if c == '#':
+            while i < n and data[i] != '\n':
+                if data.startswith('\\\n', i):
+                    line += 1
+                    i += 1
+                i += 1
+            continue
+
+        start = i
+        line_ = line
+        words = []
+        while i < n and data[i] not in '\n;':
+            if data[i] in ' \t\r':
+                i += 1
+                continue
+            if data.startswith('\\\n', i):
+                line += 1
+                i += 2
+                continue
+            word, j, braced = _word(data, i)
+            words.append((word, line, braced))
+            line += data.count('\n', i, j)
+            i = j
+
+        args = tuple(re.sub('\\\\\n[ \t]*', ' ', w) for w, _, _ in words)
+        cmd = command(args[0], args[1:], data[start:i], line_, parent, body)
+        cmds.append(cmd)
+        for k in _bodies(cmd):
+            if k < len(cmd.args) and words[k+1][2]:
+                cmds.extend(tokenize(words[k+1][0], words[k+1][1], cmd, k))
+
+    return cmds
+
+
 class tcl:
+    # Parsed files and sourced closures, shared by every project of the
+    # process, since most source the same common and board scripts
+    _cache = {}
+    _sourced = {}
+
     def __init__(self, file: str):
         """
-        Tcl systax is line break sensitive -> squash escaped line breaks on
-        open to simply parsing later.
-        Tabs are the same as spaces -> replace all tabs with space.
-        Strip leading whitespace and from common methods like lists.
+        Tokenize the file and index the commands by name.
         """
-        data = []
         with open(file, "r") as f:
-            line_ = ''
-            for line in f:
-                if line.endswith('\\\n'):
-                    line_ += line[:-2]
-                elif any(line.lstrip().startswith(x) for x in [']', '}']) and line_ == '':
-                    data[-1] = data[-1] + ' ' + line[:-1]
-                else:
-                    line_ += line.replace('\n', '')
-                    data.append(line_)
-                    line_ = ''
-        data = [' '.join(l.replace("\t", " ").strip().split()) for l in data]
-        for m in ["list", "info"]:
-            data = [l.replace("[ "+m, "["+m) for l in data]
-        self.data = data
+            data = f.read()
+
+        self.data = tokenize(data)
+        self.index = {}
+        for cmd in self.data:
+            if cmd.name not in self.index:
+                self.index[cmd.name] = []
+            self.index[cmd.name].append(cmd)
 
     def __iter__(self):
         return iter(self.data)
 
-    @staticmethod
-    def get_list_items(
-        line: str
-    ) -> List[str]:
-        i1 = line.find("[list")
-        if i1 != -1:
-            i2 = line.index("]")
-            i_ = 5
-        else:
-            i1 = line.index("{")
-            i2 = line.index("}")
-            i_ = 1
+    def commands(self, name: str) -> List[command]:
+        return self.index.get(name, [])
 
-        if i2 < i1:
-            return []
+    def first(
+        self,
+        name: Union[List[str], str]
+    ) -> Optional[command]:
+        """
+        First command in source order with any of the names.
+        """
+        name = [name] if type(name) is str else name
+        cmds = [self.index[n][0] for n in name if n in self.index]
+        if len(cmds) == 0:
+            return None
+        return min(cmds, key=lambda c: c.line)
 
-        items = line[i1+i_:i2].split()
-        for i, item in enumerate(items):
-            if item[0] == '"' and item[-1] == '"':
-                items[i] = item[1:-1]
+    @staticmethod
+    def list_items(
+        word: str
+    ) -> List[str]:
+        """
+        Items of a list argument, either '[list a b]' or braced '{a b}'.
+        """
+        if word.startswith('['):
+            cmds = tokenize(word[1:-1])
+            if len(cmds) == 0 or cmds[0].name != 'list':
+                return []
+            return list(cmds[0].args)
 
+        items = []
+        i = 0
+        while i < len(word):
+            if word[i] in ' \t\r\n':
+                i += 1
+                continue
+            if word.startswith('\\\n', i):
+                i += 2
+                continue
+            item, i, _ = _word(word, i)
+            items.append(item)
         return items
 
-    def line_startswith(
-        self,
-        start: Union[List[str], str]
-    ) -> Optional[str]:
-        start = [start] if type(start) is str else start
-        for line in self.data:
-            for s in start:
-                if line.startswith(s):
-                    return line
-        return None
-
     def in_method_match(
         self,
         expr: str,
-        start: str
+        name: str
     ) -> Optional[Set]:
         """
         Try to match all inside a tcl method.
         """
         v = set()
-        for line in self.data:
-            if line.startswith(start):
-                m = re.findall(expr, line)
-                if m is False or m is None:
-                    return None
-                v.update(m)
+        for cmd in self.commands(name):
+            m = re.findall(expr, cmd.text)
+            if m is False or m is None:
+                return None
+            v.update(m)
         return v
 
+    @classmethod
+    def load(cls, file: str) -> Optional['tcl']:
+        """
+        Get the parsed file, reusing the previous parse while the file
+        modification time and size, or else its content hash, are unchanged.
+        Returns None if the file doesn't exist.
+        """
+        file = path.abspath(file)
+        try:
+            st = stat(file)
+        except OSError:
+            cls._cache.pop(file, None)
+            return None
+        st = (st.st_mtime_ns, st.st_size)
+
+        if file in cls._cache:
+            tcl_, st_, hash_ = cls._cache[file]
+            if st == st_:
+                return tcl_
+            if get_hash(file) == hash_:
+                cls._cache[file] = (tcl_, st, hash_)
+                return tcl_
+
+        tcl_ = cls(file)
+        cls._cache[file] = (tcl_, st, get_hash(file))
+        return tcl_
+
     @staticmethod
     def get_sourced_files(
         file: str,
@@ -94,27 +290,43 @@ class tcl:
         """
         Recursively get a list of sourced files.
         Returns a list of tcl objects
+        The closure is reused while none of the visited files changed,
+        '$ad_hdl_dir' is the working directory so it is part of the key.
         """
         file = path.abspath(file)
+        key = (file, include_self, getcwd())
+        if key in tcl._sourced:
+            tcls, files, visited = tcl._sourced[key]
+            if all(tcl.load(f) is t for f, t in visited):
+                for f, t in visited:
+                    if t is None:
+                        logger.warning(f"{f}: File doesn't exist!")
+                return list(tcls), list(files)
+
         files = [file] if include_self else []
         tcls = []
+        visited = []
 
         def parse(file_):
-            if not path.isfile(file_):
+            tcl_ = tcl.load(file_)
+            visited.append((file_, tcl_))
+            if tcl_ is None:
                 logger.warning(f"{file_}: File doesn't exist!")
                 return
-            tcl_ = tcl(file_)
             tcls.append(tcl_)
             skip_list = ["adi_env.tcl", "adi_project_xilinx.tcl", "adi_project_intel.tcl", "adi_board.tcl"]
 
-            for i, line in enumerate(tcl_):
-                if line.startswith("source "):
-                    item = line.split()[1]
+            for cmd in tcl_.commands("source"):
+                if len(cmd.args) > 0:
+                    item = cmd.args[0]
+                    parent = cmd.parent
                     if any([item.endswith(i) for i in skip_list]):
                        continue
                     if item.startswith("$ad_hdl_dir/"):
                         item = path.abspath(item[12:])
-                    elif tcl_.data[i-1].startswith("if [info exists ad_project_dir"):
+                    elif (parent is not None and parent.name == "if" and
+                          cmd.body == 1 and
+                          parent.args[0].startswith("[info exists ad_project_dir")):
                         # Skip the alternative path
                         continue
                     else:
@@ -128,4 +340,5 @@ class tcl:
         dir_ = path.dirname(file)
         files = [path.relpath(f, dir_)  for f in files]
 
-        return tcls, files
+        tcl._sourced[key] = (tcls, files, visited)
+        return list(tcls), list(files)
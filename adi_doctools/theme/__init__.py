@@ -1,10 +1,22 @@
-from os import path, getenv
+import re
+from os import path, getenv, getpid, replace, listdir, remove
+from copy import deepcopy
+from hashlib import sha1
 
 from lxml import etree
 from lxml import html
 
 from docutils import nodes
 from sphinx.highlighting import PygmentsBridge
+try:
+    from sphinx.environment.adapters.toctree import global_toctree_for_doc
+except ImportError:
+    # Sphinx < 7.2
+    from sphinx.environment.adapters.toctree import TocTree
+
+    def global_toctree_for_doc(env, docname, builder, **kwargs):
+        return TocTree(env).get_toctree_for(docname, builder, **kwargs)
+from sphinx.util.osutil import SEP, relative_uri
 from sphinx.transforms.post_transforms import SphinxPostTransform
 
 from .cosmic import cosmic_setup
@@ -23,6 +35,7 @@ def theme_config_setup(app):
     app.add_config_value('target_depth', None, 'env', [str])
 
     app.connect("config-inited", config_inited)
+    app.connect("env-updated", navigation_reset)
     app.connect("build-finished", build_finished)
 
 
@@ -77,8 +90,11 @@ def build_finished(app, exc):
             with open(file, 'w') as f:
                 json.dump(metadata, f, indent=4)
 
+        if getattr(app.builder, 'globalcontext', None) is not None:
+            navigation_assets(app)
 
-def repotoc_tree(content_root, conf_vars, pagename):
+
+def repotoc_tree(content_root, conf_vars, pagename, cache=None):
     """
     Create the repotoc tree linking to other repos documentations.
     From the 'repository' config value, a 'current' class is added to
@@ -88,8 +104,25 @@ def repotoc_tree(content_root, conf_vars, pagename):
     docs.example.com/v0.1/hdl -> ../no-OS -> docs.example.com/v0.1/no-OS
     While something with 0 depth is improper:
     hdl-docs.example.com -> ../no-OS -XXX-> hdl-docs.example.com/no-OS
+    With a cache, the tree is rendered once per content root and topics of
+    the repository the page is in.
     """
     repo, repos, depth = conf_vars
+    if cache is not None:
+        subs = []
+        if repo is not None:
+            for key in repos:
+                if (repos[key]['visibility'] == 'public' and
+                        'topic' in repos[key]):
+                    for k in repos[key]['topic']:
+                        if (f"{key}/{k}".startswith(repo) and
+                                pagename.startswith(k)):
+                            subs.append(k)
+        key = (content_root, repo, depth, tuple(subs))
+        if key not in cache:
+            cache[key] = repotoc_tree(content_root, conf_vars, pagename)
+        return cache[key]
+
     root = etree.Element("root")
     home = "index.html"
     current = ''
@@ -130,7 +163,159 @@ def repotoc_tree(content_root, conf_vars, pagename):
             current)
 
 
-def navigation_tree(app, toctree_html, content_root, pagename):
+# Placeholder page name, for the links relative to a folder
+navigation_docname = '_adoc_navigation'
+
+
+def navigation_reset(app, env):
+    """
+    The navigation and repotoc of the previous build are stale once docs
+    are read.
+    So is the root doctree the global toctree is resolved from, cached by
+    the env for its lifetime, when the app is reused (adoc serve).
+    """
+    app.navigation = None
+    app.repotoc = {}
+    env.__dict__.pop('master_doctree', None)
+    env._pickled_doctree_cache.pop(env.config.root_doc, None)
+
+
+def navigation_prepare(app):
+    """
+    Render the toctree of all docs once per build, with the links
+    relative to the root doc, and no entry marked as current.
+    Each link to a doc is recorded by the index of its <a> element in
+    document order, with the target uri of the doc and the anchor.
+    """
+    builder = app.builder
+    root_doc = app.env.config.root_doc
+    toctree = global_toctree_for_doc(app.env, root_doc, builder,
+                                     collapse=False,
+                                     titles_only=True,
+                                     maxdepth=-1,
+                                     includehidden=True)
+    nav = {'root': None, 'doc': {}, 'link': {}, 'cache': {}, 'asset': {}}
+    if toctree is None:
+        return nav
+    toctree_html = builder.render_partial(toctree)['fragment']
+    if not toctree_html:
+        return nav
+
+    uri = builder.get_target_uri(root_doc)
+    docs = {}
+    for d in app.env.found_docs:
+        docs[relative_uri(uri, builder.get_target_uri(d))] = d
+
+    parser = etree.HTMLParser()
+    root = etree.fromstring(toctree_html, parser)
+    # Marked if the root doc is in its own toctree
+    for e in root.iter():
+        _class = e.get('class')
+        if _class is not None and 'current' in _class.split():
+            _class = ' '.join(c for c in _class.split() if c != 'current')
+            e.set('class', _class)
+    for i, a in enumerate(root.iter('a')):
+        href, _, anchor = a.get('href', '').partition('#')
+        if href not in docs:
+            continue
+        d = docs[href]
+        nav['link'][i] = (builder.get_target_uri(d),
+                          f"#{anchor}" if anchor else '')
+        nav['doc'].setdefault(d, []).append(i)
+
+    # Index of the toctree of each link, see filter_toctree
+    links = {a: i for i, a in enumerate(root.iter('a'))}
+    nav['topic'] = {}
+    for j, ul in enumerate(root.find('./body').iterchildren('ul')):
+        for a in ul.iter('a'):
+            nav['topic'][links[a]] = j
+    nav['root'] = root
+    return nav
+
+
+# Files written by navigation_asset, hashed by topics, and by former
+# versions, by content
+navigation_asset_re = re.compile(r"navigation\.[0-9a-f]{16}\.html")
+
+
+def is_shared_navigation(context) -> bool:
+    """
+    Whether the shared_navigation theme option is set in the context.
+    """
+    shared = context.get('theme_shared_navigation', '')
+    return str(shared).lower() not in ['', 'false']
+
+
+def navigation_topics(app, nav, pagename):
+    """
+    Indexes of the toctrees containing the page, if filtered, see
+    filter_toctree.
+    """
+    if not app.env.config.filter_toctree:
+        return None
+    # If page not on toctree, do not filter
+    # e.g. /index.html, /search.html, orphan
+    current = frozenset(nav['topic'][i]
+                        for i in nav['doc'].get(pagename, [])
+                        if nav['link'][i][1] == '')
+    return current if current else None
+
+
+def navigation_asset(app, root, current):
+    """
+    Write a navigation tree with the links relative to the root to
+    _static, named by the hash of its visible topics, and return its uri.
+    The name is stable, so the pages not written again by an incremental
+    build still get the updated tree, and the file is only written if
+    changed, keeping its validators for the browser revalidation.
+    Through a temporary file, since parallel writers may write the same.
+    """
+    topics = None if current is None else sorted(current)
+    hash_ = sha1(repr(topics).encode('utf-8')).hexdigest()[0:16]
+    name = f"navigation.{hash_}.html"
+    data = ''.join(etree.tostring(e, encoding='unicode')
+                   for e in root.find('./body'))
+    file = path.join(app.builder.outdir, '_static', name)
+    try:
+        with open(file, 'r', encoding='utf-8') as f:
+            if f.read() == data:
+                return f"_static/{name}"
+    except OSError:
+        pass
+    tmp = f"{file}.{getpid()}"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(data)
+    replace(tmp, file)
+    return f"_static/{name}"
+
+
+def navigation_assets(app):
+    """
+    Write the shared navigation trees of the pages not written by this
+    build, and remove the trees no page references.
+    The trees written by the parallel write processes are not known here,
+    so they are rendered again, and found up to date.
+    """
+    keep = set()
+    if is_shared_navigation(app.builder.globalcontext):
+        nav = getattr(app, 'navigation', None)
+        if nav is None:
+            nav = app.navigation = navigation_prepare(app)
+        for d in sorted(app.env.found_docs):
+            current = navigation_topics(app, nav, d)
+            if current not in nav['asset']:
+                navigation_tree(app, True, '', d, True)
+        keep = set(nav['asset'].values())
+
+    static = path.join(app.builder.outdir, '_static')
+    if not path.isdir(static):
+        return
+    for f in listdir(static):
+        if navigation_asset_re.fullmatch(f) and f"_static/{f}" not in keep:
+            remove(path.join(static, f))
+
+
+def navigation_tree(app, toctree, content_root, pagename, shared=False):
     """
     Add collapsible sections to the navigation tree.
     Adapted from
@@ -139,6 +324,15 @@ def navigation_tree(app, toctree_html, content_root, pagename):
     Uses checkbox~label trick, similar to
     directive/common.py:directive_base:collapsible.
     Add elements, similar to toos/hdl_render.py:hdl_component.py
+
+    The tree is rendered and decorated once per build by
+    navigation_prepare, then once per page folder and set of visible
+    topics, with the links relative to the folder.
+    Each page only marks itself as current on a copy.
+    If shared, the tree is written once per set of visible topics by
+    navigation_asset instead, and the theme marks the current page.
+    For the parallel writes, navigation_assets writes again the trees
+    written by the other processes at the end of the build.
     """
 
     conf_vars = (
@@ -149,11 +343,7 @@ def navigation_tree(app, toctree_html, content_root, pagename):
 
     lvl = [0]
 
-    def get_topic(pagename):
-        i = pagename.find('/')
-        return pagename[0:i] if i != -1 else ''
-
-    def filter_toctree(root, pagename):
+    def filter_toctree(root, current):
         """
         Filter-out non-current topics/"toctrees-titles".
         Non-titled toctrees are squashed with the last toctree, e.g.
@@ -168,26 +358,22 @@ def navigation_tree(app, toctree_html, content_root, pagename):
         is to tweak the max depth option depending on the content,
         but still on the same topic.
         Only the System Level Documentation should have toctrees with captions.
+        current are the indexes of the toctrees containing the page.
         """
         body = root.find('./body')
 
-        found = False
         #      Current, Elements
         tocs = [[False, []]]
+        i = 0
         for e in body.getchildren():
             if e.tag == 'ul':
-                if e.get("class") == "current":
+                if i in current:
                     tocs[-1][0] = True
-                    found = True
+                i += 1
             elif e.tag == 'p':
                 tocs.append([False,[]])
             tocs[-1][1].append(e)
 
-        # If page not on toctree, do not filter
-        # e.g. /index.html, /search.html, orphan
-        if not found:
-            return
-
         for t in tocs:
             if t[0] == False:
                 for e in t[1]:
@@ -203,9 +389,6 @@ def navigation_tree(app, toctree_html, content_root, pagename):
                 'name': f"toctree-collapse-{tag}",
                 'id': f"toctree-collapse-{tag}"
             })
-            _class = elem.get("class")
-            if _class is not None and 'current' in _class:
-                _input.set('checked')
             label = etree.Element("label", attrib={
                 'for': f"toctree-collapse-{tag}"
             })
@@ -231,25 +414,95 @@ def navigation_tree(app, toctree_html, content_root, pagename):
                 iterate(li)
             lvl.pop()
 
-    if toctree_html:
-        parser = etree.HTMLParser()
-        root = etree.fromstring(toctree_html, parser)
-
-        if app.env.config.filter_toctree:
-            filter_toctree(root, pagename)
+    def decorate(nav, base, current):
+        """
+        Filter, decorate and set the links relative to the page folder,
+        base is the target uri of any page in it.
+        Returns the tree and the path of the <a> element of each link.
+        """
+        root = deepcopy(nav['root'])
+        links = list(root.iter('a'))
+        for i, link in nav['link'].items():
+            uri, anchor = link
+            links[i].set('href', (relative_uri(base, uri) + anchor) or '#')
+
+        if current is not None:
+            filter_toctree(root, current)
         for ul in root.findall('./body/ul'):
             for li in ul.findall('./li[@class]'):
                 iterate(li)
 
-        toctree_html = etree.tostring(root, pretty_print=True, encoding='unicode')
+        tree = root.getroottree()
+        paths = {}
+        for i in nav['link']:
+            # Not of a filtered-out topic
+            if links[i].getroottree().getroot() is root:
+                paths[i] = tree.getpath(links[i])
+        return root, paths
 
-    _repotoc_tree, _current = repotoc_tree(content_root, conf_vars, pagename)
+    def mark_current(root, paths, nav, pagename):
+        """
+        Mark the branches leading to the page, like the sphinx toctree does,
+        and expand their collapsibles.
+        """
+        for i in nav['doc'].get(pagename, []):
+            if i not in paths:
+                continue
+            a = root.xpath(paths[i])[0]
+            anchor = nav['link'][i][1]
+            a.set('href', anchor or '#')
+            if anchor:
+                continue
+            a.set('class', f"current {a.get('class')}")
+            for e in a.iterancestors('li', 'ul'):
+                _class = e.get('class')
+                if _class is None:
+                    e.set('class', 'current')
+                elif 'current' not in _class.split():
+                    e.set('class', f"{_class} current")
+                if e.tag == 'li' and len(e) and e[0].tag == 'input':
+                    e[0].set('checked', '')
+
+    toctree_html = ""
+    toctree_src = ""
+    if toctree:
+        nav = getattr(app, 'navigation', None)
+        if nav is None:
+            nav = app.navigation = navigation_prepare(app)
+
+    if toctree and nav['root'] is not None:
+        current = navigation_topics(app, nav, pagename)
+
+        # Any page of the folder, but not a target of the links
+        uri = app.builder.get_target_uri(pagename)
+        base = '' if shared else uri.rpartition(SEP)[0]
+        key = (base, current)
+        if key not in nav['cache']:
+            base = (f"{base}{SEP}{navigation_docname}" if base
+                    else navigation_docname)
+            nav['cache'][key] = decorate(nav, base, current)
+        root, paths = nav['cache'][key]
+
+        if shared:
+            if current not in nav['asset']:
+                nav['asset'][current] = navigation_asset(app, root, current)
+            toctree_src = relative_uri(uri, nav['asset'][current])
+        else:
+            root = deepcopy(root)
+            mark_current(root, paths, nav, pagename)
+
+            toctree_html = etree.tostring(root, pretty_print=True, encoding='unicode')
+
+    if getattr(app, 'repotoc', None) is None:
+        app.repotoc = {}
+    _repotoc_tree, _current = repotoc_tree(content_root, conf_vars, pagename,
+                                           app.repotoc)
     if conf_vars[0] in conf_vars[1]:
         name = conf_vars[1][conf_vars[0]]['name']
     else:
         # If repository entry is not in the lut.py, use the project entry
         name = app.env.config.project
-    return (toctree_html, _repotoc_tree, name, _current)
+    return (toctree_html, toctree_src, _repotoc_tree, name, _current)
 
 
 def get_pygments_theme(app):
@@ -319,14 +572,12 @@ class wrap_elements(SphinxPostTransform):
             if hasattr(self.document, "findall")
             else self.document.traverse  # docutils <= 0.17.x
         )
-        for node in list(get_nodes(nodes.table)):
-            new_node = nodes.container(classes=["table-wrapper"])
-            new_node.update_all_atts(node)
-            node.parent.replace(node, new_node)
-            new_node.append(node)
-
-        for node in list(get_nodes(nodes.math_block)):
-            new_node = nodes.container(classes=["math-wrapper"])
+        # In a single pass
+        types = (nodes.table, nodes.math_block)
+        for node in list(get_nodes(lambda n: isinstance(n, types))):
+            wrapper = ("table-wrapper" if isinstance(node, nodes.table)
+                       else "math-wrapper")
+            new_node = nodes.container(classes=[wrapper])
             new_node.update_all_atts(node)
             node.parent.replace(node, new_node)
             new_node.append(node)
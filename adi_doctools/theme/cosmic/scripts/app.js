@@ -1,5 +1,6 @@
 import '../style/bundle.scss'
 import { navigation } from './navigation.js'
+import { regmap } from './regmap.js'
 
 export default function App (){
   window.app = {}
@@ -7,6 +8,10 @@ export default function App (){
   app.navigation = navigation
 
   app.navigation.init()
+
+  app.regmap = regmap
+
+  app.regmap.init()
 }
 
 App()
@@ -235,8 +235,74 @@ class Navigation {
     onresize = () => {this.handleResize()}
     onscroll = () => {this.handleScroll()}
     document.addEventListener('keyup', (e) => {this.keyUp(e)}, false);
+    this.sharedToctree()
     this.dynamic()
   }
+  /**
+   * Load the navigation tree shared by all pages, written when the
+   * shared_navigation theme option is set.
+   * The copy of the browser session is shown at once, then revalidated,
+   * the file keeps its name across builds.
+   */
+  sharedToctree () {
+    let tree = DOM.get('.toc-tree[data-src]')
+    if (tree === null)
+      return
+
+    let src = tree.dataset.src
+    let key = `toctree:${src.split('/').pop()}`
+    let render = (html) => {
+      tree.innerHTML = html
+      this.markToctree(tree)
+    }
+
+    let cached = sessionStorage.getItem(key)
+    if (cached !== null)
+      render(cached)
+    fetch(src, {cache: 'no-cache'}).then((response) => {
+      if (response.ok !== true)
+        return
+      return response.text()
+    }).then((html) => {
+      if (html === undefined || html === cached)
+        return
+      try {
+        sessionStorage.setItem(key, html)
+      } catch (e) {}
+      render(html)
+    }).catch((e) => {
+      console.warn(`navigation: failed to get ${src}`)
+    })
+  }
+  /**
+   * Make the links of the shared navigation tree relative to the page,
+   * and mark the branches leading to the page as current, expanding them.
+   */
+  markToctree (tree) {
+    let page = (url) => url.split(/[?#]/)[0].replace(/index\.html$/, '')
+    let current = page(location.href)
+    DOM.getAll('a', tree).forEach((a) => {
+      let href = a.getAttribute('href')
+      if (!/^([a-z]+:|\/|#)/i.test(href))
+        a.setAttribute('href', this.contentRoot + href)
+      if (page(a.href) !== current)
+        return
+
+      let hash = a.hash
+      a.setAttribute('href', hash === '' ? '#' : hash)
+      if (hash !== '')
+        return
+      a.classList.add('current')
+      for (let e = a.parentElement; e !== tree; e = e.parentElement) {
+        if (e.tagName !== 'LI' && e.tagName !== 'UL')
+          continue
+        e.classList.add('current')
+        let input = e.firstElementChild
+        if (e.tagName === 'LI' && input.tagName === 'INPUT')
+          input.checked = true
+      }
+    })
+  }
   /**
    * Updates elements in a reactive manner,
    * fetching from the main doctools/metadata.js,
@@ -0,0 +1,145 @@
+"use strict";
+
+import {DOM} from './dom.js'
+
+/*
+ * Render the register maps exported to JSON by the hdl-regmap directive
+ * client-side option.
+ * Rows are appended in chunks as the table end scrolls into view, and the
+ * search filters the registers by register and field name and description.
+ */
+class RegMap {
+  constructor () {
+    this.chunk = 50
+  }
+  /**
+   * Fetch and render each register map of the page.
+   */
+  init () {
+    DOM.getAll('.regmap-json[data-src]', document).forEach((elem) => {
+      let $ = new DOM(elem)
+      fetch($.$.dataset.src).then((response) => {
+        if (response.ok !== true)
+          return
+        return response.json()
+      }).then((obj) => {
+        if (!obj)
+          return
+        this.render($, obj['regmap'])
+      }).catch((e) => {
+        console.warn(`regmap: failed to get ${$.$.dataset.src}`)
+      })
+    })
+  }
+  /**
+   * Create a cell, literal cells are wrapped in code like the static table.
+   */
+  cell (text, literal, props) {
+    let td = new DOM('td', props)
+    if (literal) {
+      let code = new DOM('code', {className: 'docutils literal notranslate'})
+      code.innerText = text
+      td.append(code)
+    } else {
+      td.$.innerHTML = text
+    }
+    return td
+  }
+  /**
+   * Create the rows of a register and its fields.
+   */
+  rows (reg) {
+    let tr = new DOM('tr')
+    tr.append([
+      this.cell(reg[0], true, {className: 'bold'}),
+      this.cell(reg[1], true, {className: 'bold'}),
+      this.cell(reg[2], true, {className: 'bold', colSpan: 4}),
+      this.cell(reg[3], false, {className: 'description bold'})
+    ])
+    let rows = [tr]
+    reg[4].forEach((field) => {
+      tr = new DOM('tr')
+      tr.append([
+        this.cell('', true, {colSpan: 2}),
+        this.cell(field[0], true),
+        this.cell(field[1], true),
+        this.cell(field[2], true),
+        this.cell(field[3], true, {className: 'default'}),
+        this.cell(field[4], false, {className: 'description'})
+      ])
+      rows.push(tr)
+    })
+    return rows
+  }
+  /**
+   * Replace the placeholder by the search input and the table.
+   */
+  render ($, regmap) {
+    let head = (cols) => {
+      let tr = new DOM('tr')
+      cols.forEach((col) => {
+        let th = new DOM('th', {className: 'head', colSpan: col[1]})
+        th.innerText = col[0]
+        tr.append(th)
+      })
+      return new DOM('thead').append(tr)
+    }
+    let table = new DOM('table', {className: 'regmap docutils'})
+    let tbody = new DOM('tbody')
+    table.append([
+      head([['DWORD', 1], ['BYTE', 1], ['Reg Name', 4], ['Description', 1]]),
+      head([['', 2], ['BITS', 1], ['Field Name', 1], ['Type', 1],
+            ['Default Value', 1], ['Description', 1]]),
+      tbody
+    ])
+    let search = new DOM('input', {
+      className: 'regmap-search',
+      type: 'search',
+      placeholder: 'Filter registers and fields'
+    })
+    let sentinel = new DOM('div', {className: 'regmap-sentinel'})
+
+    // Plain text to match, per register
+    let text = regmap.map((reg) => {
+      let str = [reg[2], reg[3]]
+      reg[4].forEach((field) => {str.push(field[1], field[4])})
+      return str.join('\n').replace(/<[^>]*>/g, '').toLowerCase()
+    })
+    let match = regmap
+    let next = 0
+    let observer = new IntersectionObserver((entries) => {
+      if (entries[0].isIntersecting)
+        more()
+    }, {rootMargin: '100%'})
+    let more = () => {
+      let end = Math.min(next + this.chunk, match.length)
+      for (; next < end; next++)
+        tbody.append(this.rows(match[next]))
+      // Observe again, to be notified if the sentinel is still in view
+      observer.unobserve(sentinel.$)
+      if (next < match.length)
+        observer.observe(sentinel.$)
+    }
+
+    let timeout
+    search.$.oninput = () => {
+      clearTimeout(timeout)
+      timeout = setTimeout(() => {
+        let value = search.value.trim().toLowerCase()
+        match = value === '' ? regmap :
+                regmap.filter((reg, i) => text[i].includes(value))
+        next = 0
+        tbody.removeChilds()
+        more()
+      }, 200)
+    }
+
+    let wrapper = new DOM('div', {className: 'table-wrapper'})
+    wrapper.append(table)
+    $.removeChilds()
+    $.append([search, wrapper, sentinel])
+    more()
+  }
+}
+
+export let regmap = new RegMap()
@@ -1,5 +1,7 @@
-from typing import Dict, Tuple
+from typing import Dict, Tuple, Optional, Pattern
 
+import re
+from io import StringIO
 from datetime import datetime
 from os import path
 
@@ -63,6 +65,37 @@ license_sv = f"""\
 // ***************************************************************************
 """
 
+# Run time of the generated package, see svpkg_head
+svpkg_time_fmt = '%b %d %H:%M:%S %Y'
+svpkg_time = re.compile(r"^/\* \S+ \d{2} \d{2}:\d{2}:\d{2} \d{4} ",
+                        re.MULTILINE)
+
+
+def write_if_changed(
+    file: str,
+    data: str,
+    ignore: Optional[Pattern] = None
+) -> bool:
+    """
+    Write the file only if the content changed, so make and the simulators
+    do not rebuild its dependents.
+    ignore matches the parts to not compare, e.g. a time stamp, the rest of
+    their line, like the tool version, is still compared.
+    """
+    if path.isfile(file):
+        with open(file, "r") as f:
+            data_ = f.read()
+        a, b = data, data_
+        if ignore is not None:
+            a, b = ignore.sub('', a), ignore.sub('', b)
+        if a == b:
+            return False
+
+    with open(file, "w") as f:
+        f.write(data)
+    return True
+
+
 def svpkg_regmap(f, regmap: Dict, key: str):
     f.write(f"    /* {regmap['title']} */\n")
 
@@ -108,7 +141,7 @@ def svpkg_regmap(f, regmap: Dict, key: str):
 
 
 def svpkg_head(f, key: str, regmap: Dict):
-    run_time = datetime.now().strftime('%b %d %H:%M:%S %Y')
+    run_time = datetime.now().strftime(svpkg_time_fmt)
     pkgname = f"adi_regmap_{key}_pkg"
     classname = f"adi_regmap_{key}"
     f.write(license_sv)
@@ -191,7 +224,7 @@ def write_hdl_regmap(
 ) -> None:
     fname = f"adi_regmap_{key}_pkg.sv"
     file = path.join(path_, fname)
-    f = open(file, "w")
+    f = StringIO()
     svpkg_head(f, key, regmap)
 
     for rm in regmap:
@@ -207,7 +240,7 @@ def write_hdl_regmap(
 
     svpkg_footer(f)
 
-    f.close()
+    write_if_changed(file, f.getvalue(), svpkg_time)
 
 
 def write_hdl_library_makefile(
@@ -217,7 +250,7 @@ def write_hdl_library_makefile(
     library = libraries[path_]
     fname = "Makefile"
     file = path.join('library', path_, fname)
-    f = open(file, "w")
+    f = StringIO()
     f.write(license_makefile)
     f.write("\n")
     f.write(f"LIBRARY_NAME := {library['name']}\n")
@@ -250,7 +283,7 @@ def write_hdl_library_makefile(
     p_ = path.join('scripts', 'library.mk')
     p_ = path.relpath(p_, path_)
     f.write(f"include {p_}\n")
-    f.close()
+    write_if_changed(file, f.getvalue())
 
 
 def write_hdl_project_makefile(
@@ -260,7 +293,7 @@ def write_hdl_project_makefile(
     project = project[path_]
     fname = "Makefile"
     file = path.join('projects', path_, fname)
-    f = open(file, "w")
+    f = StringIO()
     f.write(license_makefile)
     f.write("\n")
     f.write(f"PROJECT_NAME := {project['name']}\n")
@@ -274,4 +307,4 @@ def write_hdl_project_makefile(
     p_ = f"scripts/project-{project['vendor']}.mk"
     p_ = path.relpath(p_, path_)
     f.write(f"include {p_}\n")
-    f.close()
+    write_if_changed(file, f.getvalue())
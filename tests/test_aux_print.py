@@ -0,0 +1,82 @@
+import pytest
+from lxml import html
+
+from adi_doctools.cli.aux_print import split_volumes, incremental_pdf
+
+doc = """\
+<html><head><title>Doc: Test</title></head>
+<body><div class="tocwrapper"><ul>
+  <li><a href="#intro">Intro</a></li>
+  <li><a href="#one">One</a></li>
+  <li><a href="#two">Two</a></li>
+</ul></div>
+<div class="bodywrapper" id="wrapper">before
+<section id="intro"><h2>Intro</h2><p>Front text.</p></section>
+<div class="volume"><h1>Volume one</h1></div>
+<section id="one"><h2>One</h2><p id="p1">First <b>volume</b> text.</p>tail
+</section>
+middle
+<div class="volume"><h1>Volume two</h1></div>
+<section id="two"><h2>Two</h2><p id="p2">Second volume text.</p>
+<p>{extra}</p></section>
+after</div>
+</body></html>
+"""
+
+
+def ids(root):
+    return [e.get('id') for e in root.iter() if e.get('id') is not None]
+
+
+def text(root):
+    return ''.join(root.find('body').itertext())
+
+
+def test_split_volumes():
+    html_ = doc.format(extra='More.').encode()
+    root = html.fromstring(html_)
+    parts = split_volumes(html_)
+    assert len(parts) == 3
+
+    # Each part keeps the head
+    for p in parts:
+        assert p.find('head/title').text == 'Doc: Test'
+    # The parts partition the content and the ids
+    assert ''.join(text(p) for p in parts) == text(root)
+    assert sorted(sum((ids(p) for p in parts), [])) == sorted(ids(root))
+    assert ids(parts[0]) == ['wrapper', 'intro']
+    assert ids(parts[1]) == ['one', 'p1']
+    assert ids(parts[2]) == ['two', 'p2']
+    assert parts[1].xpath("//div[@class='volume']/h1")[0].text == 'Volume one'
+    assert parts[2].xpath("//div[@class='tocwrapper']") == []
+
+
+def test_incremental_pdf(tmp_path):
+    # Also fails without the pango library
+    try:
+        import weasyprint  # noqa: F401
+    except (ImportError, OSError):
+        pytest.skip("weasyprint is not available")
+
+    css = tmp_path / 'style.css'
+    css.write_text("@page { size: A5 }\n"
+                   ".volume { break-before: page }\n")
+    output = str(tmp_path / 'doc.pdf')
+    pdf = incremental_pdf()
+
+    pdf.write(doc.format(extra='More.').encode(), str(tmp_path),
+              [str(css)], output)
+    # The first part twice, to count its pages, then numbered
+    assert pdf.rendered == 4
+    with open(output, 'rb') as f:
+        assert f.read(5) == b'%PDF-'
+
+    # Unchanged, all parts reused
+    pdf.write(doc.format(extra='More.').encode(), str(tmp_path),
+              [str(css)], output)
+    assert pdf.rendered == 0
+
+    # Only the changed volume, the others start at the same page
+    pdf.write(doc.format(extra='Changed.').encode(), str(tmp_path),
+              [str(css)], output)
+    assert pdf.rendered == 1
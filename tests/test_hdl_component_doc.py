@@ -0,0 +1,102 @@
+from sphinx.application import Sphinx
+
+import adi_doctools.directive.hdl as hdl
+
+component = """\
+<?xml version="1.0" encoding="UTF-8"?>
+<spirit:component xmlns:xilinx="{xilinx}" xmlns:spirit="{spirit}"
+                  xmlns:xsi="{xsi}">
+  <spirit:vendor>analog.com</spirit:vendor>
+  <spirit:name>core</spirit:name>
+  <spirit:model>
+    <spirit:ports>
+      <spirit:port>
+        <spirit:name>{port}</spirit:name>
+        <spirit:wire><spirit:direction>in</spirit:direction></spirit:wire>
+      </spirit:port>
+    </spirit:ports>
+  </spirit:model>
+</spirit:component>
+"""
+ns = {
+    'xilinx': "http://www.xilinx.com",
+    'spirit': "http://www.spiritconsortium.org/XMLSchema/SPIRIT/1685-2009",
+    'xsi': "http://www.w3.org/2001/XMLSchema-instance"
+}
+
+# More than 5, read in parallel
+docs = [f"d{i}" for i in range(6)]
+
+
+def test_hdl_component_doc(tmp_path, monkeypatch):
+    lib = tmp_path / 'library' / 'core'
+    lib.mkdir(parents=True)
+    xml = lib / 'component.xml'
+    xml.write_text(component.format(**ns, port='clk'))
+    src = tmp_path / 'docs'
+    src.mkdir()
+    (src / 'conf.py').write_text("extensions = ['adi_doctools']\n"
+                                 "project = 'test'\n")
+    (src / 'index.rst').write_text(
+        "Index\n=====\n\n.. toctree::\n\n" +
+        ''.join(f"   {d}\n" for d in docs + ['plain']))
+    for doc in docs:
+        (src / f"{doc}.rst").write_text(
+            f"{doc}\n==\n\n.. hdl-component-diagram::\n"
+            "   :path: library/core\n")
+    (src / 'plain.rst').write_text("plain\n=====\n\nNo component.\n")
+    # The components are relative to the working directory
+    monkeypatch.chdir(src)
+
+    # Appended by the process parsing, main or worker
+    parsed = tmp_path / 'parsed'
+    parse = hdl.parse_hdl_component
+
+    def parse_hdl_component(f, ctime):
+        with open(parsed, 'a') as f_:
+            f_.write(f"{f}\n")
+        return parse(f, ctime)
+
+    monkeypatch.setattr(hdl, 'parse_hdl_component', parse_hdl_component)
+
+    read = []
+
+    def build():
+        app = Sphinx(str(src), str(src), str(tmp_path / 'html'),
+                     str(tmp_path / 'doctrees'), 'html',
+                     status=None, warning=None, parallel=2)
+        app.connect('env-before-read-docs',
+                    lambda app, env, docnames: read.append(sorted(docnames)))
+        app.build()
+        return app
+
+    # Parsed once, before the workers fork
+    app = build()
+    assert parsed.read_text().splitlines() == ['../library/core/component.xml']
+    assert 'clk' in (tmp_path / 'html' / 'd0.html').read_text()
+
+    # The dependencies recorded by the workers are merged
+    for doc in docs:
+        assert app.env.hdl_deps[doc] == {'../library/core/component.xml'}
+    assert 'plain' not in app.env.hdl_deps
+
+    # Same content, nothing to read
+    xml.write_text(component.format(**ns, port='clk'))
+    build()
+    assert read[-1] == []
+
+    # Edited, its docs are read again, and it is parsed once more
+    xml.write_text(component.format(**ns, port='rst'))
+    build()
+    assert read[-1] == docs
+    assert len(parsed.read_text().splitlines()) == 2
+    assert 'rst' in (tmp_path / 'html' / 'd0.html').read_text()
+
+    # Removed, its dependencies are purged
+    (src / 'index.rst').write_text(
+        "Index\n=====\n\n.. toctree::\n\n" +
+        ''.join(f"   {d}\n" for d in docs[1:]))
+    (src / 'd0.rst').unlink()
+    app = build()
+    assert 'd0' not in app.env.hdl_deps
+    assert sorted(app.env.hdl_deps) == docs[1:]
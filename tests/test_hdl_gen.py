@@ -0,0 +1,243 @@
+import subprocess
+from importlib import import_module
+from os import path, utime, stat, makedirs, remove
+from concurrent.futures import ProcessPoolExecutor
+
+import adi_doctools.parser.hdl as parser_hdl
+from adi_doctools.parser.hdl import load_hdl_regmap
+from adi_doctools.parser.cache import capture_warnings, input_state, cache_ext
+from adi_doctools.cli.hdl_gen import logger, parse_pool
+from adi_doctools.cli.hdl_gen import list_files, match_sources, sources
+from adi_doctools.writer.hdl import write_if_changed, svpkg_time
+
+# The module, shadowed by the command
+hdl_gen = import_module('adi_doctools.cli.hdl_gen')
+
+regnames = ['child_ops', 'child', 'parent_ops', 'parent']
+
+
+def regmap_args(tmp_path):
+    """
+    Copies of the regmaps, with a malformed access type, to get warnings.
+    """
+    args = []
+    for r in regnames:
+        file = path.join('asset', 'hdl', 'docs', 'regmap',
+                         f"adi_regmap_{r}.txt")
+        with open(file, 'r') as f:
+            data = f.read().replace("\nRW\n", "\nRX\n", 1)
+        file = tmp_path / f"adi_regmap_{r}.txt"
+        file.write_text(data)
+        args.append((0, str(file), None))
+    return args
+
+
+def test_hdl_gen_pool(tmp_path):
+    args = regmap_args(tmp_path)
+
+    with capture_warnings(logger) as msg:
+        obj = parse_pool(None, load_hdl_regmap, args)
+    with ProcessPoolExecutor(max_workers=3) as pool:
+        with capture_warnings(logger) as msg_:
+            obj_ = parse_pool(pool, load_hdl_regmap, args)
+
+    assert obj == obj_
+    assert len(msg) > 1
+    assert msg == msg_
+
+    # In the order of the args
+    msg_ = []
+    for a in args:
+        with capture_warnings(logger) as m:
+            parse_pool(None, load_hdl_regmap, [a])
+        msg_.extend(m)
+    assert msg == msg_
+
+
+calls = []
+
+
+def parse_count(ctime, file, cache_dir):
+    calls.append(file)
+    return load_hdl_regmap(ctime, file, cache_dir)
+
+
+def parse_name(ctime, file, cache_dir):
+    return path.basename(file)
+
+
+def test_hdl_gen_state(tmp_path):
+    args = regmap_args(tmp_path)
+    statedir = str(tmp_path / 'state')
+
+    def run(version=1):
+        calls.clear()
+        state = input_state(statedir, version)
+        with capture_warnings(logger) as msg:
+            obj = parse_pool(None, parse_count, args, state,
+                             lambda a, obj: [a[1]])
+        state.dump()
+        return obj, msg
+
+    obj, msg = run()
+    assert len(calls) == len(args)
+
+    # Skipped, with the warnings reissued, even if touched
+    st = stat(args[0][1])
+    utime(args[0][1], ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert run() == (obj, msg)
+    assert calls == []
+
+    # Edited input
+    file = args[1][1]
+    with open(file, 'a') as f:
+        f.write("\n")
+    assert run()[0] == obj
+    assert calls == [file]
+
+    # Another version of the results format
+    run(2)
+    assert len(calls) == len(args)
+
+    # Entries not used are dropped
+    args_ = list(args)
+    del args[2:]
+    run(2)
+    args[:] = args_
+    run(2)
+    assert calls == [a[1] for a in args[2:]]
+
+    # Another parser given the same args, entries of its own
+    state = input_state(statedir, 2)
+    obj_ = parse_pool(None, parse_name, args, state, lambda a, obj: [a[1]])
+    assert obj_ == [path.basename(a[1]) for a in args]
+    calls.clear()
+    with capture_warnings(logger):
+        obj_ = parse_pool(None, parse_count, args, state,
+                          lambda a, obj: [a[1]])
+    assert obj_ == obj
+    assert calls == []
+
+
+def test_hdl_gen_regmap_cache(tmp_path, monkeypatch):
+    regdir = tmp_path / 'docs' / 'regmap'
+    regdir.mkdir(parents=True)
+    for r in regnames:
+        file = path.join('asset', 'hdl', 'docs', 'regmap',
+                         f"adi_regmap_{r}.txt")
+        with open(file, 'r') as f:
+            (regdir / f"adi_regmap_{r}.txt").write_text(f.read())
+    monkeypatch.setattr(hdl_gen, 'cache_dir', str(tmp_path / 'cache'))
+    monkeypatch.chdir(tmp_path)
+
+    hashed = []
+
+    def get_hash(file, salt=''):
+        hashed.append(file)
+        return get_hash_(file, salt)
+
+    get_hash_ = hdl_gen.get_hash
+    monkeypatch.setattr(hdl_gen, 'get_hash', get_hash)
+    monkeypatch.setattr(parser_hdl, 'get_hash', get_hash)
+
+    rm = hdl_gen.regmap_pre()
+    # Hashed once each, to load and to prune
+    assert sorted(hashed) == sorted(
+        path.join('docs', 'regmap', f"adi_regmap_{r}.txt") for r in regnames)
+    cache = tmp_path / 'cache' / 'regmap'
+    entries = sorted(f.name for f in cache.iterdir()
+                     if f.name.endswith(cache_ext))
+    assert len(entries) == len(regnames)
+
+    # Edited, the former entry is pruned
+    with open(regdir / 'adi_regmap_child.txt', 'a') as f:
+        f.write("\n")
+    assert hdl_gen.regmap_pre().keys() == rm.keys()
+    entries_ = sorted(f.name for f in cache.iterdir()
+                      if f.name.endswith(cache_ext))
+    assert len(entries_) == len(regnames)
+    assert len(set(entries) - set(entries_)) == 1
+
+
+def test_hdl_gen_write(tmp_path):
+    file = str(tmp_path / 'pkg.sv')
+    head = "/* Auto generated Register Map */\n"
+
+    def data(time, version, body="package p;\n"):
+        return f"{head}/* {time} v{version} */\n\n{body}"
+
+    assert write_if_changed(file, data("Sep 06 11:19:22 2024", "0.3.40"),
+                            svpkg_time)
+    # Only the run time changed
+    assert not write_if_changed(file, data("Oct 18 09:00:00 2026", "0.3.40"),
+                                svpkg_time)
+    with open(file) as f:
+        assert "Sep 06" in f.read()
+    # New tool version
+    assert write_if_changed(file, data("Oct 18 09:00:00 2026", "0.3.54"),
+                            svpkg_time)
+    with open(file) as f:
+        assert "v0.3.54" in f.read()
+    assert write_if_changed(file, data("Oct 18 09:00:00 2026", "0.3.54",
+                                       "package q;\n"), svpkg_time)
+    assert not write_if_changed(file, data("Oct 18 09:00:00 2026", "0.3.54",
+                                           "package q;\n"))
+
+
+def test_hdl_gen_sources(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    files = [
+        'library/axi_dmac/axi_dmac_ip.tcl',
+        'library/axi_dmac/axi_dmac_hw.tcl',
+        'library/axi_dmac/axi_dmac.v',
+        'projects/fmcomms2/zed/system_bd.tcl',
+        'projects/fmcomms2/a10soc/system_qsys.tcl',
+        'scripts/adi_env.tcl',
+        # Vendor build outputs
+        'library/axi_dmac/.Xil/axi_dmac_ip.tcl',
+        'library/axi_dmac/axi_dmac.srcs/axi_dmac_ip.tcl',
+        'projects/fmcomms2/zed/fmcomms2.gen/system_bd.tcl',
+        'projects/fmcomms2/a10soc/db/system_qsys.tcl',
+    ]
+    for f in files:
+        makedirs(path.dirname(f), exist_ok=True)
+        with open(f, 'w') as f_:
+            f_.write('')
+
+    expected = {
+        'library': {
+            'xilinx': [path.join('library', 'axi_dmac', 'axi_dmac_ip.tcl')],
+            'intel': [path.join('library', 'axi_dmac', 'axi_dmac_hw.tcl')]
+        },
+        'projects': {
+            'xilinx': [path.join('projects', 'fmcomms2', 'zed',
+                                 'system_bd.tcl')],
+            'intel': [path.join('projects', 'fmcomms2', 'a10soc',
+                                'system_qsys.tcl')]
+        }
+    }
+
+    # Not a git repository, walked
+    assert match_sources(list_files(list(sources))) == expected
+
+    def git(*args):
+        subprocess.run(['git', *args], check=True, capture_output=True)
+
+    git('init', '-q')
+    # Untracked but not ignored, and deleted from the work tree
+    git('add', *files[:4])
+    with open('.gitignore', 'w') as f:
+        f.write("*.gen\n")
+    old = path.join('library', 'axi_dmac', 'old_ip.tcl')
+    with open(old, 'w') as f:
+        f.write('')
+    git('add', old)
+    remove(old)
+
+    listed = list_files(list(sources))
+    # From the git index
+    assert old in listed
+    assert path.join('projects', 'fmcomms2', 'a10soc',
+                     'system_qsys.tcl') in listed
+    assert not any('.gen' in f for f in listed)
+    assert match_sources(listed) == expected
@@ -17,3 +17,54 @@ def test_hdl_library(tmp_path):
 
     assert len(obj["lib_deps"]) == 3
     assert len(obj["m_deps"]) == 8
+
+
+def test_hdl_project_sourced(tmp_path):
+    from shutil import copytree
+    from adi_doctools.parser.tcl import tcl
+
+    copytree(path.join("asset", "hdl"), tmp_path, dirs_exist_ok=True)
+    cwd = path.abspath(".")
+    chdir(tmp_path)
+    file = path.join("projects", "project", "carrier", "system_bd.tcl")
+    try:
+        tcls, files = tcl.get_sourced_files(file)
+        tcls_, files_ = tcl.get_sourced_files(file)
+        # Reused, every file parsed once
+        assert files == files_
+        assert all(a is b for a, b in zip(tcls, tcls_))
+
+        # A sourced file changed, the closure is resolved again
+        common = path.join("projects", "project", "common", "project_bd.tcl")
+        with open(common, "a") as f:
+            f.write("\nsource ../../../library/core/scripts/core_bd.tcl\n")
+        tcls_, files_ = tcl.get_sourced_files(file)
+        assert tcls[0] is tcls_[0]
+        assert tcls[1] is not tcls_[1]
+    finally:
+        chdir(cwd)
+
+
+def test_hdl_project_resolve(caplog):
+    from adi_doctools.parser.hdl import index_hdl_library
+    from adi_doctools.parser.hdl import resolve_hdl_project
+
+    library = {}
+    for key, name in [("axi_dmac", "axi_dmac"),
+                      ("util_pack/util_cpack2", "util_cpack2"),
+                      ("jesd204/axi_jesd204_rx", "axi_jesd204_rx"),
+                      ("jesd204/jesd204_rx", "jesd204_rx"),
+                      ("intel/util_cpack2", "util_cpack2_intel")]:
+        vendor = "intel" if key.startswith("intel") else "xilinx"
+        library[key] = {"name": name, "vendor": {vendor: {}}, "generic": {}}
+    index = index_hdl_library(library)
+
+    project = {
+        "vendor": "xilinx",
+        "lib_deps": ("axi_dmac", "util_cpack2", "sys_ps7", "jesd204")
+    }
+    resolve_hdl_project(project, library, index)
+    assert project["lib_deps"] == ("axi_dmac", "jesd204/axi_jesd204_rx",
+                                   "util_pack/util_cpack2")
+    # By path, ambiguous
+    assert "'jesd204' matches the xilinx libraries" in caplog.text
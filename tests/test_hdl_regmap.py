@@ -1,9 +1,13 @@
-from os import path
+from os import path, listdir
 
 from logging import WARNING
 from adi_doctools.parser.hdl import parse_hdl_regmap
+from adi_doctools.parser.hdl import load_hdl_regmap
 from adi_doctools.parser.hdl import resolve_hdl_regmap
 from adi_doctools.parser.hdl import expand_hdl_regmap
+from adi_doctools.parser.hdl import dependents_hdl_regmap
+from adi_doctools.parser.hdl import regmap_cache_key
+from adi_doctools.parser.cache import cache_ext, cache_prune, get_hash
 from adi_doctools.writer.hdl import write_hdl_regmap
 
 
@@ -20,11 +24,16 @@ def test_hdl_regmap(tmp_path, caplog):
 
         regmap[r] = parse_hdl_regmap(0, file)
 
-    resolve_hdl_regmap(regmap)
+    index = resolve_hdl_regmap(regmap)
     expand_hdl_regmap(regmap)
 
     assert not caplog.records
 
+    f, obj = index['subregmap']['CHILD_OPS']
+    assert f == 'child_ops'
+    assert obj is regmap['child_ops']['subregmap']['CHILD_OPS']
+    assert index['reg'][('PARENT', 'MOCK_0')]['address'] == 0x10
+
     d = tmp_path / "sv"
     d.mkdir()
     for r in regmap:
@@ -44,3 +53,69 @@ def test_hdl_regmap(tmp_path, caplog):
         e2.pop(index_date)
 
         assert e1 == e2
+
+
+def test_hdl_regmap_cache(tmp_path, caplog):
+    caplog.set_level(WARNING, logger="adi_doctools.parser.hdl")
+
+    # Malformed access type to get a warning from the parser
+    file = path.join('asset', 'hdl', 'docs', 'regmap', "adi_regmap_parent.txt")
+    with open(file, 'r') as f:
+        data = f.read().replace("\nRW\n", "\nRX\n", 1)
+    file = tmp_path / "adi_regmap_parent.txt"
+    file.write_text(data)
+    cachedir = tmp_path / "cache"
+
+    obj = parse_hdl_regmap(0, file)
+    msg = [r.getMessage() for r in caplog.records]
+    assert len(msg) == 1
+
+    def entries():
+        return [f for f in listdir(cachedir) if f.endswith(cache_ext)]
+
+    caplog.clear()
+    obj_miss = load_hdl_regmap(1, file, cachedir)
+    assert [r.getMessage() for r in caplog.records] == msg
+    assert len(entries()) == 1
+    assert (cachedir / '.gitignore').read_text() == "*\n"
+
+    caplog.clear()
+    obj_hit = load_hdl_regmap(2, file, cachedir)
+    assert [r.getMessage() for r in caplog.records] == msg
+    assert obj_hit['ctime'] == 2
+
+    obj_miss['ctime'] = obj_hit['ctime'] = obj['ctime']
+    assert obj == obj_miss == obj_hit
+
+    # Edited file is a new entry
+    file.write_text(data.replace("Something.", "Something else.", 1))
+    obj_edit = load_hdl_regmap(0, file, cachedir)
+    assert len(entries()) == 2
+    assert obj_edit != obj
+
+    # The entry of the former content is dropped
+    key = regmap_cache_key(get_hash(file))
+    cache_prune(cachedir, [key])
+    assert entries() == [f"{key}{cache_ext}"]
+
+
+def test_hdl_regmap_dependents(caplog):
+    caplog.set_level(WARNING, logger="adi_doctools.parser.hdl")
+
+    regmap = {}
+    regnames = ['child_ops', 'child', 'parent_ops', 'parent']
+    for r in regnames:
+        file = path.join('asset', 'hdl', 'docs', 'regmap',
+                         f"adi_regmap_{r}.txt")
+        regmap[r] = parse_hdl_regmap(0, file)
+
+    assert dependents_hdl_regmap(regmap, {'PARENT'}) == {'child', 'child_ops'}
+    assert dependents_hdl_regmap(regmap, {'PARENT_OPS'}) == {'child_ops'}
+    assert dependents_hdl_regmap(regmap, {'CHILD'}) == set()
+
+    # Resolve only the children, the parents have no imports
+    resolve_hdl_regmap(regmap, keys={'child_ops', 'child'})
+    assert not caplog.records
+    reg = regmap['child_ops']['subregmap']['CHILD_OPS']['regmap'][0]
+    assert not reg['import']
+    assert reg['fields'][0]['name'] == 'FOURTH'
@@ -0,0 +1,149 @@
+from docutils import nodes
+from sphinx import addnodes
+from sphinx.application import Sphinx
+
+regmap = """\
+TITLE
+Mock (mock)
+MOCK
+ENDTITLE
+
+REG
+0x0010
+MOCK_0
+Mock register 0
+ENDREG
+
+FIELD
+[0] 0x00000000
+FIRST
+RW
+See :ref:`target`.
+ENDFIELD
+"""
+
+
+def test_hdl_regmap_doc(tmp_path, monkeypatch):
+    src = tmp_path / 'src'
+    (src / 'regmap').mkdir(parents=True)
+    (src / 'regmap' / 'adi_regmap_mock.txt').write_text(regmap)
+    (src / 'conf.py').write_text("extensions = ['adi_doctools']\n"
+                                 "project = 'test'\n")
+    (src / 'index.rst').write_text(
+        ".. _target:\n\nIndex\n=====\n\n.. toctree::\n\n   a\n   b\n   c\n")
+    for doc in ['a', 'b']:
+        (src / f"{doc}.rst").write_text(
+            f"{doc}\n=\n\n.. hdl-regmap::\n   :name: MOCK\n")
+    (src / "c.rst").write_text(
+        "c\n=\n\n.. hdl-regmap::\n   :name: MOCK\n   :client-side:\n")
+    # The regmaps are relative to the working directory
+    monkeypatch.chdir(src)
+
+    app = Sphinx(str(src), str(src), str(tmp_path / 'html'),
+                 str(tmp_path / 'doctrees'), 'html',
+                 status=None, warning=None)
+    app.build()
+
+    # The tables of b are a copy of the ones of a, stamped with b
+    for doc in ['a', 'b']:
+        doctree = app.env.get_doctree(doc)
+        xref = list(doctree.findall(addnodes.pending_xref))
+        assert len(xref) == 1
+        assert xref[0]['refdoc'] == doc
+        assert xref[0].source == str(src / f"{doc}.rst")
+        assert xref[0].line == 4
+
+    # Only the rows are kept, made a table on third-party themes
+    doctree = app.env.get_doctree('c')
+    assert not [t for t in doctree.findall(nodes.table)
+                if 'regmap' in t['classes']]
+    assert len(list(doctree.findall(addnodes.pending_xref))) == 1
+    html = (tmp_path / 'html' / 'c.html').read_text()
+    assert 'class="regmap' in html
+    assert 'href="index.html#target"' in html
+
+
+def test_hdl_regmap_outdated(tmp_path, monkeypatch):
+    src = tmp_path / 'src'
+    (src / 'regmap').mkdir(parents=True)
+    file = src / 'regmap' / 'adi_regmap_mock.txt'
+    file.write_text(regmap)
+    (src / 'conf.py').write_text("extensions = ['adi_doctools']\n"
+                                 "project = 'test'\n")
+    (src / 'index.rst').write_text(
+        ".. _target:\n\nIndex\n=====\n\n.. toctree::\n\n   a\n   b\n"
+        "   d\n")
+    for doc in ['a', 'b']:
+        (src / f"{doc}.rst").write_text(
+            f"{doc}\n=\n\n.. hdl-regmap::\n   :name: MOCK\n")
+    (src / 'd.rst').write_text("d\n=\n\nNo regmap.\n")
+    monkeypatch.chdir(src)
+
+    def build():
+        read = []
+        app = Sphinx(str(src), str(src), str(tmp_path / 'html'),
+                     str(tmp_path / 'doctrees'), 'html',
+                     status=None, warning=None)
+        app.connect('env-before-read-docs',
+                    lambda app, env, docnames: read.extend(docnames))
+        app.build()
+        return app, sorted(read)
+
+    build()
+
+    # Only the docs using the edited regmap are read again
+    file.write_text(regmap.replace("Mock register 0", "Mock register A"))
+    app, read = build()
+    assert read == ['a', 'b']
+    assert 'Mock register A' in (tmp_path / 'html' / 'b.html').read_text()
+
+    # A removed doc is not read again
+    (src / 'b.rst').unlink()
+    (src / 'index.rst').write_text(
+        ".. _target:\n\nIndex\n=====\n\n.. toctree::\n\n   a\n   d\n")
+    file.write_text(regmap.replace("Mock register 0", "Mock register B"))
+    app, read = build()
+    assert read == ['a', 'index']
+    assert 'b' not in app.env.hdl_deps
+    assert 'Mock register B' in (tmp_path / 'html' / 'a.html').read_text()
+
+
+def test_hdl_regmap_data(tmp_path, monkeypatch):
+    src = tmp_path / 'src'
+    (src / 'regmap').mkdir(parents=True)
+    file = src / 'regmap' / 'adi_regmap_mock.txt'
+    file.write_text(regmap)
+    (src / 'conf.py').write_text("extensions = ['adi_doctools']\n"
+                                 "project = 'test'\n"
+                                 "html_theme = 'cosmic'\n")
+    (src / 'index.rst').write_text(
+        ".. _target:\n\nIndex\n=====\n\n.. toctree::\n\n   c\n")
+    (src / "c.rst").write_text(
+        "c\n=\n\n.. hdl-regmap::\n   :name: MOCK\n   :client-side:\n")
+    monkeypatch.chdir(src)
+    data = tmp_path / 'html' / '_static' / 'regmap'
+
+    def build():
+        Sphinx(str(src), str(src), str(tmp_path / 'html'),
+               str(tmp_path / 'doctrees'), 'html',
+               status=None, warning=None).build()
+        return sorted(f.name for f in data.iterdir())
+
+    first = build()
+    assert len(first) == 1
+    assert first[0] in (tmp_path / 'html' / 'c.html').read_text()
+    # Kept, still referenced by the page not written
+    (data / 'other.txt').write_text('')
+    assert build() == first + ['other.txt']
+
+    # The previous content is removed
+    file.write_text(regmap.replace("Mock register 0", "Mock register A"))
+    second = build()
+    assert len(second) == 2
+    assert first[0] not in second
+    assert 'other.txt' in second
+
+    # No longer client-side
+    (src / "c.rst").write_text(
+        "c\n=\n\n.. hdl-regmap::\n   :name: MOCK\n")
+    assert build() == ['other.txt']
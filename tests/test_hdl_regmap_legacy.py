@@ -0,0 +1,48 @@
+import json
+from os import path
+from glob import glob
+
+from logging import WARNING
+from adi_doctools.parser.hdl import parse_hdl_regmap
+
+# Output of the former list slicing parser, the reference for the
+# single-pass parse_hdl_regmap
+expected_dir = path.join('asset', 'regmap_legacy')
+
+
+def expected(name):
+    with open(path.join(expected_dir, f"{name}.json"), 'r') as f:
+        return json.load(f)
+
+
+def parse(caplog, file):
+    caplog.clear()
+    obj = parse_hdl_regmap(0, file)
+    # As stored, tuples become lists
+    return {
+        'regmap': json.loads(json.dumps(obj)),
+        # Not getMessage, prefixed once a Sphinx app set up the logging
+        'warnings': [str(r.msg) for r in caplog.records]
+    }
+
+
+def test_hdl_regmap_legacy(caplog, tmp_path):
+    caplog.set_level(WARNING, logger="adi_doctools.parser.hdl")
+
+    files = sorted(glob(path.join('asset', 'hdl', 'docs', 'regmap',
+                                  "adi_regmap_*.txt")))
+    assert len(files) > 0
+
+    for file in files:
+        name = path.basename(file)[:-4]
+        assert parse(caplog, file) == expected(name), file
+
+    # Malformed access type
+    with open(path.join('asset', 'hdl', 'docs', 'regmap',
+                        "adi_regmap_parent.txt"), 'r') as f:
+        data = f.read().replace("\nRW\n", "\nRX\n", 1)
+    file = tmp_path / "adi_regmap_parent.txt"
+    file.write_text(data)
+    obj = parse(caplog, file)
+    assert len(obj['warnings']) == 1
+    assert obj == expected("adi_regmap_parent_rx")
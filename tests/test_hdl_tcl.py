@@ -0,0 +1,35 @@
+from adi_doctools.parser.tcl import tokenize, tcl
+
+
+def test_hdl_tcl():
+    data = """\
+# comment \\
+  continued
+if [info exists ad_project_dir] {
+  source ../../scripts/adi_pd.tcl
+} else {
+  source $ad_hdl_dir/projects/scripts/adi_pd.tcl
+}
+adi_ip_files axi_dmac [ list \\
+  "$ad_hdl_dir/library/common/ad_mem.v" \\
+\t"axi_dmac.v" \\
+  {axi_dmac_constr.ttcl} ]
+foreach {a b} {1 2} { ad_ip_instance util_cpack2 "cpack_$a"; ad_connect a b }
+set x "a [b {c]} d] e"
+"""
+    cmds = tokenize(data)
+    names = [c.name for c in cmds]
+    assert names == ['if', 'source', 'source', 'adi_ip_files', 'foreach',
+                     'ad_ip_instance', 'ad_connect', 'set']
+
+    if_, src0, src1 = cmds[0:3]
+    assert src0.parent is if_ and src0.body == 1 and src0.line == 4
+    assert src1.parent is if_ and src1.body == 3 and src1.line == 6
+
+    files = tcl.list_items(cmds[3].args[1])
+    assert files == ['$ad_hdl_dir/library/common/ad_mem.v', 'axi_dmac.v',
+                     'axi_dmac_constr.ttcl']
+
+    assert cmds[5].args == ('util_cpack2', 'cpack_$a')
+    assert cmds[5].parent is cmds[4]
+    assert cmds[7].args == ('x', 'a [b {c]} d] e')
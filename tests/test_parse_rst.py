@@ -0,0 +1,110 @@
+import re
+
+from docutils import nodes
+from docutils.statemachine import ViewList
+from sphinx import addnodes
+from sphinx.application import Sphinx
+from sphinx.util.docutils import SphinxDirective
+
+from adi_doctools.directive.common import parse_rst, is_plain_text
+
+# Emitted as is
+plain = [
+    "Reserved",
+    "Enable the DMA transfer.",
+    "Number of lanes, 1 to 8.",
+    "Address of the register_map",
+    "Note: reads as zero.",
+    "When 1, the core is held in reset (default)",
+    "Is it (x + y) - 2 > 0?",
+]
+# Parsed
+markup = [
+    "See :ref:`target`.",
+    "Set to *one*.",
+    "Set to ``1``.",
+    "Write |version| here.",
+    "The following::",
+    "See the reference_ below.",
+    "See anonymous__",
+    "A footnote [1]_.",
+    "Visit https://analog.com",
+    "a. first item",
+    "1) first item",
+    "(a) first item",
+    "Trailing space ",
+    "Escaped \\*star",
+    "Mail to info@analog.com",
+    "- bullet",
+    "",
+]
+
+
+class directive_parity(SphinxDirective):
+    """
+    Both the parse_rst and the nested_parse trees of each input, twice for
+    the memo.
+    """
+    has_content = False
+
+    def run(self):
+        ret = []
+        for i, text in enumerate(plain + markup):
+            for _ in range(2):
+                fast = parse_rst(self.state, [text], f"parity_{i}")
+                slow = nodes.section()
+                slow.document = self.state.document
+                self.state.nested_parse(
+                    ViewList(source=f"parity_{i}", initlist=[text]), 0, slow)
+                ret.append(nodes.container('', fast, slow, classes=[text]))
+        return ret
+
+
+def tree(node):
+    # The ids of the unresolved references are numbered by the document
+    return [(re.sub('id\\d+', 'id', n.pformat()), n.source, n.line)
+            for n in node.findall(nodes.Element)]
+
+
+def test_parse_rst(tmp_path):
+    for text in plain:
+        assert is_plain_text(text), text
+    for text in markup:
+        assert not is_plain_text(text), text
+
+    src = tmp_path / 'src'
+    src.mkdir()
+    (src / 'conf.py').write_text("extensions = ['adi_doctools']\n"
+                                 "project = 'test'\n")
+    (src / 'index.rst').write_text(
+        ".. _target:\n\nIndex\n=====\n\n.. toctree::\n\n   a\n   b\n")
+    for doc in ['a', 'b']:
+        (src / f"{doc}.rst").write_text(f"{doc}\n=\n\n.. parity::\n")
+
+    app = Sphinx(str(src), str(src), str(tmp_path / 'html'),
+                 str(tmp_path / 'doctrees'), 'html',
+                 status=None, warning=None)
+    app.add_directive('parity', directive_parity)
+    # Resolved in place when written
+    documents = {}
+    app.connect('doctree-read',
+                lambda app, doctree: documents.update({
+                    app.env.docname: (doctree, [
+                        x['refdoc'] for x in
+                        doctree.findall(addnodes.pending_xref)])}))
+    app.build()
+
+    for doc in ['a', 'b']:
+        doctree, refdoc = documents[doc]
+        parity = list(doctree.findall(nodes.container))
+        assert len(parity) == 2 * len(plain + markup)
+        for c in parity:
+            fast, slow = c.children
+            assert tree(fast) == tree(slow), c['classes']
+            for n in fast.findall(nodes.Element):
+                assert n.document is doctree
+        # Copied from a, stamped with b
+        assert refdoc == [doc] * 4
+
+    # Not pickled with the env
+    assert not hasattr(app.env, 'parse_rst_memo')
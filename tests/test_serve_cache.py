@@ -0,0 +1,115 @@
+import gzip
+import threading
+import http.client
+import http.server
+from os import utime
+
+from adi_doctools.cli.server import notifier, handler, file_cache
+
+
+def test_serve_cache_lru(tmp_path):
+    for name in ['a', 'b', 'c']:
+        (tmp_path / name).write_bytes(name.encode() * 40)
+    file = {name: str(tmp_path / name) for name in ['a', 'b', 'c']}
+
+    cache = file_cache(max_size=100, max_item=50)
+    cache.get(file['a'])
+    cache.get(file['b'])
+    # Used, moved to the end
+    cache.get(file['a'])
+    cache.get(file['c'])
+    assert list(cache.entry) == [file['a'], file['c']]
+    assert cache.size == 80
+
+    # Only stat'ed
+    (tmp_path / 'big').write_bytes(b'x' * 60)
+    assert cache.get(str(tmp_path / 'big'))[''][3] is None
+    assert cache.get(str(tmp_path / 'none')) is None
+
+    # Trusted until cleared
+    (tmp_path / 'a').write_bytes(b'A' * 40)
+    assert cache.get(file['a'])[''][3] == b'a' * 40
+    cache.clear()
+    assert cache.size == 0
+    assert cache.get(file['a'])[''][3] == b'A' * 40
+
+
+def test_serve_cache_clear(tmp_path):
+    (tmp_path / 'a').write_text('a')
+
+    class cache_(file_cache):
+        def load(self, file):
+            variants = super().load(file)
+            # A build finished while loading
+            self.clear()
+            return variants
+
+    cache = cache_()
+    assert cache.get(str(tmp_path / 'a'))[''][3] == b'a'
+    assert len(cache.entry) == 0
+    assert cache.size == 0
+
+
+def test_serve_cache_request(tmp_path):
+    body = b'<p>page</p>' * 20
+    (tmp_path / 'page.html').write_bytes(body)
+    (tmp_path / 'page.html.gz').write_bytes(gzip.compress(body))
+    (tmp_path / 'plain.css').write_bytes(b'p {}')
+    utime(tmp_path / 'plain.css', (1700000000, 1700000000))
+    cache = file_cache()
+
+    class Handler(handler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=str(tmp_path),
+                             notifier=notifier(), cache=cache, **kwargs)
+
+    http_ = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    http_.daemon_threads = True
+    threading.Thread(target=http_.serve_forever, daemon=True).start()
+    conn = http.client.HTTPConnection('127.0.0.1', http_.server_address[1],
+                                      timeout=10)
+
+    def get(url, **headers):
+        conn.request('GET', url, headers=headers)
+        resp = conn.getresponse()
+        return resp, resp.read()
+
+    # Identity, then the validators answered with a 304
+    resp, data = get('/page.html')
+    assert resp.status == 200
+    assert data == body
+    assert resp.getheader('Content-Encoding') is None
+    assert resp.getheader('Vary') == 'Accept-Encoding'
+    etag = resp.getheader('ETag')
+    resp, data = get('/page.html', **{'If-None-Match': etag})
+    assert resp.status == 304
+    assert data == b''
+    assert resp.getheader('ETag') == etag
+    resp, _ = get('/page.html', **{'If-None-Match': '"other"'})
+    assert resp.status == 200
+
+    # The gzip variant, with its own tag
+    resp, data = get('/page.html', **{'Accept-Encoding': 'br, gzip'})
+    assert resp.status == 200
+    assert resp.getheader('Content-Encoding') == 'gzip'
+    assert gzip.decompress(data) == body
+    assert resp.getheader('ETag') != etag
+    resp, _ = get('/page.html', **{'Accept-Encoding': 'gzip',
+                                   'If-None-Match': etag})
+    assert resp.status == 200
+
+    # No variant, no Vary, and by date
+    resp, _ = get('/plain.css', **{'Accept-Encoding': 'gzip'})
+    assert resp.status == 200
+    assert resp.getheader('Vary') is None
+    assert resp.getheader('Content-Encoding') is None
+    last = resp.getheader('Last-Modified')
+    resp, _ = get('/plain.css', **{'If-Modified-Since': last})
+    assert resp.status == 304
+    resp, _ = get('/plain.css', **{
+        'If-Modified-Since': 'Mon, 13 Nov 2023 00:00:00 GMT'})
+    assert resp.status == 200
+
+    conn.close()
+    http_.shutdown()
+    http_.server_close()
@@ -0,0 +1,91 @@
+import json
+import threading
+import http.client
+import http.server
+
+from adi_doctools.cli.server import notifier, handler, events_path
+
+
+def serve(tmp_path, reload, **kwargs):
+    class Handler(handler):
+        keep_alive = 0.2
+
+        def __init__(self, *args, **kwargs_):
+            super().__init__(*args, directory=str(tmp_path),
+                             notifier=reload, **kwargs, **kwargs_)
+
+    http_ = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    http_.daemon_threads = True
+    threading.Thread(target=http_.serve_forever, daemon=True).start()
+    return http_
+
+
+def event(resp):
+    """
+    The next event or comment of the stream, as lines.
+    """
+    lines = []
+    while True:
+        line = resp.readline().decode()
+        if line in ('\n', ''):
+            return lines
+        lines.append(line.rstrip('\n'))
+
+
+def test_serve_notifier():
+    n = notifier()
+    n.notify(['a.html'])
+    assert n.wait(0, 0) == (1, ['a.html'])
+    # More than one build meanwhile, every page reloads
+    n.notify(['b.html'])
+    n.notify(['c.html'])
+    assert n.wait(1, 0) == (3, None)
+    # Nothing new
+    assert n.wait(3, 0) == (3, None)
+
+
+def test_serve_events(tmp_path):
+    (tmp_path / 'index.html').write_text('index')
+    reload = notifier()
+    http_ = serve(tmp_path, reload)
+    port = http_.server_address[1]
+
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    # With a cache buster
+    conn.request('GET', f"{events_path}?t=1")
+    resp = conn.getresponse()
+    assert resp.status == 200
+    assert resp.getheader('Content-Type') == 'text/event-stream'
+    assert event(resp) == ['event: hello', f"data: {reload.id}.0"]
+
+    # Kept alive while no build
+    assert event(resp) == [': ']
+
+    reload.notify(['a.html'])
+    lines = event(resp)
+    while lines == [': ']:
+        lines = event(resp)
+    assert lines[0] == 'event: reload'
+    assert json.loads(lines[1][len('data: '):]) == {
+        'build': f"{reload.id}.1",
+        'pages': ['a.html']
+    }
+
+    # The stream ends on close
+    reload.close()
+    lines = event(resp)
+    while lines == [': ']:
+        lines = event(resp)
+    assert lines == []
+    conn.close()
+
+    # Other paths are files
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    conn.request('GET', '/index.html?t=1')
+    resp = conn.getresponse()
+    assert resp.status == 200
+    assert resp.read() == b'index'
+    conn.close()
+
+    http_.shutdown()
+    http_.server_close()
@@ -0,0 +1,92 @@
+import time
+import threading
+from os import stat
+
+from adi_doctools.cli.watch import watcher
+from adi_doctools.cli.server import snapshot
+
+
+def test_serve_watch(tmp_path):
+    docs = tmp_path / 'docs'
+    lib = tmp_path / 'lib'
+    docs.mkdir()
+    lib.mkdir()
+    (docs / 'a.rst').write_text('a')
+    (lib / 'x.v').write_text('x')
+
+    w = watcher([str(docs)], lambda f: f.endswith('.rst'), lambda f: False,
+                debounce=0.2, max_debounce=1)
+    # Folder watched for a tracked file, with a tool log rewritten nonstop
+    w.track([str(lib / 'x.v')])
+    stop = threading.Event()
+
+    def noise():
+        i = 0
+        while not stop.is_set():
+            (lib / 'vivado.log').write_text(str(i))
+            i += 1
+            time.sleep(0.01)
+
+    def edit(n, delay):
+        time.sleep(0.2)
+        for i in range(n):
+            (docs / 'a.rst').write_text(str(i))
+            time.sleep(delay)
+
+    t = threading.Thread(target=noise)
+    t.start()
+    try:
+        t0 = time.monotonic()
+        assert w.wait(0.5) == set()
+        assert time.monotonic() - t0 < 2
+
+        # Not held back by the log
+        threading.Thread(target=edit, args=(1, 0)).start()
+        t0 = time.monotonic()
+        assert w.wait(5) == {str(docs / 'a.rst')}
+        assert time.monotonic() - t0 < 2
+
+        # A burst longer than max_debounce is reported meanwhile
+        e = threading.Thread(target=edit, args=(60, 0.05))
+        e.start()
+        t0 = time.monotonic()
+        assert w.wait(10) == {str(docs / 'a.rst')}
+        assert time.monotonic() - t0 < 2.5
+        e.join()
+    finally:
+        stop.set()
+        t.join()
+        w.close()
+
+
+def test_serve_snapshot(tmp_path):
+    out = tmp_path / 'html'
+    (out / '_static').mkdir(parents=True)
+    (out / 'a.html').write_text('a')
+    (out / 'b.html').write_text('b')
+    (out / '_static' / 'x.css').write_text('x')
+
+    output = snapshot(str(out), str(tmp_path / '.serve'))
+    first = output.publish(['a.html', 'b.html'])
+
+    def ino(dir_, rel):
+        return stat(f"{dir_}/{rel}").st_ino
+
+    # Sphinx writes in place, the pages written are copied, so are the
+    # assets changed, the rest is linked
+    (out / 'a.html').write_text('a2')
+    (out / '_static' / 'x.css').write_text('x2')
+    second = output.publish(['a.html'])
+    assert (tmp_path / '.serve' / '0' / 'a.html').read_text() == 'a'
+    assert ino(second, 'a.html') != ino(first, 'a.html')
+    assert ino(second, '_static/x.css') != ino(first, '_static/x.css')
+    assert ino(second, 'b.html') == ino(first, 'b.html')
+    assert open(f"{second}/_static/x.css").read() == 'x2'
+
+    # Only the last two are kept
+    (out / 'b.html').unlink()
+    third = output.publish([])
+    assert sorted(p.name for p in (tmp_path / '.serve').iterdir()) == \
+        ['1', '2']
+    assert ino(third, 'a.html') == ino(second, 'a.html')
+    assert 'b.html' not in output.pages
@@ -0,0 +1,139 @@
+import time
+from os import path
+
+from sphinx.application import Sphinx, ENV_PICKLE_FILENAME
+
+from adi_doctools.cli.worker import worker, build_cancelled
+
+
+def test_serve_worker(tmp_path):
+    src = tmp_path / 'src'
+    src.mkdir()
+    (src / 'conf.py').write_text("project = 'test'\n")
+    (src / 'index.rst').write_text(
+        "Index\n=====\n\n.. toctree::\n\n   a\n   b\n   c\n")
+    for doc in ['a', 'b', 'c']:
+        (src / f"{doc}.rst").write_text(f"{doc}\n=\n\nfirst |external|\n")
+    out = tmp_path / 'html'
+    doctrees = tmp_path / 'doctrees'
+    envfile = path.join(doctrees, ENV_PICKLE_FILENAME)
+
+    # Doc c depends on an input outside the sources, reported once as
+    # changed, like outdated_hdl_artifacts does
+    external = {'value': 'one', 'outdated': []}
+
+    def outdated(app, env, added, changed, removed):
+        docs = external['outdated']
+        external['outdated'] = []
+        return docs
+
+    def substitute(app, docname, source):
+        source[0] = source[0].replace('|external|', external['value'])
+
+    app = Sphinx(str(src), str(src), str(out), str(doctrees), 'html',
+                 status=None, warning=None)
+    app.connect('env-get-outdated', outdated)
+    app.connect('source-read', substitute)
+    app.build()
+
+    written = []
+    app.connect('html-page-context',
+                lambda app, pagename, *args: written[-1].add(pagename))
+    cancelled = []
+
+    def build(changed):
+        written.append(set())
+        try:
+            app.build()
+        except build_cancelled:
+            cancelled.append(path.isfile(envfile))
+            raise
+
+    w = worker(build)
+    w.connect(app)
+
+    # Request another build while the first doc is read, cancelling it
+    def edit(app, docname, source):
+        if not cancelled:
+            w.request(set())
+    app.connect('source-read', edit, priority=400)
+
+    (src / 'a.rst').write_text("a\n=\n\nsecond |external|\n")
+    external['value'] = 'two'
+    external['outdated'] = ['c']
+    w.request({str(src / 'a.rst')})
+
+    deadline = time.monotonic() + 60
+    while not w.idle() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    w.close()
+
+    # Cancelled once, keeping the environment, then built again
+    assert cancelled == [True]
+    assert len(written) == 2
+    assert written[0] == set()
+    # The retry reads and writes c again, not outdated by mtime
+    assert {'a', 'c'} <= written[1]
+    assert 'second' in (out / 'a.html').read_text()
+    assert 'two' in (out / 'c.html').read_text()
+    assert 'one' in (out / 'b.html').read_text()
+    assert path.isfile(envfile)
+    assert not path.isfile(f"{envfile}.cancel")
+
+
+def test_serve_worker_parallel(tmp_path):
+    src = tmp_path / 'src'
+    src.mkdir()
+    (src / 'conf.py').write_text("project = 'test'\n")
+    docs = [f"d{i}" for i in range(8)]
+    (src / 'index.rst').write_text(
+        "Index\n=====\n\n.. toctree::\n\n" +
+        ''.join(f"   {d}\n" for d in docs))
+    for doc in docs:
+        (src / f"{doc}.rst").write_text(f"{doc}\n==\n\nfirst\n")
+    out = tmp_path / 'html'
+
+    app = Sphinx(str(src), str(src), str(out), str(tmp_path / 'doctrees'),
+                 'html', status=None, warning=None, parallel=2)
+    app.build()
+
+    read = []
+    app.connect('env-before-read-docs',
+                lambda app, env, docnames: read.append(sorted(docnames)))
+    cancelled = []
+
+    def build(changed):
+        try:
+            app.build()
+        except build_cancelled:
+            cancelled.append(True)
+            # Removed before the retry
+            (src / 'd7.rst').unlink()
+            (src / 'index.rst').write_text(
+                "Index\n=====\n\n.. toctree::\n\n" +
+                ''.join(f"   {d}\n" for d in docs[:-1]))
+            raise
+
+    w = worker(build)
+    w.connect(app)
+
+    # Stale once merging the first docs read, at the main process
+    def edit(app, env, docnames, other):
+        if not cancelled:
+            w.request(set())
+    app.connect('env-merge-info', edit)
+
+    for doc in docs:
+        (src / f"{doc}.rst").write_text(f"{doc}\n==\n\nsecond\n")
+    w.request({str(src / 'd0.rst')})
+
+    deadline = time.monotonic() + 60
+    while not w.idle() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    w.close()
+
+    # Cancelled once all read, then read again without the removed doc
+    assert cancelled == [True]
+    assert read == [docs, docs[:-1] + ['index']]
+    assert 'd7' not in app.env.all_docs
+    assert path.isfile(out / 'd0.html')
@@ -0,0 +1,200 @@
+import re
+
+from lxml import html
+
+from sphinx.application import Sphinx
+
+docs = [f"d{i}" for i in range(8)]
+
+
+def sources(src, options):
+    src.mkdir(exist_ok=True)
+    (src / '_static').mkdir(exist_ok=True)
+    (src / 'conf.py').write_text("extensions = ['adi_doctools']\n"
+                                 "project = 'test'\n"
+                                 "html_theme = 'cosmic'\n"
+                                 "html_static_path = ['_static']\n"
+                                 f"html_theme_options = {options!r}\n")
+    (src / 'index.rst').write_text(
+        "Index\n=====\n\n.. toctree::\n\n" +
+        ''.join(f"   {d}\n" for d in docs))
+    for doc in docs:
+        (src / f"{doc}.rst").write_text(f"{doc}\n==\n\nText.\n")
+
+
+def build(tmp_path, parallel=0):
+    app = Sphinx(str(tmp_path / 'src'), str(tmp_path / 'src'),
+                 str(tmp_path / 'html'), str(tmp_path / 'doctrees'), 'html',
+                 status=None, warning=None, parallel=parallel)
+    app.build()
+    return app
+
+
+def assets(tmp_path):
+    static = tmp_path / 'html' / '_static'
+    return {f.name: f.stat().st_mtime_ns for f in static.iterdir()
+            if f.name.startswith('navigation')}
+
+
+def test_theme_navigation_shared(tmp_path):
+    src = tmp_path / 'src'
+    sources(src, {'shared_navigation': True})
+    # Of the user, not managed
+    (src / '_static' / 'navigation.html').write_text('user')
+
+    build(tmp_path)
+    first = assets(tmp_path)
+    assert len(first) == 2
+    name = next(f for f in first if f != 'navigation.html')
+    assert re.fullmatch(r"navigation\.[0-9a-f]{16}\.html", name)
+    for doc in docs:
+        assert f"_static/{name}" in \
+            (tmp_path / 'html' / f"{doc}.html").read_text()
+
+    # Reused, not written again if the toctree is the same
+    (src / 'd0.rst').write_text("d0\n==\n\nOther text.\n")
+    build(tmp_path)
+    assert assets(tmp_path) == first
+
+    # Pruned, also on a parallel build, the pages written by the other
+    # processes
+    stale = tmp_path / 'html' / '_static' / 'navigation.0123456789abcdef.html'
+    stale.write_text('stale')
+    (src / 'd0.rst').write_text("d0\n==\n\nText.\n")
+    build(tmp_path, parallel=2)
+    assert assets(tmp_path) == first
+
+    # Not shared, the managed ones are removed
+    sources(src, {})
+    build(tmp_path)
+    assert list(assets(tmp_path)) == ['navigation.html']
+    assert 'd1' in (tmp_path / 'html' / 'd0.html').read_text()
+
+
+def test_theme_navigation_topics(tmp_path):
+    src = tmp_path / 'src'
+    sources(src, {'shared_navigation': True})
+    (src / 'conf.py').write_text((src / 'conf.py').read_text() +
+                                 "filter_toctree = True\n")
+    (src / 'index.rst').write_text(
+        "Index\n=====\n\n" +
+        ''.join(f".. toctree::\n   :caption: {t}\n\n" +
+                ''.join(f"   {d}\n" for d in docs[i:i + 4]) + "\n"
+                for i, t in ((0, 'One'), (4, 'Two'))))
+
+    # The trees of the topics, written by the write processes
+    build(tmp_path, parallel=2)
+    names = {}
+    for doc in docs:
+        html = (tmp_path / 'html' / f"{doc}.html").read_text()
+        names[doc] = re.search(r"_static/(navigation\.[0-9a-f]{16}\.html)",
+                               html).group(1)
+    assert names['d0'] == names['d3'] != names['d4'] == names['d7']
+    assert set(names.values()) <= set(assets(tmp_path))
+
+    # Second topic removed, so is its tree
+    (src / 'index.rst').write_text(
+        "Index\n=====\n\n.. toctree::\n   :caption: One\n\n" +
+        ''.join(f"   {d}\n" for d in docs))
+    build(tmp_path, parallel=2)
+    assert names['d4'] not in assets(tmp_path)
+
+
+def toc_tree(file):
+    # A document of its own, embedded as is
+    data = file.read_text()
+    data = data[data.index('<div class="toc-tree">'):]
+    return html.fromstring(data[:data.index('</div>') + 6])
+
+
+def test_theme_navigation_tree(tmp_path):
+    src = tmp_path / 'src'
+    sources(src, {})
+    (src / 'sub').mkdir()
+    (src / 'sub' / 'e.rst').write_text("e\n=\n\nText.\n")
+    (src / 'index.rst').write_text(
+        "Index\n=====\n\n.. toctree::\n\n   d0\n   d1\n   sub/e\n")
+
+    app = Sphinx(str(src), str(src), str(tmp_path / 'html'),
+                 str(tmp_path / 'doctrees'), 'html',
+                 status=None, warning=None)
+    app.build()
+
+    # Marked on its own page only, the links relative to the page
+    for doc, href in (('d0', 'd1.html'), ('d1', 'd0.html'),
+                      ('sub/e', '../d0.html')):
+        toc = toc_tree(tmp_path / 'html' / f"{doc}.html")
+        current = toc.xpath(".//a[contains(@class, 'current')]")
+        assert [a.text for a in current] == [doc.split('/')[-1]]
+        assert current[0].get('href') == '#'
+        assert toc.xpath(f".//a[@href='{href}']")
+
+    # Decorated once per page folder
+    nav = app.navigation
+    assert sorted(nav['cache']) == [('', None), ('sub', None)]
+
+    # Prepared again once docs are read, from the new root doctree
+    (src / 'd2.rst').write_text("d2\n==\n\nText.\n")
+    (src / 'index.rst').write_text(
+        "Index\n=====\n\n.. toctree::\n\n   d0\n   d1\n   d2\n   sub/e\n")
+    app.build()
+    assert app.navigation is not nav
+    toc = toc_tree(tmp_path / 'html' / 'd2.html')
+    assert toc.xpath(".//a[contains(@class, 'current')]")[0].text == 'd2'
+    assert toc.xpath(".//a[@href='d0.html']")
+
+
+def repotoc(file):
+    data = file.read_text()
+    data = data[data.index('<root>'):]
+    root = html.fromstring(data[:data.index('</root>') + 7])
+    return {a.text: (a.get('href'), a.get('class')) for a in root.iter('a')}
+
+
+def test_theme_repotoc(tmp_path):
+    src = tmp_path / 'src'
+    sources(src, {})
+    (src / 'conf.py').write_text(
+        (src / 'conf.py').read_text() +
+        "repository = 'hdl'\n"
+        "def topics(app, config):\n"
+        "    repos = app.lut['repos']\n"
+        "    topic = {'d0': 'First', 'sub': 'Sub'}\n"
+        "    app.lut = {**app.lut, 'repos': {**repos, 'hdl': {\n"
+        "        **repos['hdl'], 'topic': topic}}}\n"
+        "def setup(app):\n"
+        "    app.connect('config-inited', topics)\n")
+    (src / 'sub').mkdir()
+    for doc in ['e', 'f']:
+        (src / 'sub' / f"{doc}.rst").write_text(f"{doc}\n=\n\nText.\n")
+    (src / 'index.rst').write_text(
+        "Index\n=====\n\n.. toctree::\n\n   d0\n   d1\n   sub/e\n   sub/f\n")
+
+    app = Sphinx(str(src), str(src), str(tmp_path / 'html'),
+                 str(tmp_path / 'doctrees'), 'html',
+                 status=None, warning=None)
+    app.build()
+
+    # The topic of the page marked, the links relative to the page
+    out = tmp_path / 'html'
+    for doc, current in (('index', None), ('d0', 'First'),
+                         ('d1', None), ('sub/e', 'Sub')):
+        tree = repotoc(out / f"{doc}.html")
+        assert [t for t in tree if tree[t][1] == 'current'] == \
+            ([current] if current else [])
+        assert tree['HDL Testbenches'][1] is None
+    assert repotoc(out / 'sub' / 'e.html')['Sub'][0] == '../sub/index.html'
+    assert repotoc(out / 'd0.html')['First'][0] == './d0/index.html'
+
+    # Rendered once per page folder and topics
+    depth = app.config.target_depth
+    assert sorted(app.repotoc) == [('../', 'hdl', depth, ('sub',)),
+                                   ('./', 'hdl', depth, ()),
+                                   ('./', 'hdl', depth, ('d0',))]
+    assert repotoc(out / 'sub' / 'f.html') == repotoc(out / 'sub' / 'e.html')
+
+    # Rendered again once docs are read
+    app.lut['repos']['hdl']['topic']['sub'] = 'Other'
+    (src / 'sub' / 'e.rst').write_text("e\n=\n\nOther text.\n")
+    app.build()
+    assert 'Other' in repotoc(out / 'sub' / 'e.html')
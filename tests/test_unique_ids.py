@@ -0,0 +1,62 @@
+import re
+from types import SimpleNamespace
+
+from sphinx.application import Sphinx
+
+from adi_doctools import merge_unique_ids
+
+
+def test_unique_ids(tmp_path):
+    src = tmp_path / 'src'
+    src.mkdir()
+    (src / 'conf.py').write_text("extensions = ['adi_doctools']\n"
+                                 "project = 'test'\n")
+    (src / 'index.rst').write_text(
+        "Index\n=====\n\n.. toctree::\n\n   a\n   b\n   c\n")
+    for doc in ['a', 'b', 'c']:
+        (src / f"{doc}.rst").write_text(
+            f"{doc}\n=\n\nOverview\n--------\n\nText of {doc}.\n")
+
+    def build():
+        app = Sphinx(str(src), str(src), str(tmp_path / 'out'),
+                     str(tmp_path / 'doctrees'), 'singlehtml',
+                     status=None, warning=None, parallel=2)
+        app.build()
+        html = (tmp_path / 'out' / 'index.html').read_text()
+        return app, re.findall(r'<section id="(overview[-0-9]*)">', html)
+
+    # Read serially, in order
+    app, ids = build()
+    assert app.parallel == 1
+    assert ids == ['overview', 'overview-1', 'overview-2']
+
+    # A doc read again releases its ids first, and gets the same
+    (src / 'b.rst').write_text("b\n=\n\nOverview\n--------\n\nOther.\n")
+    app, ids = build()
+    assert ids == ['overview', 'overview-1', 'overview-2']
+
+    # Removed, its ids are purged
+    (src / 'index.rst').write_text(
+        "Index\n=====\n\n.. toctree::\n\n   b\n   c\n")
+    (src / 'a.rst').unlink()
+    app, ids = build()
+    assert 'a' not in app.env.unique_ids['doc']
+    assert 'a' not in app.env.unique_ids['owner'].values()
+    # Not read again, keep theirs
+    assert ids == ['overview-1', 'overview-2']
+    (src / 'c.rst').write_text("c\n=\n\nOverview\n--------\n\nOther.\n")
+    app, ids = build()
+    assert ids == ['overview-1', 'overview']
+
+
+def test_unique_ids_merge():
+    env = SimpleNamespace(unique_ids={'doc': {'a': ['x']},
+                                      'owner': {'x': 'a'}})
+    other = SimpleNamespace(unique_ids={'doc': {'c': ['x', 'y'],
+                                                'b': ['y', 'z']},
+                                        'owner': {}})
+    merge_unique_ids(None, env, ['c', 'b'], other)
+    assert env.unique_ids['doc'] == {'a': ['x'], 'b': ['y', 'z'],
+                                     'c': ['x', 'y']}
+    # By name, whatever the order of the docs
+    assert env.unique_ids['owner'] == {'x': 'a', 'y': 'b', 'z': 'b'}